@@ -0,0 +1,76 @@
+"""HTML page to dict conversion, single pass against the double parse.
+
+The previous HTMLToDict parsed every page with Beautiful Soup, serialized it
+with ``prettify()`` and parsed the result again with HTMLParser. The double
+parse is rebuilt here from HTMLToDict's dict building methods for comparison.
+
+The error check ``format_dict`` does with a LazyHTMLDict is timed for a page
+with a _message_ element, which needs a scan, and for one without.
+
+Run from a checkout::
+
+    python benchmarks/bench_html.py
+"""
+import json
+import timeit
+
+import stub_server  # pylint: disable=W0611
+from bs4 import BeautifulSoup
+
+from pyasgard.htmltodict import HTMLParser, HTMLToDict, LazyHTMLDict
+
+CALLS = 20
+ROWS = 500
+
+
+def double_parse(content):
+    """Convert _content_ the way HTMLToDict used to."""
+    builder = HTMLToDict('')
+    parser = HTMLParser()
+    parser.handle_starttag = builder.open_element
+    parser.handle_endtag = builder.close_element
+    parser.handle_data = builder.append_data
+
+    soup = BeautifulSoup(content, 'html.parser')
+    parser.feed(soup.prettify())
+    parser.close()
+    soup.find_all(class_=('errors', 'message'))
+    return builder.dict()
+
+
+def error_check(content):
+    """Answer what Asgard.format_dict asks of an HTML page."""
+    page = LazyHTMLDict(content)
+    return 'html' in page and page.issues
+
+
+def main():
+    """Time both conversions of an Asgard like list page."""
+    rows = ''.join(
+        '<tr class="{0}"><td><a href="/app/show/app{1}">app{1}</a></td>'
+        '<td>owner{1}@example.com</td><td>&nbsp;</td></tr>'.format(
+            'odd' if index % 2 else 'even', index) for index in range(ROWS))
+    page = ('<!DOCTYPE html><html><head><title>Applications</title></head>'
+            '<body><div class="message">Application list</div>'
+            '<table>{0}</table></body></html>').format(rows)
+
+    assert json.dumps(HTMLToDict(page).dict()) == json.dumps(
+        double_parse(page))
+
+    single = timeit.timeit(lambda: HTMLToDict(page).issues,
+                           number=CALLS) / CALLS
+    double = timeit.timeit(lambda: double_parse(page), number=CALLS) / CALLS
+    scanned = timeit.timeit(lambda: error_check(page), number=CALLS) / CALLS
+    plain_page = page.replace('class="message"', 'class="title"')
+    skipped = timeit.timeit(lambda: error_check(plain_page),
+                            number=CALLS) / CALLS
+
+    print('page size:    {0:8d} chars'.format(len(page)))
+    print('double parse: {0:8.2f} ms/page'.format(double * 1e3))
+    print('single pass:  {0:8.2f} ms/page'.format(single * 1e3))
+    print('lazy check:   {0:8.2f} ms/page'.format(scanned * 1e3))
+    print('no issues:    {0:8.2f} ms/page'.format(skipped * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Client-side overhead per call with logging at WARNING.
+
+The transport is replaced by a canned response so only pyasgard's own work
+is measured: command lookup, URL formatting, body construction and JSON
+decoding of a large instance list. For comparison the cost of the eager
+``pformat`` of that payload, which every call used to pay, is printed too.
+
+Run from a checkout::
+
+    python benchmarks/bench_logging.py
+"""
+import json
+import logging
+import timeit
+from pprint import pformat
+
+import stub_server  # pylint: disable=W0611
+from requests.models import Response
+
+from pyasgard import Asgard
+
+CALLS = 20
+INSTANCES = 5000
+
+
+class CannedTransport(object):
+    """Transport that returns the same response without any I/O."""
+
+    def __init__(self, payload):
+        self.payload = json.dumps(payload).encode('utf-8')
+
+    def request(self, method, **kwargs):  # pylint: disable=W0613
+        """Build a fresh 200 response around the canned payload."""
+        response = Response()
+        response.status_code = 200
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response._content = self.payload  # pylint: disable=W0212
+        return response
+
+    def close(self):
+        """Nothing to release."""
+
+
+def main():
+    """Time list calls against the canned instance list."""
+    logging.basicConfig(level=logging.WARNING)
+
+    payload = [{'instanceId': 'i-{0:08x}'.format(index),
+                'appName': 'app{0}'.format(index % 50),
+                'amiId': 'ami-1234',
+                'state': 'running'} for index in range(INSTANCES)]
+    client = Asgard('http://asgard.example.com',
+                    transport=CannedTransport(payload))
+
+    per_call = timeit.timeit(client.instance.list, number=CALLS) / CALLS
+    eager = timeit.timeit(lambda: pformat(payload), number=CALLS) / CALLS
+
+    print('instance.list at WARNING: {0:8.2f} ms/call'.format(per_call * 1e3))
+    print('eager pformat(payload):   {0:8.2f} ms/call'.format(eager * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Peak memory of instance.list, eager against stream=True.
+
+Peak Python allocations are measured with tracemalloc while the records are
+counted one by one. The stub server runs in the same process, so the payload
+it holds is allocated before tracing starts.
+
+Run from a checkout::
+
+    python benchmarks/bench_stream.py
+"""
+import logging
+import tracemalloc
+
+from stub_server import StubServer
+
+from pyasgard import Asgard
+
+INSTANCES = (1000, 10000, 50000)
+
+
+def peak_memory(func):
+    """Return the peak traced allocation of _func_ in MiB."""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2.0**20
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    """Count instances with and without streaming for growing fleets."""
+    logging.basicConfig(level=logging.WARNING)
+
+    with StubServer() as server:
+        client = Asgard(server.url)
+        for count in INSTANCES:
+            server.add_json('/us-east-1/instance/list.json', [{
+                'instanceId': 'i-{0:08x}'.format(index),
+                'appName': 'app{0}'.format(index % 50),
+                'amiId': 'ami-1234',
+                'state': 'running'
+            } for index in range(count)])
+
+            eager = peak_memory(lambda: len(client.instance.list()))
+            stream = peak_memory(
+                lambda: sum(1 for _ in client.instance.list(stream=True)))
+
+            print('{0:6d} instances: eager {1:7.2f} MiB, stream {2:5.2f} MiB'
+                  .format(count, eager, stream))
+
+
+if __name__ == '__main__':
+    main()
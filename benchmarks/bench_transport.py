@@ -0,0 +1,48 @@
+"""Per-call latency of one-shot requests versus the pooled Transport.
+
+Run from a checkout::
+
+    python benchmarks/bench_transport.py
+"""
+import timeit
+
+import requests
+from stub_server import StubServer
+
+from pyasgard import Asgard
+from pyasgard.transport import Transport
+
+CALLS = 500
+
+
+def report(label, seconds):
+    """Print per-call latency in microseconds."""
+    print('{0:<24}{1:10.1f} us/call'.format(label, seconds / CALLS * 1e6))
+
+
+def main():
+    """Compare a fresh connection per call against keep-alive reuse."""
+    with StubServer() as server:
+        server.add_json('/us-east-1/autoScaling/show/app-v000.json',
+                        {'group': {'autoScalingGroupName': 'app-v000'}})
+        url = '{0}/us-east-1/autoScaling/show/app-v000.json'.format(server.url)
+
+        # What Asgard.asgard_request used to do for every call
+        report('one-shot requests.get',
+               timeit.timeit(lambda: requests.get(url, timeout=15),
+                             number=CALLS))
+
+        with Transport() as transport:
+            report('pooled Transport',
+                   timeit.timeit(
+                       lambda: transport.request('GET', url=url, timeout=15),
+                       number=CALLS))
+
+        with Asgard(server.url) as client:
+            report('Asgard.asg.show',
+                   timeit.timeit(lambda: client.asg.show(asg_id='app-v000'),
+                                 number=CALLS))
+
+
+if __name__ == '__main__':
+    main()
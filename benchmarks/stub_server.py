@@ -0,0 +1,77 @@
+"""Local stand-in Asgard server for benchmarks."""
+import json
+import os
+import sys
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+# Benchmarks run from a checkout, make the package importable without install
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answer every request with the payload registered for its path."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Respond to GET."""
+        self.respond()
+
+    def do_POST(self):  # pylint: disable=C0103
+        """Respond to POST."""
+        self.respond()
+
+    def respond(self):
+        """Write the registered payload, or an empty JSON object."""
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+
+        content_type, payload = self.server.routes.get(
+            self.path.split('?')[0], ('application/json', b'{}'))
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        """Keep benchmark output quiet."""
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """Threaded keep-alive HTTP server on a random local port."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.routes = {}
+        self.url = 'http://127.0.0.1:{0}'.format(self.server_address[1])
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def add_json(self, path, payload):
+        """Register a JSON payload for _path_."""
+        self.routes[path] = ('application/json',
+                             json.dumps(payload).encode('utf-8'))
+
+    def add_html(self, path, payload):
+        """Register an HTML payload for _path_."""
+        self.routes[path] = ('text/html', payload.encode('utf-8'))
@@ -0,0 +1,8 @@
+"""pytest configuration shared by the test modules."""
+import sys
+
+collect_ignore = []  # pylint: disable=C0103
+
+# HACK: async/await and asyncio.run need Python 3.7
+if sys.version_info < (3, 7):
+    collect_ignore.append('test_asyncasgard.py')
@@ -1,3 +1,10 @@
 from .exceptions import *
 from .pyasgard import *
 from .endpoints import *
+from .multiregion import *
+
+# HACK: Python 2.7 and 3.4 cannot parse async/await
+try:
+    from .asyncasgard import *
+except SyntaxError:
+    pass
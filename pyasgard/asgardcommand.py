@@ -1,16 +1,68 @@
 """AsgardCommand Class for pyasgard."""
+import functools
 import json
 import logging
-from collections import OrderedDict
+from collections import namedtuple
 from pprint import pformat
 
+import requests
+
+from .cache import ResponseCache
+from .columns import to_columns
+from .compiled import compile_endpoint, fingerprint, invalidate
+from .deadline import Deadline, normalize_timeout
 from .exceptions import AsgardError
+from .lazylog import LazyPformat
+from .metrics import current, null_phase
+from .tracing import current_span
+
+
+class PreparedCall(
+        namedtuple('PreparedCall', [
+            'name', 'method', 'url', 'body', 'url_params', 'status', 'stream',
+            'idempotent', 'deadline', 'as_columns', 'timing', 'trace_parent',
+            'validators'
+        ])):
+    """Validated request of one command call.
+
+    Attributes:
+        name: Command name, e.g. _asg.show_.
+        method: HTTP method string.
+        url: Formatted URL, including the region.
+        body: Query parameters of a GET, body of a POST.
+        url_params: Keyword arguments for the Transport request.
+        status: Expected HTTP status.
+        stream: Whether the response is decoded incrementally.
+        idempotent: Whether the request may be repeated safely.
+        deadline: Deadline of the whole call, None for no limit.
+        as_columns: False, True or a list of fields to return as Columns.
+        timing: CallTiming when the client has Metrics, else None.
+        trace_parent: Span active while preparing, the parent of the
+            call's span when the client has a Tracer.
+        validators: Dict of conditional headers of a poll, updated from the
+            response, None for a plain call.
+    """
+
+    __slots__ = ()
 
-# HACK: Python 2.7 is missing cool modules
-try:
-    from inspect import Parameter, Signature
-except ImportError:
-    pass
+    @property
+    def identity(self):
+        """Digest of the credentials and headers of the request."""
+        return ResponseCache.identity(self.url_params.get('auth'),
+                                      self.url_params.get('headers'))
+
+    @property
+    def key(self):
+        """Identity of the request for caching and coalescing.
+
+        Requests of clients with different credentials never share a key.
+        """
+        return ResponseCache.key(self.url, self.body, self.identity)
+
+    @property
+    def family(self):
+        """Endpoint family, e.g. _asg_ for _asg.show_."""
+        return self.name.split('.')[0]
 
 
 class AsgardCommand(object):  # pylint: disable=R0903
@@ -52,36 +104,45 @@ class AsgardCommand(object):  # pylint: disable=R0903
         # Missing method is also not defined in our mapping table
         try:
             self.api_map = menu[self.api_call]
-            self.log.debug('api_map:\n%s', pformat(self.api_map))
+            self.log.debug('api_map:\n%s', LazyPformat(self.api_map))
         except KeyError:
             raise AttributeError(('Method "{0}" does not exist.\n'
                                   'Options available are: {1}').format(
                                       self.api_call, menu.keys()))
 
+        self.compiled = None
+        self._compile()
+
+    @property
+    def endpoint(self):
+        """Compiled Endpoint of the mapping, recompiled after edits."""
+        if fingerprint(self.api_map) != self.compiled.fingerprint:
+            self._compile()
+        return self.compiled
+
+    def _compile(self):
+        """Compile the endpoint mapping into _endpoint_.
+
+        Call :meth:`_recompile` after editing a value of the mapping in
+        place.
+        """
+        self.compiled = compile_endpoint(self.api_map)
+
         try:
             docstring = self.api_map['doc']
         except (KeyError, TypeError):
             docstring = 'No docstring provided.'
 
-        # The remainder of this __init__ is the result of fighting docstrings
-        # while supporting Python 2.7, 3.4, and 3.5
-        try:
-            self.__class__.__doc__ = docstring
-            self.__class__.__call__.__signature__ = self.construct_signature()
-            self.log.debug('Python 3.5 works best.')
-        except AttributeError:
-            self.log.debug('Python 2.7 cannot modify the __class__ attribute.')
-
-            # HACK: Python 2.7 IPython signature line
-            self.__signature__ = self.pretty_format_params()
-        except TypeError:
-            self.log.debug('Python 3.4 inspect.Parameter does not work right.')
-            self.__doc__ = None
-            self.__class__.__doc__ = '{0}\nValid parameters: {1}'.format(
-                docstring, self.pretty_format_params())
-
-            # HACK: Python 3.4 IPython signature line
-            self.__signature__ = self.pretty_format_params()
+        # Instance attributes only, commands are cached per client and must
+        # not leak their docstring or signature into the shared class
+        self.__doc__ = '{0}\nValid parameters: {1}'.format(
+            docstring, self.pretty_format_params())
+        self.__signature__ = self.construct_signature()
+
+    def _recompile(self):
+        """Pick up changes made to the endpoint mapping since compiling."""
+        invalidate(self.api_map)
+        self._compile()
 
     def __dir__(self):
         """Dynamically generate attributes and methods based on endpoints."""
@@ -96,27 +157,9 @@ class AsgardCommand(object):  # pylint: disable=R0903
         if isinstance(next_api, dict):
             self.log.debug('Next API level: %s', next_api)
 
-            # TODO: When Python 2.7 support is dropped, the rest of this block
-            # should be changed to a simple:
-            #
-            # return AsgardCommand(self.client,
-            #                      command,
-            #                      self.api_map,
-            #                      parent=self.__name__)
-            docstring = next_api.get('doc', 'No docstring provided.')
-            # call_docstring = self.__call__.__doc__
-
-            next_command = type(
-                'AsgardCommand',
-                (AsgardCommand, ),
-                {'__doc__': '{0}\nValid parameters: {1}'.format(
-                    docstring,
-                    self.pretty_format_params(api_map=next_api))})
-
-            return next_command(self.client,
-                                command,
-                                self.api_map,
-                                parent=self.__name__)
+            return self.client.get_command(command,
+                                           self.api_map,
+                                           parent=self.__name__)
         else:
             self.log.debug('Reached leaf "%s" of map: %s', command, next_api)
             return next_api
@@ -127,25 +170,66 @@ class AsgardCommand(object):  # pylint: disable=R0903
         This constructs the outgoing request to your Asgard Server.
 
         Args:
+            stream: Decode a JSON array incrementally instead of loading the
+                whole response.
+            request_timeout: Seconds, or a (connect, read) tuple, overriding
+                the endpoint and client timeouts.
+            deadline: Seconds, or a :class:`pyasgard.deadline.Deadline`, to
+                finish the call in, retries included.
+            as_columns: Return a list result as
+                :class:`pyasgard.columns.Columns`, True for every scalar
+                field or a list of dotted field paths.
             **kwargs: Only excepts keywords used in the endpoint mapping
                 _path_, _valid_params_, and _default_params_.
 
         Returns:
-            A dict of the HTML or JSON from Asgard.
+            A dict of the HTML or JSON from Asgard. With _stream_, a
+            generator of the array elements.
 
         Raises:
             TypeError: If an unexpected keyword was passed in.
+            AsgardTimeoutError: The _deadline_ passed.
         """
-        self.log.debug('call locals():\n%s', pformat(locals()))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug('call locals():\n%s', pformat(locals()))
+
+        return self._execute(self._prepare(kwargs))
+
+    def _prepare(self, kwargs):
+        """Validate _kwargs_ and construct the outgoing request.
 
-        method = self.api_map['method']
-        status = self.api_map['status']
+        Args:
+            kwargs: Dict of keyword arguments of the call.
+
+        Returns:
+            PreparedCall ready for :meth:`execute`.
+
+        Raises:
+            TypeError: If an unexpected keyword was passed in.
+        """
+        endpoint = self.endpoint
+        method = endpoint.method
+
+        stream = kwargs.pop('stream', False)
+        timeout = normalize_timeout(kwargs.pop('request_timeout', None))
+        deadline = Deadline.coerce(kwargs.pop('deadline', None))
+        as_columns = kwargs.pop('as_columns', False)
+
+        name = self.__name__.partition('.')[2]
+        metrics = self.client.metrics
+        if metrics is None:
+            timing, timed = None, null_phase
+        else:
+            timing = metrics.timing(name, self.client.ec2_region)
+            timed = timing.phase
 
-        url = self.client.format_url(self.api_map['path'], kwargs)
+        with timed('format_url'):
+            url = self.client.format_url(endpoint.path, kwargs)
 
-        self.validate_params(kwargs)
+        self.validate_params(kwargs, endpoint)
 
-        body = self.construct_body(kwargs)
+        with timed('build_body'):
+            body = self.construct_body(kwargs, endpoint)
 
         if method == 'GET':
             action = 'params'
@@ -156,24 +240,255 @@ class AsgardCommand(object):  # pylint: disable=R0903
             'url': url,
             action: body,
             'headers': self.client.headers,
-            'timeout': 15,
+            'timeout': timeout or endpoint.timeout or self.client.timeout,
         }
 
         auth = self.client.get_auth()
         url_params.update(auth)
 
-        response = self.client.asgard_request(method, url_params)
+        return PreparedCall(name=name,
+                            method=method,
+                            url=url,
+                            body=body,
+                            url_params=url_params,
+                            status=endpoint.status,
+                            stream=stream,
+                            idempotent=endpoint.idempotent,
+                            deadline=deadline,
+                            as_columns=as_columns,
+                            timing=timing,
+                            trace_parent=(current_span() if self.client.tracer
+                                          is not None else None),
+                            validators=None)
+
+    def _execute(self, call):
+        """Make the request of a PreparedCall in a span of the client Tracer.
+
+        The span is named after the command, e.g. _Asgard.cluster.resize_,
+        and is the parent of the HTTP and parse spans of the call.
 
+        Args:
+            call: PreparedCall from :meth:`prepare`.
+
+        Returns:
+            Result of :meth:`perform`.
+        """
+        tracer = self.client.tracer
+        if tracer is None:
+            return self._measure(call)
+
+        with tracer.span(self.__name__,
+                         parent=call.trace_parent,
+                         attributes={
+                             'asgard.endpoint': call.name,
+                             'asgard.region': self.client.ec2_region,
+                             'http.method': call.method,
+                         }):
+            return self._measure(call)
+
+    def _measure(self, call):
+        """Make the request of a PreparedCall, timed with client Metrics.
+
+        Args:
+            call: PreparedCall from :meth:`prepare`.
+
+        Returns:
+            Result of :meth:`perform`.
+        """
+        metrics = self.client.metrics
+        if metrics is None or call.timing is None:
+            return self._perform(call)
+
+        previous = metrics.start(call)
         try:
-            return self.client.response_handler(response, status)
-        except AsgardError:
+            result = self._perform(call)
+        except Exception as error:
+            metrics.finish(call, previous, error)
             raise
+        metrics.finish(call, previous)
+        return result
+
+    def _perform(self, call):
+        """Make the request of a PreparedCall.
+
+        Identical GET calls in flight at the same time share one request
+        when the client has a SingleFlight.
+
+        Args:
+            call: PreparedCall from :meth:`prepare`.
 
-    def construct_body(self, kwargs):
+        Returns:
+            A dict of the HTML or JSON from Asgard. With _stream_, a
+            generator of the array elements. With _as_columns_, Columns.
+        """
+        if call.as_columns:
+            fields = call.as_columns if call.as_columns is not True else None
+            return to_columns(self._perform(call._replace(as_columns=False)),
+                              fields)
+
+        if call.stream:
+            response = self._send(
+                call._replace(url_params=dict(call.url_params, stream=True)))
+            return self.client.stream_handler(response, call.status)
+
+        singleflight = self.client.singleflight
+        if (singleflight is None or call.method != 'GET' or
+                call.validators is not None):
+            return self._dispatch(call)
+
+        return singleflight.do(call.key,
+                               functools.partial(self._dispatch, call),
+                               deadline=call.deadline)
+
+    def _dispatch(self, call):
+        """Answer _call_ from the cache or from Asgard."""
+        if call.validators is not None:
+            return self._revalidate(call)
+
+        if self.client.cache is None:
+            response = self._send(call)
+
+            try:
+                return self._handle(call, response)
+            except AsgardError:
+                raise
+
+        return self.client.cache.call(
+            call.name, call.method, call.url, call.body,
+            functools.partial(self._send, call),
+            functools.partial(self._handle, call),
+            identity=call.identity)
+
+    def _revalidate(self, call):
+        """Make the conditional GET of _call_, bypassing the cache.
+
+        Returns:
+            Result of the command, None when Asgard answered 304 Not
+            Modified.
+        """
+        response = self._send(call, call.validators)
+        if response.status_code == 304:
+            response.close()
+            return None
+
+        if 'ETag' in response.headers:
+            call.validators['If-None-Match'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            call.validators['If-Modified-Since'] = (
+                response.headers['Last-Modified'])
+
+        return self._handle(call, response)
+
+    def _handle(self, call, response):
+        """Turn the _response_ of _call_ into its result, traced as _parse_."""
+        tracer = self.client.tracer
+        if tracer is None:
+            return self.client.response_handler(response, call.status)
+
+        with tracer.span('parse', attributes={
+                'http.status_code': response.status_code}):
+            return self.client.response_handler(response, call.status)
+
+    def map(self, kwargs_list, **options):
+        """Call this command once per dict of keyword arguments.
+
+        Args:
+            kwargs_list: Iterable of dicts of keyword arguments.
+            **options: _max_workers_, _rate_ and _deadline_ for the
+                client's batch().
+
+        Returns:
+            :class:`pyasgard.batch.BatchResults` in the order of
+            _kwargs_list_.
+        """
+        return self.client.batch([(self, kwargs) for kwargs in kwargs_list],
+                                 **options)
+
+    def _send(self, call, headers=None):
+        """Make the request of _call_, optionally with extra _headers_.
+
+        Transient failures are retried when the client has a RetryPolicy.
+        With a deadline, every attempt's timeouts shrink to the time left.
+
+        Args:
+            call: PreparedCall.
+            headers: Dict of headers to add to the client headers.
+
+        Returns:
+            requests.Response object.
+
+        Raises:
+            AsgardTimeoutError: The deadline of _call_ passed.
+        """
+        url_params = call.url_params
+        if headers:
+            url_params = dict(url_params)
+            url_params['headers'] = dict(url_params['headers'] or {},
+                                         **headers)
+
+        deadline = call.deadline
+        tracer = self.client.tracer
+
+        def attempt(params):
+            """Make one request, in an HTTP span when traced."""
+            if tracer is None:
+                return fetch(params)
+
+            with tracer.span('HTTP ' + call.method, attributes={
+                    'http.method': call.method,
+                    'http.url': call.url,
+                    'asgard.region': self.client.ec2_region,
+            }) as span:
+                response = fetch(params)
+                span.set_attribute('http.status_code', response.status_code)
+                if not params.get('stream', False):
+                    span.set_attribute('http.response_content_length',
+                                       len(response.content or b''))
+                return response
+
+        def fetch(params):
+            """Make one request, timed when a call is timed."""
+            timing = current()
+            if timing is None:
+                return self.client.asgard_request(call.method, params,
+                                                  family=call.family)
+
+            started = timing.clock()
+            response = self.client.asgard_request(call.method, params,
+                                                  family=call.family)
+            timing.response(response, timing.clock() - started,
+                            streamed=params.get('stream', False))
+            return response
+
+        def request():
+            """Make one attempt within the deadline."""
+            if deadline is None:
+                return attempt(url_params)
+
+            try:
+                return attempt(dict(
+                    url_params, timeout=deadline.clamp(url_params['timeout'])))
+            except requests.Timeout:
+                deadline.check()
+                raise
+
+        retry = self.client.retry
+        if retry is None:
+            return request()
+
+        return retry.call(request,
+                          idempotent=call.idempotent,
+                          deadline=deadline)
+
+    def construct_body(self, kwargs, endpoint=None):
         """Form body of request.
 
         Body can be passed from data or in args.
 
+        Args:
+            kwargs: Dict of keyword arguments left after URL formatting.
+            endpoint: Compiled Endpoint, looked up when omitted.
+
         Returns:
             Dict for body of request, e.g.::
 
@@ -184,27 +499,30 @@ class AsgardCommand(object):  # pylint: disable=R0903
         if 'json' in kwargs:
             return json.dumps(kwargs['json'])
 
-        body = {}
-        body.update(self.api_map.get('default_params', {}))
+        endpoint = endpoint or self.endpoint
+
+        body = dict(endpoint.default_body)
         body.update(kwargs.pop('data', None) or self.client.data)
         body.update(kwargs)
         self.log.log(15, 'body=%s', body)
 
         return body
 
-    def validate_params(self, kwargs):
-        """Validate remaining kwargs against valid_params."""
-        valid_params = self.api_map.get('valid_params', ())
-        self.log.log(15, 'valid_params=%s', valid_params)
+    def validate_params(self, kwargs, endpoint=None):
+        """Validate remaining kwargs against valid_params.
+
+        Args:
+            kwargs: Dict of keyword arguments left after URL formatting.
+            endpoint: Compiled Endpoint, looked up when omitted.
+
+        Raises:
+            TypeError: If an unexpected keyword was passed in.
+        """
+        endpoint = endpoint or self.endpoint
+        self.log.log(15, 'valid_params=%s', endpoint.valid_params)
 
         for keyword in kwargs:
-            if keyword not in valid_params:
-                if 'default_params' not in self.api_map:
-                    raise TypeError('Was not expecting any arguments.')
-                elif keyword not in self.api_map['default_params']:
-                    raise TypeError(('{0}() got an unexpected keyword '
-                                     'argument "{1}"').format(self.api_call,
-                                                              keyword))
+            endpoint.validate(keyword, self.api_call)
 
     def construct_signature(self):
         """Construct a pretty function signature for dynamic commands.
@@ -213,25 +531,9 @@ class AsgardCommand(object):  # pylint: disable=R0903
         Python 3.5, broken in 3.4, and missing in 2.7.
 
         Returns:
-            Signature object for command.
+            Signature object for command, None when unsupported.
         """
-        param_dict = OrderedDict()
-
-        for param, default in sorted(self.get_all_valid_params().items()):
-            new_param = Parameter(param,
-                                  Parameter.KEYWORD_ONLY,
-                                  default=default)
-            self.log.debug('New parameter: %s', new_param)
-
-            param_dict[new_param] = param
-            self.log.debug('Parameter dictionary growing: %s', param_dict)
-
-        self.log.debug('Parameter dictionary: %s', param_dict)
-
-        new_signature = Signature(parameters=param_dict)
-        self.log.debug('New signature: %s', new_signature)
-
-        return new_signature
+        return self.endpoint.signature
 
     # TODO: When Python 2.7 support is removed, api_map kwarg should be removed
     def get_all_valid_params(self, api_map=None):
@@ -248,27 +550,8 @@ class AsgardCommand(object):  # pylint: disable=R0903
             Dict of all valid parameters for command in _{key: default}_
             format.
         """
-        params = {}
-
-        if not api_map:
-            api_map = self.api_map
-
-        path_params = self.client.find_path_keys(api_map.get('path', ''))
-        for param in path_params:
-            params[param] = ''
-
-        # Always make a list of valid parameters from endpoint mapping
-        valid_params = api_map.get('valid_params', [])
-        if isinstance(valid_params, str):
-            valid_params = [valid_params]
-
-        for param in valid_params:
-            params[param] = ''
-
-        params.update(api_map.get('default_params', {}))
-
-        self.log.debug('Full list of params: %s', params)
-        return params
+        endpoint = compile_endpoint(api_map) if api_map else self.endpoint
+        return dict(endpoint.all_params)
 
     # TODO: Remove when Python 2.7 and 3.4 support have been dropped
     def pretty_format_params(self, api_map=None):
@@ -281,9 +564,5 @@ class AsgardCommand(object):  # pylint: disable=R0903
         Returns:
             Pretty string formatting of all parameters.
         """
-        all_params_list = []
-        for key, default in self.get_all_valid_params(api_map).items():
-            all_params_list.append('{0!s}={1!r}'.format(key, default))
-
-        all_params = ', '.join(sorted(all_params_list))
-        return '({0})'.format(all_params)
+        endpoint = compile_endpoint(api_map) if api_map else self.endpoint
+        return endpoint.pretty_params
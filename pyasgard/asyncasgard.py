@@ -0,0 +1,228 @@
+"""Asyncio interface to Netflix Asgard REST API.
+
+Commands keep the dynamic attribute surface of :class:`pyasgard.Asgard` but
+return awaitables. Requests run on a thread pool sized to the pooled
+:class:`pyasgard.transport.Transport`, with an :class:`asyncio.Semaphore`
+bounding how many are in flight at once::
+
+    async with AsyncAsgard('http://asgard.example.com') as client:
+        groups = await asyncio.gather(
+            *[client.asg.show(asg_id=name) for name in names])
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .asgardcommand import AsgardCommand
+from .batch import BatchItem, BatchResults, check_deadline, make_bucket
+from .deadline import Deadline
+from .exceptions import AsgardTimeoutError
+from .pyasgard import Asgard
+from .waiter import DEFAULT_WAIT, check_task
+from .watch import DeploymentWatch
+
+
+class AsyncAsgardCommand(AsgardCommand):  # pylint: disable=R0903
+    """AsgardCommand whose calls are coroutines."""
+
+    def __call__(self, **kwargs):
+        """Request call to Asgard API without blocking the event loop.
+
+        Args:
+            **kwargs: Same keywords as :meth:`AsgardCommand.__call__`.
+
+        Returns:
+            Awaitable of a dict of the HTML or JSON from Asgard.
+        """
+        return self.client.run_call(self, self._prepare(kwargs))
+
+
+class AsyncAsgard(Asgard):
+    """Asyncio API Wrapper for Asgard."""
+
+    command_class = AsyncAsgardCommand
+
+    def __init__(self, url, max_concurrency=10, **kwargs):
+        """New AsyncAsgard object for interacting with the API.
+
+        Args:
+            url: https://company.asgard.com (use http if not SSL enabled).
+            max_concurrency: Maximum number of requests in flight, also the
+                default connection pool size.
+            **kwargs: Passed through to :class:`pyasgard.Asgard`.
+        """
+        kwargs.setdefault('pool_maxsize', max_concurrency)
+        super(AsyncAsgard, self).__init__(url, **kwargs)
+
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+        # Created on first use so it belongs to the running loop
+        self.semaphore = None
+        self.semaphore_loop = None
+
+        # (loop, request key) -> Future of a coalesced GET in flight
+        self.inflight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    async def run_in_executor(self, call):
+        """Run blocking _call_ on the executor, bounded by the semaphore.
+
+        Args:
+            call: Callable without arguments.
+
+        Returns:
+            Result of _call_.
+        """
+        loop = asyncio.get_event_loop()
+        if self.semaphore_loop is not loop:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.semaphore_loop = loop
+
+        async with self.semaphore:
+            return await loop.run_in_executor(self.executor, call)
+
+    async def run_call(self, command, call):
+        """Execute a PreparedCall of _command_ on the executor.
+
+        With a SingleFlight, identical GETs awaited at the same time on one
+        loop share a single executor slot and request.
+
+        Args:
+            command: AsyncAsgardCommand that prepared _call_.
+            call: PreparedCall.
+
+        Returns:
+            Result of the call.
+        """
+        execute = functools.partial(
+            AsgardCommand._execute, command, call)  # pylint: disable=W0212
+        if self.singleflight is None or call.method != 'GET' or call.stream:
+            return await self.run_in_executor(execute)
+
+        loop = asyncio.get_event_loop()
+        flight_key = (loop, call.key)
+        task = self.inflight.get(flight_key)
+        if task is not None:
+            self.singleflight.join()
+            if call.deadline is None:
+                return await asyncio.shield(task)
+            try:
+                return await asyncio.wait_for(
+                    asyncio.shield(task), max(call.deadline.remaining(), 0))
+            except asyncio.TimeoutError:
+                raise AsgardTimeoutError('Deadline of {0}s exceeded.'.format(
+                    call.deadline.seconds))
+
+        # The request runs as its own task, cancelling the caller that
+        # started it leaves the result to the coalesced callers
+        task = self.inflight[flight_key] = asyncio.ensure_future(
+            self.run_in_executor(execute))
+
+        def landed(done):
+            """Forget the flight, retrieve errors nobody may await."""
+            del self.inflight[flight_key]
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(landed)
+        return await asyncio.shield(task)
+
+    async def batch(self, calls, max_concurrency=None, rate=None,
+                    deadline=None):
+        """Run many command calls concurrently on the event loop.
+
+        Args:
+            calls: Iterable of (command, kwargs) pairs, _command_ being an
+                AsyncAsgardCommand or a dotted name like _asg.show_.
+            max_concurrency: Calls awaited at the same time, defaults to
+                the client's _max_concurrency_.
+            rate: Calls started per second, or a shared
+                :class:`pyasgard.ratelimit.TokenBucket`.
+            deadline: Seconds, or a :class:`pyasgard.deadline.Deadline`,
+                for the whole batch.
+
+        Returns:
+            :class:`pyasgard.batch.BatchResults` in the order of _calls_,
+            errors are collected instead of raised.
+        """
+        bucket = make_bucket(rate)
+        deadline = Deadline.coerce(deadline)
+        semaphore = asyncio.Semaphore(max_concurrency or
+                                      self.max_concurrency)
+
+        async def run_call(command, kwargs):
+            """Wait for a slot and the rate limit, then run the call."""
+            name = command.__name__.partition('.')[2]
+            async with semaphore:
+                wait = bucket.reserve() if bucket is not None else 0.0
+                try:
+                    call_kwargs = kwargs
+                    if deadline is not None:
+                        check_deadline(deadline, wait, bucket)
+                        call_kwargs = dict(kwargs)
+                        call_kwargs.setdefault('deadline', deadline)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+
+                    return BatchItem(name, kwargs,
+                                     await command(**call_kwargs), None)
+                except Exception as error:  # pylint: disable=W0703
+                    return BatchItem(name, kwargs, None, error)
+
+        calls = [(self.resolve(command), kwargs) for command, kwargs in calls]
+        if self.tracer is None:
+            return BatchResults(await asyncio.gather(
+                *[run_call(command, kwargs) for command, kwargs in calls]))
+
+        # Tasks copy the context, their calls become children of the span
+        with self.tracer.span('Asgard.batch',
+                              attributes={'asgard.calls': len(calls)}):
+            return BatchResults(await asyncio.gather(
+                *[run_call(command, kwargs) for command, kwargs in calls]))
+
+    async def run_wait(self, wait):
+        """Drive a :class:`pyasgard.waiter.Wait`, sleeping on the loop."""
+        while True:
+            state = await self.run_in_executor(wait.poll)
+            if wait.finished(state):
+                return wait.result
+            await asyncio.sleep(wait.next_delay(state))
+
+    async def watch_deployment(self, deployment_id, deadline=None):
+        """Async iterator version of :meth:`Asgard.watch_deployment`."""
+        watch = DeploymentWatch(self.waiter, self.resolve('deployment.show'),
+                                {'deployment_id': deployment_id}, deadline)
+
+        while True:
+            changes = await self.run_in_executor(watch.poll)
+            for change in changes:
+                yield change
+
+            if watch.finished(changes):
+                return
+            await asyncio.sleep(watch.next_delay(changes))
+
+    async def wait_until(self, command, predicate, timeout=DEFAULT_WAIT,
+                         **kwargs):
+        """Awaitable :meth:`pyasgard.waiter.Waiter.wait_until`."""
+        return await self.run_wait(
+            self.waiter.until(command, predicate, timeout, **kwargs))
+
+    async def wait_for_tasks(self, task_ids, timeout=DEFAULT_WAIT):
+        """Awaitable :meth:`pyasgard.waiter.Waiter.wait_for_tasks`."""
+        return await self.run_wait(self.waiter.tasks(task_ids, timeout))
+
+    async def wait_for_task(self, task_id, timeout=DEFAULT_WAIT):
+        """Awaitable :meth:`pyasgard.waiter.Waiter.wait_for_task`."""
+        return check_task(await self.wait_for_tasks([task_id], timeout))
+
+    def close(self):
+        """Stop the executor and release pooled connections."""
+        self.executor.shutdown(wait=False)
+        super(AsyncAsgard, self).close()
@@ -0,0 +1,141 @@
+"""Run many command calls as one bounded parallel job.
+
+Every call runs on a thread pool, optionally throttled by a
+:class:`pyasgard.ratelimit.TokenBucket`. Results come back in the order of
+the calls, and errors are collected per call instead of raised::
+
+    results = client.asg.show.map([{'asg_id': name} for name in names],
+                                  max_workers=20, rate=10)
+    groups = [item.result for item in results if item.ok]
+
+    results = client.batch([('asg.show', {'asg_id': 'app-v000'}),
+                            (client.cluster.show, {'cluster_id': 'app'})],
+                           deadline=30)
+"""
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .deadline import Deadline
+from .exceptions import AsgardTimeoutError
+from .ratelimit import TokenBucket
+from .tracing import propagate
+
+LOG = logging.getLogger(__name__)
+
+
+class BatchItem(
+        namedtuple('BatchItem', ['command', 'kwargs', 'result', 'error'])):
+    """Outcome of one call in a batch.
+
+    Attributes:
+        command: Command name, e.g. _asg.show_.
+        kwargs: Dict of keyword arguments of the call.
+        result: Return value, None when the call failed.
+        error: Exception raised by the call, None on success.
+    """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):  # pylint: disable=C0103
+        """Whether the call succeeded."""
+        return self.error is None
+
+
+class BatchResults(list):
+    """List of BatchItem in the order of the calls."""
+
+    @property
+    def results(self):
+        """List of return values, None for failed calls."""
+        return [item.result for item in self]
+
+    @property
+    def errors(self):
+        """List of BatchItem that failed."""
+        return [item for item in self if not item.ok]
+
+
+def make_bucket(rate):
+    """Return a TokenBucket for _rate_ calls per second, None for no limit.
+
+    Args:
+        rate: Number of calls per second, a TokenBucket, or None.
+    """
+    if rate is None or isinstance(rate, TokenBucket):
+        return rate
+    return TokenBucket(rate)
+
+
+def run_call(command, kwargs, deadline=None, wait=0.0, bucket=None):
+    """Call _command_ and wrap the outcome in a BatchItem.
+
+    Args:
+        command: AsgardCommand to call.
+        kwargs: Dict of keyword arguments.
+        deadline: Deadline of the batch, used unless _kwargs_ has one.
+        wait: Seconds to sleep first, the call fails right away when the
+            deadline passes in the meantime.
+        bucket: TokenBucket _wait_ was reserved from, its token is given
+            back when the call fails right away.
+    """
+    name = command.__name__.partition('.')[2]
+    try:
+        call_kwargs = kwargs
+        if deadline is not None:
+            check_deadline(deadline, wait, bucket)
+            call_kwargs = dict(kwargs)
+            call_kwargs.setdefault('deadline', deadline)
+        if wait > 0:
+            time.sleep(wait)
+
+        return BatchItem(name, kwargs, command(**call_kwargs), None)
+    except Exception as error:  # pylint: disable=W0703
+        LOG.debug('Batch call %s(%s) failed: %s', name, kwargs, error)
+        return BatchItem(name, kwargs, None, error)
+
+
+def check_deadline(deadline, wait, bucket=None):
+    """Make sure _deadline_ leaves time after _wait_.
+
+    Raises:
+        AsgardTimeoutError: The deadline would pass first, the token
+            reserved from _bucket_ is given back.
+    """
+    try:
+        deadline.check(wait)
+    except AsgardTimeoutError:
+        if bucket is not None:
+            bucket.refund()
+        raise
+
+
+def run_batch(calls, max_workers=10, rate=None, deadline=None):
+    """Run (command, kwargs) pairs on a thread pool.
+
+    Args:
+        calls: Iterable of (AsgardCommand, dict of kwargs).
+        max_workers: Calls running at the same time.
+        rate: Calls started per second, or a shared TokenBucket.
+        deadline: Seconds, or a Deadline, for all calls. Calls that cannot
+            start in time fail with AsgardTimeoutError.
+
+    Returns:
+        BatchResults in the order of _calls_. Calls are traced as children
+        of the span active when the batch started.
+    """
+    bucket = make_bucket(rate)
+    deadline = Deadline.coerce(deadline)
+
+    def throttled(command, kwargs):
+        """Wait for the rate limit, then run the call."""
+        wait = bucket.reserve() if bucket is not None else 0.0
+        return run_call(command, kwargs, deadline, wait, bucket)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        traced = propagate(throttled)
+        futures = [executor.submit(traced, command, kwargs)
+                   for command, kwargs in calls]
+        return BatchResults(future.result() for future in futures)
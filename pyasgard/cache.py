@@ -0,0 +1,501 @@
+"""Opt-in cache of decoded GET responses.
+
+Results of GET commands are kept for a time to live that can be set per
+command or per resource family, e.g. _ami_ for ``ami.list`` and
+``ami.show``. Any POST command of a family, e.g. ``asg.delete``, drops the
+cached entries of that family and the families related to it::
+
+    client = Asgard(url, cache=ResponseCache(ttl=60, ttls={'ami.list': 300}))
+    client.ami.list()  # Asgard
+    client.ami.list()  # cache
+    client.cache.stats  # {'hits': 1, 'misses': 1, ...}
+
+Results are stored pickled, so callers modifying a returned dict never
+change the cache, and entries have a size for the memory bound.
+
+When Asgard sends an ETag or Last-Modified header, expired entries are not
+thrown away but revalidated: the request carries If-None-Match or
+If-Modified-Since, and a 304 Not Modified answer renews the entry without
+downloading or decoding the body again.
+
+:class:`SQLiteBackend` keeps entries in a file so short lived processes can
+start warm::
+
+    backend = SQLiteBackend(os.path.expanduser('~/.cache/pyasgard'))
+    client = Asgard(url, cache=ResponseCache(backend=backend))
+"""
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode  # pylint: disable=C0411,E0611
+
+CacheEntry = namedtuple(
+    'CacheEntry', ['family', 'expires', 'payload', 'etag', 'last_modified'])
+
+# Seconds to keep results of endpoints that change by the minute
+DEFAULT_TTLS = {
+    'deployment': 0,
+    'server': 0,
+    'task': 0,
+}
+
+# Mutating a family also changes what these families return
+RELATED_FAMILIES = {
+    'asg': ('cluster', 'instance'),
+    'cluster': ('asg', 'instance'),
+    'application': ('instance', ),
+}
+
+
+class MemoryBackend(object):
+    """Thread safe LRU of CacheEntry objects bounded by count and size."""
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        """Set the bounds.
+
+        Args:
+            max_entries: Maximum number of entries.
+            max_bytes: Maximum total size of pickled payloads.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the CacheEntry for _key_ and mark it recently used."""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        """Store _entry_, evicting the least recently used ones."""
+        with self.lock:
+            self.remove(key)
+            if len(entry.payload) > self.max_bytes:
+                return
+
+            self.entries[key] = entry
+            self.size += len(entry.payload)
+
+            while (len(self.entries) > self.max_entries or
+                   self.size > self.max_bytes):
+                self.remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def invalidate(self, families):
+        """Drop every entry of _families_.
+
+        Returns:
+            Number of dropped entries.
+        """
+        with self.lock:
+            keys = [key for key, entry in self.entries.items()
+                    if entry.family in families]
+            for key in keys:
+                self.remove(key)
+            return len(keys)
+
+    def clear(self):
+        """Drop everything."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def remove(self, key):
+        """Drop _key_, the lock must be held."""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry.payload)
+
+    def close(self):
+        """Nothing to release."""
+
+
+class SQLiteBackend(object):
+    """LRU of CacheEntry objects in an SQLite file shared between processes.
+
+    The database runs in WAL mode, so readers never block each other and
+    concurrent writers wait for the lock up to _timeout_. Payloads are
+    pickles, compressed with zlib. Entries are unpickled when read, so only
+    use a _directory_ that no one else can write to.
+
+    Reads do not write: the time an entry was used is kept in memory and
+    written with the next :meth:`set`, or after _touch_batch_ reads, so
+    eviction order is only approximately LRU between processes.
+    """
+
+    SCHEMA = ('CREATE TABLE IF NOT EXISTS responses ('
+              'key TEXT PRIMARY KEY, family TEXT, expires REAL, etag TEXT, '
+              'last_modified TEXT, payload BLOB, used REAL)')
+
+    def __init__(self,
+                 directory,
+                 filename='responses.sqlite3',
+                 max_entries=4096,
+                 max_bytes=256 * 1024 * 1024,
+                 compress=True,
+                 timeout=30,
+                 touch_batch=256):
+        """Open or create the database.
+
+        Args:
+            directory: Path of the cache directory, created if missing.
+            filename: Database file name inside _directory_.
+            max_entries: Maximum number of entries.
+            max_bytes: Maximum total size of stored payloads.
+            compress: Compress payloads with zlib.
+            timeout: Seconds to wait for another process holding the lock.
+            touch_batch: Number of read entries whose use is written at
+                once.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.touch_batch = touch_batch
+        self.touched = {}
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = os.path.join(directory, filename)
+
+        self.connection = sqlite3.connect(self.path,
+                                          timeout=timeout,
+                                          isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(self.SCHEMA)
+        self.connection.execute('CREATE INDEX IF NOT EXISTS responses_family '
+                                'ON responses (family)')
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def get(self, key):
+        """Return the CacheEntry for _key_ and mark it recently used."""
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT family, expires, payload, etag, last_modified '
+                'FROM responses WHERE key = ?', (key, )).fetchone()
+            if row is None:
+                return None
+
+            self.touched[key] = time.time()
+            if len(self.touched) >= self.touch_batch:
+                with self.connection:
+                    self.connection.execute('BEGIN IMMEDIATE')
+                    self.touch()
+
+        family, expires, payload, etag, last_modified = row
+        payload = bytes(payload)
+        if self.compress:
+            payload = zlib.decompress(payload)
+
+        return CacheEntry(family=family,
+                          expires=expires,
+                          payload=payload,
+                          etag=etag,
+                          last_modified=last_modified)
+
+    def set(self, key, entry):
+        """Store _entry_, evicting the least recently used ones."""
+        payload = entry.payload
+        if self.compress:
+            payload = zlib.compress(payload, 1)
+
+        # Commits, or rolls back on error, the transaction begun below
+        with self.lock, self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.touch()
+            if len(payload) > self.max_bytes:
+                self.connection.execute('DELETE FROM responses WHERE key = ?',
+                                        (key, ))
+                return
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES '
+                '(?, ?, ?, ?, ?, ?, ?)',
+                (key, entry.family, entry.expires, entry.etag,
+                 entry.last_modified, sqlite3.Binary(payload), time.time()))
+            self.evict()
+
+    def touch(self):
+        """Write when the entries read since the last write were used.
+
+        Called inside a write transaction.
+        """
+        if self.touched:
+            self.connection.executemany(
+                'UPDATE responses SET used = ? WHERE key = ?',
+                [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+
+    def evict(self):
+        """Drop least recently used entries over the bounds.
+
+        Called inside the write transaction of :meth:`set`.
+        """
+        count, size = self.connection.execute(
+            'SELECT COUNT(*), TOTAL(LENGTH(payload)) FROM responses'
+        ).fetchone()
+
+        rows = self.connection.execute(
+            'SELECT key, LENGTH(payload) FROM responses ORDER BY used')
+        evicted = []
+        for key, length in rows:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            evicted.append((key, ))
+            count -= 1
+            size -= length
+
+        self.connection.executemany('DELETE FROM responses WHERE key = ?',
+                                    evicted)
+        self.evictions += len(evicted)
+
+    def invalidate(self, families):
+        """Drop every entry of _families_.
+
+        Returns:
+            Number of dropped entries.
+        """
+        families = list(families)
+        with self.lock:
+            return self.connection.execute(
+                'DELETE FROM responses WHERE family IN ({0})'.format(
+                    ', '.join('?' * len(families))), families).rowcount
+
+    def clear(self):
+        """Drop everything."""
+        with self.lock:
+            self.connection.execute('DELETE FROM responses')
+
+    def close(self):
+        """Write pending uses and close the database connection."""
+        with self.lock:
+            if self.touched:
+                with self.connection:
+                    self.connection.execute('BEGIN IMMEDIATE')
+                    self.touch()
+            self.connection.close()
+
+
+class ResponseCache(object):
+    """TTL cache of GET command results with invalidation on POST."""
+
+    def __init__(self, ttl=60, ttls=None, backend=None, revalidate=True):
+        """Configure time to live and storage.
+
+        Args:
+            ttl: Default seconds to keep a result, 0 disables caching.
+            ttls: Dict of command, e.g. _ami.list_, or family, e.g. _ami_,
+                to seconds. Extends and overrides :data:`DEFAULT_TTLS`.
+            backend: Storage with the MemoryBackend interface, a
+                MemoryBackend with default bounds when omitted.
+            revalidate: Send conditional requests for expired entries with
+                validators. Results with validators are then kept even with
+                a time to live of 0, and revalidated on every call.
+        """
+        self.log = logging.getLogger(__name__)
+        self.ttl = ttl
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.revalidate = revalidate
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @property
+    def stats(self):
+        """Dict of cache counters.
+
+        A revalidation is a 304 answer to a conditional request, it is not
+        counted as a hit or miss.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'evictions': self.backend.evictions,
+            'invalidations': self.invalidations,
+            'entries': len(self.backend),
+        }
+
+    def ttl_for(self, name):
+        """Seconds to keep results of command _name_, e.g. _asg.show_."""
+        if name in self.ttls:
+            return self.ttls[name]
+        return self.ttls.get(name.split('.')[0], self.ttl)
+
+    @staticmethod
+    def identity(auth, headers):
+        """Digest of the credentials and headers a request is sent with.
+
+        Keeps the results of different users apart without writing their
+        credentials into the backend.
+
+        Args:
+            auth: Auth tuple or object of the request, None without.
+            headers: Dict of request headers, None without.
+
+        Returns:
+            Hex digest, None for anonymous requests without headers.
+        """
+        if not auth and not headers:
+            return None
+        credentials = repr((auth, sorted((headers or {}).items())))
+        return hashlib.sha256(credentials.encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def key(url, params, identity=None):
+        """Cache key of a GET to _url_ with query _params_.
+
+        Args:
+            url: Formatted URL, including the region.
+            params: Dict of query parameters.
+            identity: Digest from :meth:`identity`, None when anonymous.
+        """
+        if identity:
+            url = '{0} {1}'.format(identity, url)
+        if not params:
+            return url
+        if not isinstance(params, dict):
+            return '{0}#{1}'.format(url, params)
+        return '{0}?{1}'.format(url, urlencode(sorted(params.items())))
+
+    def call(self, name, method, url, params, send, handle, identity=None):
+        """Return the cached result of a command or request it.
+
+        Args:
+            name: Command name, e.g. _asg.show_.
+            method: HTTP method of the command.
+            url: Formatted URL, including the region.
+            params: Dict of query parameters or body.
+            send: Callable making the request, takes a dict of extra headers
+                and returns the requests.Response.
+            handle: Callable turning the requests.Response into the result.
+            identity: Digest of the caller's credentials from
+                :meth:`identity`, results are only shared between equal
+                identities.
+
+        Returns:
+            Result of the command.
+        """
+        family = name.split('.')[0]
+
+        if method != 'GET':
+            try:
+                return handle(send())
+            finally:
+                self.invalidate(family)
+
+        ttl = self.ttl_for(name)
+        if ttl <= 0 and not self.revalidate:
+            return handle(send())
+
+        key = self.key(url, params, identity)
+        entry = self.backend.get(key)
+        if entry is not None and entry.expires > time.time():
+            self.count('hits')
+            return pickle.loads(entry.payload)
+
+        response = send(self.conditional_headers(entry))
+        if entry is not None and getattr(response, 'status_code',
+                                         None) == 304:
+            self.count('revalidations')
+            self.backend.set(key, entry._replace(expires=time.time() + ttl))
+            return pickle.loads(entry.payload)
+
+        self.count('misses')
+        result = handle(response)
+        self.store(key, family, ttl, result, response.headers)
+        return result
+
+    def conditional_headers(self, entry):
+        """Headers revalidating _entry_, None without validators."""
+        if entry is None or not self.revalidate:
+            return None
+
+        headers = {}
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, key, family, ttl, result, headers):
+        """Pickle _result_ into the backend for _ttl_ seconds.
+
+        Args:
+            key: Cache key.
+            family: Resource family of the command.
+            ttl: Seconds to keep the result.
+            result: Decoded result.
+            headers: Response headers holding the validators.
+        """
+        etag = headers.get('ETag') if self.revalidate else None
+        last_modified = (headers.get('Last-Modified')
+                         if self.revalidate else None)
+        if ttl <= 0 and not (etag or last_modified):
+            return
+
+        try:
+            payload = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError) as error:
+            self.log.debug('Not caching %s: %s', key, error)
+            return
+
+        self.backend.set(key, CacheEntry(family=family,
+                                         expires=time.time() + ttl,
+                                         payload=payload,
+                                         etag=etag,
+                                         last_modified=last_modified))
+
+    def invalidate(self, family):
+        """Drop entries of _family_ and its related families."""
+        families = set(RELATED_FAMILIES.get(family, ()))
+        families.add(family)
+
+        dropped = self.backend.invalidate(families)
+        self.count('invalidations', dropped)
+        self.log.debug('Invalidated %s cached %s results.', dropped,
+                       sorted(families))
+
+    def count(self, counter, amount=1):
+        """Add _amount_ to _counter_."""
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def clear(self):
+        """Drop every cached result."""
+        self.backend.clear()
+
+    def close(self):
+        """Release the backend."""
+        self.backend.close()
@@ -0,0 +1,199 @@
+"""Optional capture of raw Asgard responses for debugging.
+
+Nothing is captured unless a capture object is passed to the client::
+
+    from pyasgard.capture import DirectoryCapture, MemoryCapture
+
+    # Keep the last 50 responses in memory
+    client = Asgard(url, capture=MemoryCapture(maxlen=50))
+    client.asg.list()
+    client.capture.responses[-1].text
+
+    # Write every tenth response, and all errors, to a directory
+    client = Asgard(url, capture=DirectoryCapture('/tmp/asgard',
+                                                  sample_rate=0.1))
+"""
+import io
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # pylint: disable=C0411,E0401
+
+CapturedResponse = namedtuple('CapturedResponse', [
+    'timestamp', 'kind', 'method', 'url', 'status_code', 'text',
+    'content_type'
+])
+
+
+def truncate(text, max_bytes):
+    """Cut _text_ to at most _max_bytes_ of UTF-8, on a character boundary."""
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', 'ignore')
+
+
+class ResponseCapture(object):
+    """Base class for response sinks.
+
+    Subclasses implement :meth:`record`. Responses of kind _error_ are always
+    captured, _json_ and _html_ responses are sampled with _sample_rate_.
+    """
+
+    def __init__(self, sample_rate=1.0, max_bytes=None):
+        """Configure sampling and size limits.
+
+        Args:
+            sample_rate: Fraction of successful responses to keep, 0.0 - 1.0.
+            max_bytes: Truncate each captured body to this many bytes of
+                UTF-8.
+        """
+        self.log = logging.getLogger(__name__)
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+
+    def capture(self, response, kind):
+        """Capture _response_ if it is sampled.
+
+        Args:
+            response: requests.Response object.
+            kind: One of _json_, _html_ or _error_.
+        """
+        if kind != 'error' and random.random() >= self.sample_rate:
+            return
+
+        text = response.text
+        if self.max_bytes is not None:
+            text = truncate(text, self.max_bytes)
+
+        request = getattr(response, 'request', None)
+        self.record(CapturedResponse(timestamp=time.time(),
+                                     kind=kind,
+                                     method=getattr(request, 'method', None),
+                                     url=response.url,
+                                     status_code=response.status_code,
+                                     text=text,
+                                     content_type=response.headers.get(
+                                         'Content-Type', '')))
+
+    def record(self, captured):
+        """Store a CapturedResponse."""
+        raise NotImplementedError
+
+    def close(self):
+        """Flush and release resources."""
+
+
+class MemoryCapture(ResponseCapture):
+    """Ring buffer of the last _maxlen_ responses."""
+
+    def __init__(self, maxlen=100, **kwargs):
+        super(MemoryCapture, self).__init__(**kwargs)
+        self.buffer = deque(maxlen=maxlen)
+
+    @property
+    def responses(self):
+        """List of CapturedResponse, oldest first."""
+        return list(self.buffer)
+
+    def record(self, captured):
+        self.buffer.append(captured)
+
+
+class DirectoryCapture(ResponseCapture):
+    """Write responses to uniquely named files from a background thread.
+
+    Files are named ``<time>-<pid>-<sequence>-<kind>.<json|html>`` so
+    concurrent threads and processes never share a file, the extension
+    follows the Content-Type. Writing stops once _max_total_bytes_ have been
+    written, and responses are dropped rather than blocking the caller when
+    _queue_size_ writes are already pending.
+    """
+
+    def __init__(self,
+                 directory,
+                 max_total_bytes=None,
+                 queue_size=100,
+                 **kwargs):
+        """Start the writer thread.
+
+        Args:
+            directory: Path to write into, created if missing.
+            max_total_bytes: Stop writing after this many bytes.
+            queue_size: Pending writes before responses are dropped.
+            **kwargs: _sample_rate_ and _max_bytes_ for ResponseCapture.
+        """
+        super(DirectoryCapture, self).__init__(**kwargs)
+        self.directory = directory
+        self.max_total_bytes = max_total_bytes
+        self.total_bytes = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.sequence = itertools.count()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.writer,
+                                       name='pyasgard-capture')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, captured):
+        try:
+            self.queue.put_nowait(captured)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            self.log.debug('Capture queue full, dropped %s', captured.url)
+
+    def writer(self):
+        """Drain the queue until close() sends None."""
+        while True:
+            captured = self.queue.get()
+            try:
+                if captured is None:
+                    return
+                self.write(captured)
+            except (IOError, OSError) as error:
+                self.log.warning('Could not capture response: %s', error)
+            finally:
+                self.queue.task_done()
+
+    def write(self, captured):
+        """Write one CapturedResponse to its own file."""
+        content = captured.text.encode('utf-8')
+        size = len(content)
+        with self.lock:
+            if (self.max_total_bytes is not None and
+                    self.total_bytes + size > self.max_total_bytes):
+                self.dropped += 1
+                return
+            self.total_bytes += size
+
+        extension = 'json' if 'json' in captured.content_type else 'html'
+        filename = '{0}-{1}-{2:06d}-{3}.{4}'.format(
+            time.strftime('%Y%m%dT%H%M%S', time.gmtime(captured.timestamp)),
+            os.getpid(), next(self.sequence), captured.kind, extension)
+
+        with io.open(os.path.join(self.directory, filename), 'wb') as output:
+            output.write(content)
+
+    def flush(self):
+        """Block until pending responses are written."""
+        self.queue.join()
+
+    def close(self):
+        """Write pending responses and stop the writer thread."""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
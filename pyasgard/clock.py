@@ -0,0 +1,11 @@
+"""Clocks for measuring durations.
+
+Python 2.7 has neither :func:`time.monotonic` nor :func:`time.perf_counter`,
+durations fall back to :func:`time.time` there.
+"""
+import time
+
+# HACK: Python 2.7 is missing monotonic clocks
+# pylint: disable=C0103
+monotonic = getattr(time, 'monotonic', time.time)
+perf_counter = getattr(time, 'perf_counter', time.time)
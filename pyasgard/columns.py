@@ -0,0 +1,178 @@
+"""Columnar export of list endpoints for fleet analytics.
+
+:func:`to_columns` turns a list of records into typed column arrays, NumPy
+arrays when NumPy is installed and :class:`array.array` otherwise::
+
+    columns = client.instance.list(as_columns=True)
+    columns['instanceType'].counts()  # {'m3.large': 120, 't2.micro': 4}
+
+    groups = client.asg.list(as_columns=['autoScalingGroupName',
+                                         'desiredCapacity'])
+    sum(groups['desiredCapacity'])
+
+Integers become int64 and booleans int8. Fractions, and numbers or
+booleans with missing values, become float64 with NaN for missing values.
+Strings are dictionary encoded: int32 codes into a tuple of categories, -1
+for missing values. Other values, e.g. nested dicts, stay a list.
+"""
+import array
+from collections import OrderedDict
+
+from .fleet import pick
+
+# HACK: NumPy is optional
+try:
+    import numpy
+except ImportError:
+    numpy = None  # pylint: disable=C0103
+
+MISSING = float('nan')
+
+STRING_TYPES = (str, type(u''))
+
+
+def make_array(typecode, values):
+    """Typed array of _values_ from a struct style _typecode_."""
+    if numpy is not None:
+        return numpy.array(values, dtype=numpy.dtype(typecode))
+    return array.array(typecode, values)
+
+
+class DictionaryColumn(object):
+    """Dictionary encoded string column.
+
+    Attributes:
+        codes: int32 array of indexes into _categories_, -1 when missing.
+        categories: Tuple of the distinct strings in order of appearance.
+    """
+
+    __slots__ = ('codes', 'categories')
+
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        code = self.codes[index]
+        return self.categories[code] if code >= 0 else None
+
+    def __repr__(self):
+        return 'DictionaryColumn({0} rows, {1} categories)'.format(
+            len(self.codes), len(self.categories))
+
+    def decode(self):
+        """List of the strings, None for missing values."""
+        return [self.categories[code] if code >= 0 else None
+                for code in self.codes]
+
+    def counts(self):
+        """OrderedDict of category to number of rows, most common first."""
+        if numpy is not None:
+            codes = self.codes[self.codes >= 0]
+            totals = numpy.bincount(codes,
+                                    minlength=len(self.categories)).tolist()
+        else:
+            totals = [0] * len(self.categories)
+            for code in self.codes:
+                if code >= 0:
+                    totals[code] += 1
+
+        return OrderedDict(sorted(zip(self.categories, totals),
+                                  key=lambda item: -item[1]))
+
+
+class Columns(OrderedDict):
+    """Column name to array, all of the same length.
+
+    Attributes:
+        length: Number of rows.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(Columns, self).__init__(*args, **kwargs)
+        self.length = 0
+
+    def __repr__(self):
+        return 'Columns({0} rows: {1})'.format(self.length,
+                                              ', '.join(self.keys()))
+
+
+def encode(values):
+    """Convert one column of Python _values_ to its typed form."""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add(bool)
+        elif isinstance(value, int):
+            kinds.add(int)
+        elif isinstance(value, float):
+            kinds.add(float)
+        elif isinstance(value, STRING_TYPES):
+            kinds.add(str)
+        else:
+            return list(values)
+
+    missing = None in values if kinds else False
+    if kinds == set([str]):
+        categories = OrderedDict()
+        codes = [-1 if value is None else categories.setdefault(
+            value, len(categories)) for value in values]
+        return DictionaryColumn(make_array('i', codes), tuple(categories))
+    if kinds == set([bool]) and not missing:
+        return make_array('b', values)
+    if kinds == set([int]) and not missing:
+        return make_array('q', values)
+    if kinds and kinds <= set([bool, int, float]):
+        return make_array('d', [MISSING if value is None else value
+                                for value in values])
+    return list(values)
+
+
+def to_columns(records, fields=None):
+    """Turn _records_ into Columns.
+
+    Args:
+        records: Iterable of dicts, consumed once, e.g. a streamed list.
+        fields: Dotted paths like _ec2Instance.subnetId_ to export. By
+            default every top level key holding a scalar.
+
+    Returns:
+        Columns of the requested fields.
+
+    Raises:
+        TypeError: _records_ is a single dict, e.g. the result of a _show_
+            command or an HTML page, instead of a list.
+    """
+    if isinstance(records, dict):
+        raise TypeError(
+            'Columns need a list of records, got a dict with keys {0}'.format(
+                sorted(records)[:5]))
+
+    values = OrderedDict((field, []) for field in fields or ())
+    length = 0
+
+    for record in records:
+        if fields:
+            for field in fields:
+                values[field].append(pick(record, field))
+        else:
+            for key, value in record.items():
+                if isinstance(value, (dict, list)):
+                    continue
+                if key not in values:
+                    values[key] = [None] * length
+                values[key].append(value)
+            for column in values.values():
+                if len(column) == length:
+                    column.append(None)
+        length += 1
+
+    columns = Columns((field, encode(column))
+                      for field, column in values.items())
+    columns.length = length
+    return columns
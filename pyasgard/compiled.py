@@ -0,0 +1,239 @@
+"""Compiled, immutable views of MAPPING_TABLE endpoints.
+
+Every call used to re-derive the same metadata from its endpoint mapping:
+template regex scans, parameter lists, the default body and the IPython
+signature. :func:`compile_endpoint` does that once per endpoint mapping and
+returns a cached :class:`Endpoint` descriptor.
+
+Endpoint mappings are plain dicts that users may edit, e.g. to add a dynamic
+``selectedLoadBalancersForVpcId...`` default for ``asg.create``. Lookups
+compare a cheap :func:`fingerprint` of the mapping and recompile when keys
+were added or removed or values replaced. Editing a value in place, e.g. one
+default, needs :func:`invalidate` (or
+:meth:`pyasgard.Asgard.reload_endpoints`). The cache holds the
+_ENDPOINT_CACHE_SIZE_ most recently used mappings.
+"""
+import threading
+from collections import OrderedDict
+from string import Template
+
+from .deadline import normalize_timeout
+
+# HACK: Python 2.7 is missing cool modules
+try:
+    from inspect import Parameter, Signature
+except ImportError:
+    Parameter = Signature = None  # pylint: disable=C0103
+
+try:
+    from types import MappingProxyType
+except ImportError:
+    MappingProxyType = dict  # pylint: disable=C0103
+
+ENDPOINT_CACHE_SIZE = 1024
+
+# id(mapping) -> (mapping, Endpoint), least recently used first; holding the
+# mapping keeps its id unique while cached
+ENDPOINT_CACHE = OrderedDict()
+ENDPOINT_LOCK = threading.Lock()
+
+# path -> (Template, path keys)
+PATH_CACHE = {}
+
+
+def compile_path(path):
+    """Compile an endpoint path once.
+
+    Args:
+        path: String of endpoint path with possible _${parameter}_
+            templated parameters.
+
+    Returns:
+        Tuple of (string.Template, tuple of parameter names in _path_).
+    """
+    try:
+        return PATH_CACHE[path]
+    except KeyError:
+        template = Template(path)
+        keys = tuple(param[2] for param in Template.pattern.findall(path))
+        PATH_CACHE[path] = compiled = (template, keys)
+        return compiled
+
+
+def fingerprint(api_map):
+    """Summary of _api_map_ that changes when the mapping is edited.
+
+    Adding or removing keys of the mapping, its _default_params_ or its
+    _valid_params_, or replacing a value of the mapping, changes it.
+
+    Returns:
+        Tuple, compare with ==.
+    """
+    return (tuple(id(value) for value in api_map.values()),
+            len(api_map.get('default_params') or ()),
+            len(api_map.get('valid_params') or ()))
+
+
+def compile_endpoint(api_map):
+    """Return the Endpoint descriptor for an endpoint mapping.
+
+    Args:
+        api_map: Dict from MAPPING_TABLE, e.g. MAPPING_TABLE['asg']['show'].
+
+    Returns:
+        Endpoint describing _api_map_, compiled again when the mapping was
+        edited since.
+    """
+    key = id(api_map)
+    with ENDPOINT_LOCK:
+        cached = ENDPOINT_CACHE.pop(key, None)
+        if (cached is not None and cached[0] is api_map and
+                cached[1].fingerprint == fingerprint(api_map)):
+            ENDPOINT_CACHE[key] = cached
+            return cached[1]
+
+    endpoint = Endpoint(api_map)
+    with ENDPOINT_LOCK:
+        ENDPOINT_CACHE[key] = (api_map, endpoint)
+        while len(ENDPOINT_CACHE) > ENDPOINT_CACHE_SIZE:
+            ENDPOINT_CACHE.popitem(last=False)
+    return endpoint
+
+
+def invalidate(api_map=None):
+    """Forget the Endpoint compiled for _api_map_, or every Endpoint.
+
+    Args:
+        api_map: Edited endpoint mapping, None to clear the whole cache.
+    """
+    with ENDPOINT_LOCK:
+        if api_map is None:
+            ENDPOINT_CACHE.clear()
+        else:
+            ENDPOINT_CACHE.pop(id(api_map), None)
+
+
+class Endpoint(object):  # pylint: disable=R0902
+    """Immutable descriptor of one MAPPING_TABLE endpoint.
+
+    Attributes:
+        path: Endpoint path string.
+        template: Precompiled string.Template of _path_.
+        path_keys: Tuple of parameters substituted into _path_.
+        method: HTTP method, None for pure branches.
+        status: Expected HTTP status.
+        idempotent: Whether repeating a call is safe, GETs by default.
+        timeout: (connect, read) tuple, None for the client's timeout.
+        doc: Endpoint docstring.
+        valid_params: Frozenset of _valid_params_.
+        default_keys: Frozenset of _default_params_ keys.
+        accepted_params: Frozenset of keywords allowed in the body.
+        has_defaults: Whether _default_params_ was given at all.
+        default_body: Read only mapping of _default_params_.
+        all_params: Read only mapping of every parameter to its default.
+        signature: inspect.Signature for IPython, None when unsupported.
+        pretty_params: String form of _all_params_, e.g. (a='', b=1).
+        fingerprint: :func:`fingerprint` of the mapping when compiled.
+    """
+
+    __slots__ = ('path', 'template', 'path_keys', 'method', 'status',
+                 'idempotent', 'timeout', 'doc', 'valid_params',
+                 'default_keys', 'accepted_params', 'has_defaults',
+                 'default_body', 'all_params', 'signature', 'pretty_params',
+                 'fingerprint')
+
+    def __init__(self, api_map):
+        """Compile _api_map_.
+
+        Args:
+            api_map: Dict containing keys: path, method, status,
+                default_params, and valid_params.
+        """
+        set_slot = super(Endpoint, self).__setattr__
+
+        path = api_map.get('path', '')
+        template, path_keys = compile_path(path)
+
+        valid_params = api_map.get('valid_params', ())
+        if isinstance(valid_params, str):
+            valid_params = (valid_params, )
+
+        default_params = api_map.get('default_params', {})
+
+        all_params = {}
+        for param in path_keys:
+            all_params[param] = ''
+        for param in valid_params:
+            all_params[param] = ''
+        all_params.update(default_params)
+
+        set_slot('fingerprint', fingerprint(api_map))
+        set_slot('path', path)
+        set_slot('template', template)
+        set_slot('path_keys', path_keys)
+        set_slot('method', api_map.get('method'))
+        set_slot('status', api_map.get('status'))
+        set_slot('idempotent',
+                 api_map.get('idempotent', api_map.get('method') == 'GET'))
+        set_slot('timeout', normalize_timeout(api_map.get('timeout')))
+        set_slot('doc', api_map.get('doc'))
+        set_slot('valid_params', frozenset(valid_params))
+        set_slot('default_keys', frozenset(default_params))
+        set_slot('accepted_params', self.valid_params | self.default_keys)
+        set_slot('has_defaults', 'default_params' in api_map)
+        set_slot('default_body', MappingProxyType(dict(default_params)))
+        set_slot('all_params', MappingProxyType(all_params))
+        set_slot('signature', build_signature(all_params))
+        set_slot('pretty_params', '({0})'.format(', '.join(sorted(
+            '{0!s}={1!r}'.format(key, default)
+            for key, default in all_params.items()))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Endpoint is immutable.')
+
+    def __repr__(self):
+        return 'Endpoint({0} {1})'.format(self.method, self.path)
+
+    def validate(self, keyword, api_call):
+        """Check _keyword_ is accepted by this Endpoint.
+
+        Args:
+            keyword: Name of the keyword argument.
+            api_call: Command name for the error message.
+
+        Raises:
+            TypeError: If _keyword_ is not accepted.
+        """
+        if keyword in self.accepted_params:
+            return
+
+        if not self.has_defaults:
+            raise TypeError('Was not expecting any arguments.')
+
+        raise TypeError(('{0}() got an unexpected keyword '
+                         'argument "{1}"').format(api_call, keyword))
+
+
+def build_signature(all_params):
+    """Construct a pretty function signature for dynamic commands.
+
+    The inspect modules Parameter and Signature are fully supported in
+    Python 3.5, broken in 3.4, and missing in 2.7.
+
+    Args:
+        all_params: Dict of parameter names to default values.
+
+    Returns:
+        Signature object, None when it cannot be built.
+    """
+    if Signature is None:
+        return None
+
+    try:
+        return Signature(parameters=[
+            Parameter(param, Parameter.KEYWORD_ONLY, default=default)
+            for param, default in sorted(all_params.items())
+        ])
+    except (TypeError, ValueError):
+        # Python 3.4 and parameter names that are not identifiers
+        return None
@@ -0,0 +1,89 @@
+"""Request timeouts and overall deadlines.
+
+Timeouts follow requests: a number for both the connect and the read
+timeout, or a (connect, read) tuple. The most specific one wins::
+
+    client = Asgard(url, timeout=(3, 15))         # every request
+    MAPPING_TABLE['server']['uptime']['timeout']  # one endpoint, (2, 2)
+    client.instance.list(request_timeout=(3, 300))  # one call
+
+A :class:`Deadline` bounds a whole call, retries and backoff included. Each
+attempt's timeouts shrink to the time left::
+
+    client.cluster.list(deadline=5)
+    client.batch(calls, deadline=Deadline(30))
+"""
+from .clock import monotonic
+from .exceptions import AsgardTimeoutError
+
+DEFAULT_TIMEOUT = (15, 15)
+
+
+def normalize_timeout(timeout):
+    """Return _timeout_ as a (connect, read) tuple, None stays None."""
+    if timeout is None or isinstance(timeout, tuple):
+        return timeout
+    if isinstance(timeout, list):
+        return tuple(timeout)
+    return (timeout, timeout)
+
+
+class Deadline(object):
+    """Point in time a call has to finish by."""
+
+    def __init__(self, seconds, clock=monotonic):
+        """Start the countdown.
+
+        Args:
+            seconds: Time allowed from now.
+            clock: Function returning seconds, for tests.
+        """
+        self.seconds = seconds
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def __repr__(self):
+        return 'Deadline({0:.3f}s left)'.format(self.remaining())
+
+    @classmethod
+    def coerce(cls, value):
+        """Return a Deadline for _value_ seconds, Deadlines and None as is."""
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+    def remaining(self):
+        """Seconds left, negative once expired."""
+        return self.expires - self.clock()
+
+    @property
+    def expired(self):
+        """Whether no time is left."""
+        return self.remaining() <= 0
+
+    def check(self, wait=0.0):
+        """Make sure time is left after waiting _wait_ seconds.
+
+        Raises:
+            AsgardTimeoutError: The deadline would pass first.
+        """
+        if self.remaining() <= wait:
+            raise AsgardTimeoutError(
+                'Deadline of {0}s exceeded.'.format(self.seconds))
+
+    def clamp(self, timeout):
+        """Shrink the timeouts of one request to the time left.
+
+        Args:
+            timeout: Number or (connect, read) tuple, None for no timeout.
+
+        Returns:
+            (connect, read) tuple.
+
+        Raises:
+            AsgardTimeoutError: The deadline already passed.
+        """
+        self.check()
+        remaining = self.remaining()
+        return tuple(remaining if part is None else min(part, remaining)
+                     for part in normalize_timeout(timeout) or (None, None))
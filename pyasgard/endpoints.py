@@ -1,4 +1,11 @@
-"""Asgard API mapping."""
+"""Asgard API mapping.
+
+Endpoints are dicts of _path_, _method_, expected _status_ and optionally
+_doc_, _valid_params_, _default_params_, _idempotent_ and _timeout_.
+Idempotent endpoints, by default every GET, may be retried by a
+RetryPolicy. A _timeout_, in seconds or as a (connect, read) tuple,
+overrides the client's timeout.
+"""
 INSTANCE_TYPE = 't2.micro'
 
 MAPPING_TABLE = {
@@ -179,6 +186,7 @@ MAPPING_TABLE = {
             'path': '/cluster/save',
             'method': 'POST',
             'status': 200,
+            'idempotent': True,
             'default_params': {
                 'ticket': '',
                 'name': '',
@@ -190,6 +198,7 @@ MAPPING_TABLE = {
             'path': '/cluster/save',
             'method': 'POST',
             'status': 200,
+            'idempotent': True,
             'default_params': {
                 'ticket': '',
                 'name': '',
@@ -249,6 +258,7 @@ MAPPING_TABLE = {
             'path': '/cluster/resize',
             'method': 'POST',
             'status': 200,
+            'idempotent': True,
         },
         'show': {
             'doc': """Show details for a Cluster.
@@ -427,6 +437,7 @@ MAPPING_TABLE = {
             'path': '/instance/list.json',
             'method': 'GET',
             'status': 200,
+            'timeout': (15, 120),
         },
         'show': {
             'doc': """Show details for an Instance.
@@ -572,6 +583,7 @@ MAPPING_TABLE = {
             'path': '/server/uptime',
             'method': 'GET',
             'status': 200,
+            'timeout': 2,
         },
         'ip': {
             'path': '/server/ip',
@@ -27,18 +27,36 @@ class AsgardReturnedError(AsgardError):
     """Embedded error or message in HTML returned from Asgard."""
 
     def __init__(self, htmldict):
-        """Save HTMLToDict object for inspection.
+        """Save the page for inspection.
 
         Args:
-            htmldict: HTMLToDict object.
+            htmldict: LazyHTMLDict or HTMLToDict object.
         """
         super(AsgardReturnedError, self).__init__('Asgard returned error.')
 
         self.htmldict = htmldict
-        self.issues = [
-            issue.text
-            for issue in htmldict.soup.find_all(class_=('message', 'errors'))
-        ]
+        self.issues = list(htmldict.issues)
 
     def __str__(self):
         return '\n'.join(self.issues)
+
+
+class AsgardTimeoutError(AsgardError):
+    """Deadline of a call ran out before Asgard answered."""
+
+    def __init__(self, msg):
+        super(AsgardTimeoutError, self).__init__(msg, error_code=408)
+
+
+class AsgardTaskError(AsgardError):
+    """Asgard task finished with status failed."""
+
+    def __init__(self, task):
+        """Save the task for inspection.
+
+        Args:
+            task: Dict of the failed task.
+        """
+        super(AsgardTaskError, self).__init__(
+            'Task {0} failed: {1}'.format(task.get('id'), task.get('name')))
+        self.task = task
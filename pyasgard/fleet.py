@@ -0,0 +1,394 @@
+"""In-memory index of instances, ASGs, launch configs and AMIs.
+
+:class:`FleetIndex` loads ``instance.list``, ``asg.list``,
+``launchconfig.list`` and ``ami.list`` once, keeps every record as a compact
+namedtuple and answers lookups from hash indexes instead of scanning lists
+of dicts::
+
+    fleet = FleetIndex(client)
+    fleet.groups.find(ami='ami-12345678')
+    fleet.instances.find(app='helloworld', subnet='subnet-1234abcd')
+    fleet.launch_configs.find(security_group='sg-1234abcd')
+
+    fleet.refresh('instance')  # re-index only what changed
+
+Lookups cost O(k) for k matches. Several criteria intersect their index
+sets, starting from the smallest.
+"""
+import logging
+from collections import namedtuple
+
+FAMILIES = ('instance', 'asg', 'launchconfig', 'ami')
+
+
+class InstanceRecord(
+        namedtuple('InstanceRecord', [
+            'instance_id', 'app', 'asg', 'ami', 'subnet', 'security_groups',
+            'state', 'instance_type'
+        ])):
+    """Instance of _instance.list_."""
+
+    __slots__ = ()
+
+
+class GroupRecord(
+        namedtuple('GroupRecord', [
+            'name', 'app', 'launch_config', 'ami', 'subnets',
+            'security_groups', 'instance_ids'
+        ])):
+    """Auto Scaling Group of _asg.list_.
+
+    _ami_ and _security_groups_ come from its launch config.
+    """
+
+    __slots__ = ()
+
+
+class LaunchConfigRecord(
+        namedtuple('LaunchConfigRecord', [
+            'name', 'ami', 'security_groups', 'instance_type'
+        ])):
+    """Launch configuration of _launchconfig.list_."""
+
+    __slots__ = ()
+
+
+class ImageRecord(
+        namedtuple('ImageRecord', ['ami', 'name', 'state', 'app'])):
+    """AMI of _ami.list_."""
+
+    __slots__ = ()
+
+
+def pick(item, *paths):
+    """Return the first value found at one of the dotted _paths_ in _item_.
+
+    Args:
+        item: Dict from Asgard.
+        *paths: Keys like _ec2Instance.subnetId_.
+
+    Returns:
+        The value, None when no path exists.
+    """
+    for path in paths:
+        value = item
+        for key in path.split('.'):
+            if not isinstance(value, dict):
+                value = None
+                break
+            value = value.get(key)
+        if value is not None:
+            return value
+    return None
+
+
+def group_ids(groups):
+    """Tuple of security group IDs or names from strings or dicts."""
+    return tuple(sorted(
+        group if not isinstance(group, dict) else
+        group.get('groupId') or group.get('groupName')
+        for group in groups or ()))
+
+
+def app_of(name):
+    """Application of an ASG or launch config name, e.g. _app-v001_."""
+    return name.split('-')[0].lower() if name else None
+
+
+def instance_record(item):
+    """Build an InstanceRecord from an _instance.list_ entry."""
+    return InstanceRecord(
+        instance_id=pick(item, 'instanceId', 'ec2Instance.instanceId'),
+        app=(pick(item, 'appName') or '').lower() or None,
+        asg=pick(item, 'autoScalingGroupName'),
+        ami=pick(item, 'amiId', 'imageId', 'ec2Instance.imageId'),
+        subnet=pick(item, 'subnetId', 'ec2Instance.subnetId'),
+        security_groups=group_ids(pick(item, 'securityGroups',
+                                       'ec2Instance.securityGroups')),
+        state=pick(item, 'state.name', 'ec2Instance.state.name', 'state',
+                   'status'),
+        instance_type=pick(item, 'instanceType', 'ec2Instance.instanceType'))
+
+
+def group_record(item):
+    """Build a GroupRecord from an _asg.list_ entry, without launch config."""
+    name = pick(item, 'autoScalingGroupName', 'name')
+
+    subnets = pick(item, 'VPCZoneIdentifier', 'vpcZoneIdentifier') or ''
+    if not isinstance(subnets, list):
+        subnets = subnets.split(',')
+
+    return GroupRecord(
+        name=name,
+        app=app_of(name),
+        launch_config=pick(item, 'launchConfigurationName'),
+        ami=None,
+        subnets=tuple(sorted(subnet.strip() for subnet in subnets
+                             if subnet.strip())),
+        security_groups=(),
+        instance_ids=tuple(
+            instance.get('instanceId') if isinstance(instance, dict) else
+            instance for instance in pick(item, 'instances') or ()))
+
+
+def launch_config_record(item):
+    """Build a LaunchConfigRecord from a _launchconfig.list_ entry."""
+    return LaunchConfigRecord(
+        name=pick(item, 'launchConfigurationName', 'name'),
+        ami=pick(item, 'imageId'),
+        security_groups=group_ids(pick(item, 'securityGroups')),
+        instance_type=pick(item, 'instanceType'))
+
+
+def image_record(item):
+    """Build an ImageRecord from an _ami.list_ entry."""
+    return ImageRecord(ami=pick(item, 'imageId', 'id'),
+                       name=pick(item, 'name'),
+                       state=pick(item, 'state'),
+                       app=(pick(item, 'appName') or '').lower() or None)
+
+
+class Table(object):
+    """Records by primary key with hash indexes on chosen fields.
+
+    Fields holding tuples, e.g. _security_groups_, index every element.
+    """
+
+    def __init__(self, key, fields):
+        """Create an empty table.
+
+        Args:
+            key: Field name of the primary key.
+            fields: Dict of criterion name to record field name.
+        """
+        self.key = key
+        self.fields = fields
+        self.records = {}
+        self.indexes = dict((name, {}) for name in fields)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records.values())
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def get(self, key, default=None):
+        """Return the record with primary key _key_."""
+        return self.records.get(key, default)
+
+    def values(self, record, criterion):
+        """Indexed values of _record_ for _criterion_."""
+        value = getattr(record, self.fields[criterion])
+        if isinstance(value, tuple):
+            return value
+        if value is None:
+            return ()
+        return (value, )
+
+    def add(self, record):
+        """Insert or replace _record_.
+
+        Returns:
+            False when an equal record was stored already.
+        """
+        key = getattr(record, self.key)
+        old = self.records.get(key)
+        if old == record:
+            return False
+        if old is not None:
+            self.unindex(key, old)
+
+        self.records[key] = record
+        for criterion, index in self.indexes.items():
+            for value in self.values(record, criterion):
+                index.setdefault(value, set()).add(key)
+        return True
+
+    def remove(self, key):
+        """Drop the record with primary key _key_."""
+        record = self.records.pop(key, None)
+        if record is not None:
+            self.unindex(key, record)
+
+    def unindex(self, key, record):
+        """Remove _key_ from the index entries of _record_."""
+        for criterion, index in self.indexes.items():
+            for value in self.values(record, criterion):
+                keys = index.get(value)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del index[value]
+
+    def sync(self, records):
+        """Make the table hold exactly _records_, touching only changes.
+
+        Returns:
+            Dict of _added_or_changed_ and _removed_ counts.
+        """
+        seen = set()
+        changed = 0
+        for record in records:
+            key = getattr(record, self.key)
+            if key is None:
+                continue
+            seen.add(key)
+            changed += self.add(record)
+
+        gone = [key for key in self.records if key not in seen]
+        for key in gone:
+            self.remove(key)
+
+        return {'added_or_changed': changed, 'removed': len(gone)}
+
+    def keys(self, **criteria):
+        """Set of primary keys matching all _criteria_."""
+        if not criteria:
+            return set(self.records)
+
+        for criterion in criteria:
+            if criterion not in self.indexes:
+                raise TypeError('Cannot look up by "{0}", options are: '
+                                '{1}'.format(criterion, sorted(self.indexes)))
+
+        matches = sorted(
+            (self.indexes[criterion].get(value, ())
+             for criterion, value in criteria.items()), key=len)
+        return set(matches[0]).intersection(*matches[1:])
+
+    def find(self, **criteria):
+        """List of records matching all _criteria_, sorted by key.
+
+        Raises:
+            TypeError: A criterion is not indexed.
+        """
+        return [self.records[key] for key in sorted(self.keys(**criteria))]
+
+
+class FleetIndex(object):
+    """Indexed snapshot of a region's fleet."""
+
+    def __init__(self, client=None, load=True):
+        """Create the tables and load them from _client_.
+
+        Args:
+            client: :class:`pyasgard.Asgard` of the region, None to fill
+                the index with :meth:`update` only.
+            load: Refresh every family right away.
+        """
+        self.log = logging.getLogger(__name__)
+        self.client = client
+
+        self.instances = Table('instance_id', {
+            'app': 'app',
+            'asg': 'asg',
+            'ami': 'ami',
+            'subnet': 'subnet',
+            'security_group': 'security_groups',
+            'state': 'state',
+        })
+        self.groups = Table('name', {
+            'app': 'app',
+            'launch_config': 'launch_config',
+            'ami': 'ami',
+            'subnet': 'subnets',
+            'security_group': 'security_groups',
+            'instance': 'instance_ids',
+        })
+        self.launch_configs = Table('name', {
+            'ami': 'ami',
+            'security_group': 'security_groups',
+        })
+        self.images = Table('ami', {'app': 'app', 'state': 'state'})
+
+        # GroupRecords before joining their launch configs
+        self.group_bases = []
+
+        if client is not None and load:
+            self.refresh()
+
+    def __repr__(self):
+        return ('FleetIndex(instances={0}, groups={1}, launch_configs={2}, '
+                'images={3})').format(len(self.instances), len(self.groups),
+                                      len(self.launch_configs),
+                                      len(self.images))
+
+    def refresh(self, *families):
+        """Reload _families_ from Asgard, all of them by default.
+
+        Launch configs load before ASGs, which take their AMI and security
+        groups from them.
+
+        Args:
+            *families: Names of _FAMILIES_.
+
+        Returns:
+            Dict of family to :meth:`Table.sync` counts.
+
+        Raises:
+            TypeError: The index was created without a client.
+            ValueError: A family is not one of _FAMILIES_, nothing is
+                reloaded then.
+        """
+        if self.client is None:
+            raise TypeError('FleetIndex has no client to refresh from, '
+                            'fill it with update() instead.')
+
+        for family in families:
+            if family not in FAMILIES:
+                raise ValueError(
+                    'Unknown family "{0}", options are: {1}'.format(
+                        family, FAMILIES))
+
+        wanted = families or FAMILIES
+        changes = {}
+        for family in ('launchconfig', 'asg', 'instance', 'ami'):
+            if family in wanted:
+                command = self.client.resolve('{0}.list'.format(family))
+                changes[family] = self.update(family, command())
+        return changes
+
+    def update(self, family, items):
+        """Replace _family_ with the raw _items_ of its list command.
+
+        Args:
+            family: Name of _FAMILIES_.
+            items: Iterable of dicts, e.g. the result of _instance.list_.
+
+        Returns:
+            Dict of _added_or_changed_ and _removed_ counts.
+        """
+        if family == 'instance':
+            return self.instances.sync(instance_record(item)
+                                       for item in items)
+        if family == 'ami':
+            return self.images.sync(image_record(item) for item in items)
+        if family == 'launchconfig':
+            changes = self.launch_configs.sync(
+                launch_config_record(item) for item in items)
+            if changes['added_or_changed'] or changes['removed']:
+                self.sync_groups()
+            return changes
+        if family == 'asg':
+            self.group_bases = [group_record(item) for item in items]
+            return self.sync_groups()
+
+        raise ValueError('Unknown family "{0}", options are: {1}'.format(
+            family, FAMILIES))
+
+    def sync_groups(self):
+        """Join ASGs with their launch configs, re-index only changes."""
+        launch_configs = self.launch_configs.records
+
+        def joined(group):
+            """Copy AMI and security groups from the launch config."""
+            config = launch_configs.get(group.launch_config)
+            if config is None:
+                return group
+            return group._replace(ami=config.ami,
+                                  security_groups=config.security_groups)
+
+        return self.groups.sync(joined(group) for group in self.group_bases)
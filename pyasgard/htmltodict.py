@@ -1,22 +1,33 @@
 # -*- coding: UTF-8 -*-
-"""Convert HTML to dict with some help from Beautiful Soup 4.
+"""Convert HTML to dict in a single pass.
 
 Original code found: http://www.xavierdupre.fr/blog/2013-10-27_nojs.html
 Original author: Xavier Dupré
 
-We use Beautiful Soup 4 to sanitize the incoming HTML before parsing. Once
-done, we construct a dictionary object from the HTML tags that can be converted
-to JSON if desired.
+The original implementation sanitized the incoming HTML with Beautiful Soup 4,
+re-serialized it with ``soup.prettify()`` and parsed that string a second time.
+This module produces the same dictionary from one :class:`HTMLParser` pass by
+applying Beautiful Soup's ``html.parser`` tree building rules (void elements,
+implicitly closed tags, multi-valued attributes) and the whitespace that
+``prettify()`` would have added, directly on the parser events.
+
+Elements with an _errors_ or _message_ class are collected during the same
+pass, see :attr:`HTMLToDict.issues`. :class:`LazyHTMLDict` defers the
+conversion until the dictionary is actually read, most callers only need to
+know whether Asgard embedded an error.
 
 Usage:
     import json
 
     from pyasgard.htmltodict import HTMLToDict
 
-    dictionary = HTMLToDict().dict(html_string)
+    dictionary = HTMLToDict(html_string).dict()
     json_string = json.dumps(dictionary)
 """
+import re
+
 from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution
 
 try:
     # python2
@@ -27,27 +38,165 @@ except ImportError:
     from html.parser import HTMLParser  # pylint: disable=C0411
     STRING_TYPES = (str)  # pylint: disable=C0103,R0204
 
+try:
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+    DEREFERENCE = getattr(BeautifulSoupHTMLParser,
+                          '_dereference_numeric_character_reference', None)
+except ImportError:
+    DEREFERENCE = None
+
+# Tree building rules of bs4.builder.HTMLTreeBuilder
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen',
+    'link', 'menuitem', 'meta', 'param', 'source', 'track', 'wbr', 'basefont',
+    'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer'
+])
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+STRING_CONTAINERS = frozenset(['rt', 'rp', 'style', 'script', 'template'])
+MULTI_VALUED_ATTRIBUTES = {
+    '*': frozenset(['class', 'accesskey', 'dropzone']),
+    'a': frozenset(['rel', 'rev']),
+    'link': frozenset(['rel', 'rev']),
+    'td': frozenset(['headers']),
+    'th': frozenset(['headers']),
+    'form': frozenset(['accept-charset']),
+    'object': frozenset(['archive']),
+    'area': frozenset(['rel']),
+    'icon': frozenset(['sizes']),
+    'iframe': frozenset(['sandbox']),
+    'output': frozenset(['for']),
+}
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+CHARSET_RE = re.compile(r'((^|;)\s*charset=)([^;]*)', re.M)
+
+# Classes Asgard uses for embedded errors and flash messages
+ISSUE_CLASSES = frozenset(['errors', 'message'])
+
+# Any class attribute that could hold an issue class, possibly as entities
+ISSUE_RE = re.compile(r'[Cc][Ll][Aa][Ss][Ss]\s*=\s*'
+                      r"""(?:"[^"]*|'[^']*|[^\s>]*)(?:errors|message|&)""")
+
+# First element of a document, skipping text, comments and declarations
+FIRST_TAG_RE = re.compile(r'(?:[^<]|<!--(?:[^-]|-(?!->))*-->|<![^-][^>]*>'
+                          r'|<\?[^>]*>)*<([a-zA-Z][^\t\n\r\f />\x00]*)'
+                          r'[\t\n\r\f />]')
+
+# Label of text that is neither plain nor inside a string container
+CDATA = object()
+
+
+def dereference_charref(name):
+    """Resolve a numeric character reference like Beautiful Soup.
+
+    Args:
+        name: Character number, possibly in hexadecimal.
+
+    Returns:
+        Tuple of (character, trailing data that was not part of it).
+    """
+    if DEREFERENCE is not None:
+        dereferenced, _, extra_data = DEREFERENCE(name)
+        return dereferenced, extra_data
+
+    if name.lower().startswith('x'):
+        real_name = int(name.lstrip('xX'), 16)
+    else:
+        real_name = int(name)
+
+    data = None
+    if real_name < 256:
+        try:
+            data = bytearray([real_name]).decode('windows-1252')
+        except UnicodeDecodeError:
+            pass
+    if not data:
+        try:
+            data = chr(real_name)
+        except (ValueError, OverflowError):
+            pass
+    return data or u'\N{REPLACEMENT CHARACTER}', ''
+
+
+def prepare_attributes(tag, attrs):
+    """Normalize attributes the way Beautiful Soup stores and prints them.
+
+    Args:
+        tag: Tag name.
+        attrs: List of (name, value) tuples from HTMLParser.
+
+    Returns:
+        List of (name, value) tuples sorted by name.
+    """
+    attr_dict = {}
+    for key, value in attrs:
+        attr_dict[key] = '' if value is None else value
 
-class HTMLToDict(HTMLParser):
+    multi_valued = MULTI_VALUED_ATTRIBUTES['*'] | MULTI_VALUED_ATTRIBUTES.get(
+        tag, frozenset())
+    for key in attr_dict:
+        if key in multi_valued:
+            attr_dict[key] = ' '.join(attr_dict[key].split())
+
+    # prettify() writes the declared encoding of a <meta> tag as UTF-8
+    if tag == 'meta':
+        if 'charset' in attr_dict:
+            attr_dict['charset'] = 'utf-8'
+        elif 'content' in attr_dict and attr_dict.get(
+                'http-equiv', '').lower() == 'content-type':
+            attr_dict['content'] = CHARSET_RE.sub(
+                lambda match: match.group(1) + 'utf-8', attr_dict['content'])
+
+    return sorted(attr_dict.items())
+
+
+class HTMLToDict(HTMLParser):  # pylint: disable=R0902
     """Parse HTML and transcode to dict."""
 
     def __init__(self, content, raise_exception=True):
-        HTMLParser.__init__(self)
+        try:
+            HTMLParser.__init__(self, convert_charrefs=False)
+        except TypeError:
+            # python2
+            HTMLParser.__init__(self)
 
+        self.content = content
         self.doc = {}
         self.path = []
         self.cur = self.doc
         self.line = 0
         self.raise_exception = raise_exception
-        self.soup = BeautifulSoup(content, 'html.parser')
+        self.issues = []
+        self.roots = set()
+        self.html_soup = None
+
+        # Tree building state
+        self.stack = []
+        self.open_tags = {}
+        self.already_closed = []
+        self.text = []
+        self.preserve_depth = 0
+        self.containers = []
+        self.open_issues = []
 
-        self.feed(self.soup.prettify())
+        # prettify() state
+        self.indent = 0
+        self.literal_depth = None
+
+        self.feed(content)
+        self.close()
 
     @property
     def json(self):
         """Return the JSON object."""
         return self.doc
 
+    @property
+    def soup(self):
+        """BeautifulSoup of the content, only parsed when requested."""
+        if self.html_soup is None:
+            self.html_soup = BeautifulSoup(self.content, 'html.parser')
+        return self.html_soup
+
     def dict(self):
         """Convert HTML to dict.
 
@@ -56,8 +205,228 @@ class HTMLToDict(HTMLParser):
         """
         return self.json
 
+    def close(self):
+        """Flush remaining data and close every open tag."""
+        HTMLParser.close(self)
+        self.end_data()
+        while self.stack:
+            self.pop_tag()
+
+    # HTMLParser events, following bs4.builder._htmlparser
+
     def handle_starttag(self, tag, attrs):
-        """Handle starting tag."""
+        """Handle starting tag, void elements close immediately."""
+        self.start_tag(tag, attrs)
+
+        if tag in VOID_ELEMENTS:
+            self.end_tag(tag)
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        """Handle self closing tag, e.g. <br/>."""
+        self.start_tag(tag, attrs)
+        self.end_tag(tag)
+
+    def handle_endtag(self, tag):
+        """Handle ending tag, ignoring the end of an already closed void."""
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+        else:
+            self.end_tag(tag)
+
+    def handle_data(self, data):
+        """Handle data."""
+        self.text.append(data)
+
+    def handle_charref(self, name):
+        """Handle numeric character reference."""
+        dereferenced, extra_data = dereference_charref(name)
+        self.text.append(dereferenced)
+        self.text.append(extra_data)
+
+    def handle_entityref(self, name):
+        """Handle named entity reference."""
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.text.append('&' + name if character is None else character)
+
+    def handle_comment(self, data):
+        """Handle comment."""
+        self.end_data()
+        self.other_string()
+
+    def handle_decl(self, decl):
+        """Handle doctype, printed with a trailing newline."""
+        self.end_data()
+        self.other_string(suffix='\n')
+
+    def handle_pi(self, data):
+        """Handle processing instruction."""
+        self.end_data()
+        self.other_string()
+
+    def unknown_decl(self, data):
+        """Handle CDATA block or unknown declaration."""
+        self.end_data()
+        if data.upper().startswith('CDATA['):
+            self.issue_text(data[len('CDATA['):], CDATA)
+        self.other_string()
+
+    # Tree building, following bs4.BeautifulSoup
+
+    def start_tag(self, tag, attrs):
+        """Open _tag_ below the current element."""
+        self.end_data()
+        attrs = prepare_attributes(tag, attrs)
+
+        if not self.stack:
+            self.roots.add(tag)
+        self.stack.append(tag)
+        self.open_tags[tag] = self.open_tags.get(tag, 0) + 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth += 1
+        if tag in STRING_CONTAINERS:
+            self.containers.append(tag)
+
+        classes = dict(attrs).get('class', '').split()
+        if ISSUE_CLASSES.intersection(classes):
+            self.open_issues.append((len(self.stack), tag, len(self.issues)))
+            self.issues.append('')
+
+        if tag in VOID_ELEMENTS:
+            self.empty_element(tag, attrs)
+        else:
+            self.start_element(tag, attrs)
+
+    def end_tag(self, tag):
+        """Close _tag_ and any element left open inside it."""
+        self.end_data()
+
+        if not self.open_tags.get(tag):
+            return
+
+        while self.stack:
+            if self.pop_tag() == tag:
+                break
+
+    def pop_tag(self):
+        """Close the current element.
+
+        Returns:
+            Name of the closed tag.
+        """
+        tag = self.stack[-1]
+        if tag not in VOID_ELEMENTS:
+            self.end_element(tag)
+
+        self.stack.pop()
+        self.open_tags[tag] -= 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self.preserve_depth -= 1
+        if tag in STRING_CONTAINERS:
+            self.containers.pop()
+        if self.open_issues and self.open_issues[-1][0] > len(self.stack):
+            self.open_issues.pop()
+
+        return tag
+
+    def end_data(self):
+        """Turn collected text into one string of the current element."""
+        if not self.text:
+            return
+
+        data = ''.join(self.text)
+        self.text = []
+
+        if not self.preserve_depth and all(char in ASCII_SPACES
+                                           for char in data):
+            data = '\n' if '\n' in data else ' '
+
+        self.issue_text(data, self.containers[-1] if self.containers else None)
+        self.text_string(data)
+
+    def issue_text(self, data, label):
+        """Add string _data_ to the text of every open issue element.
+
+        Args:
+            data: Text of one string.
+            label: Enclosing string container tag, CDATA or None.
+        """
+        for _, tag, index in self.open_issues:
+            if tag in STRING_CONTAINERS:
+                wanted = label == tag
+            else:
+                wanted = label is None or label is CDATA
+
+            if wanted:
+                self.issues[index] += data
+
+    # Whitespace that prettify() puts around each piece
+
+    def start_element(self, tag, attrs):
+        """Element that holds content."""
+        before, after = ' ' * self.indent, '\n'
+        if self.literal_depth is not None:
+            before, after = '', ''
+        elif tag in PRESERVE_WHITESPACE_TAGS:
+            after = ''
+            self.literal_depth = len(self.stack)
+
+        self.append_data(before)
+        self.open_element(tag, attrs)
+        self.append_data(after)
+        self.indent += 1
+
+    def end_element(self, tag):
+        """End of an element that holds content."""
+        self.indent -= 1
+
+        before, after = ' ' * self.indent, '\n'
+        if self.literal_depth == len(self.stack):
+            before = ''
+            self.literal_depth = None
+        elif self.literal_depth is not None:
+            before, after = '', ''
+
+        self.append_data(before)
+        self.close_element(tag)
+        self.append_data(after)
+
+    def empty_element(self, tag, attrs):
+        """Void element, e.g. <br/>."""
+        before, after = ' ' * self.indent, '\n'
+        if self.literal_depth is not None:
+            before, after = '', ''
+
+        self.append_data(before)
+        self.open_element(tag, attrs)
+        self.close_element(tag)
+        self.append_data(after)
+
+    def text_string(self, data):
+        """Text, stripped and on its own line outside of <pre>."""
+        if self.literal_depth is not None:
+            self.append_data(data)
+            return
+
+        stripped = data.strip()
+        if stripped:
+            self.append_data(' ' * self.indent + stripped + '\n')
+
+    def other_string(self, suffix=''):
+        """Comment or declaration, only its surrounding whitespace counts.
+
+        Args:
+            suffix: Whitespace printed after the markup itself.
+        """
+        if self.literal_depth is None:
+            self.append_data(' ' * self.indent + '\n')
+        else:
+            self.append_data(suffix)
+
+    # Dict construction
+
+    def open_element(self, tag, attrs):
+        """Start a dict for _tag_."""
         self.path.append(tag)
         attrs = {key: value for key, value in attrs}
 
@@ -78,8 +447,8 @@ class HTMLToDict(HTMLParser):
 
         self.cur[""] = ""
 
-    def handle_endtag(self, tag):
-        """Handle ending tag."""
+    def close_element(self, tag):
+        """Finish the dict for _tag_."""
         if tag != self.path[-1] and self.raise_exception:
             raise Exception(("HTML malformed around line: {0} "
                              "(check for unclosed tags, "
@@ -91,8 +460,8 @@ class HTMLToDict(HTMLParser):
         self.cur = self.cur["__parent__"]
         self.clean(memo)
 
-    def handle_data(self, data):
-        """Handle data."""
+    def append_data(self, data):
+        """Add text to the current dict."""
         self.line += data.count("\n")
         if "" in self.cur:
             self.cur[""] += data
@@ -111,3 +480,218 @@ class HTMLToDict(HTMLParser):
                     values[key] = stripped
 
         del values["__parent__"]
+
+
+class HTMLScanner(HTMLToDict):
+    """Collect issues and top level tags without building the dict."""
+
+    def start_element(self, tag, attrs):
+        pass
+
+    def end_element(self, tag):
+        pass
+
+    def empty_element(self, tag, attrs):
+        pass
+
+    def text_string(self, data):
+        pass
+
+    def other_string(self, suffix=''):
+        pass
+
+
+class LazyHTMLDict(dict):
+    """Dict of an HTML page, converted on first access.
+
+    Checking :attr:`issues` or whether a top level tag exists only scans the
+    page, and pages without any _errors_ or _message_ class are not parsed at
+    all. Any other dict method, or calling :meth:`dict`, converts the page
+    with :class:`HTMLToDict` once and fills the dict.
+
+    C code reading the dict directly, e.g. :func:`json.dumps`, sees an empty
+    dict until the page was converted, call :meth:`dict` first. Pickling
+    keeps only the HTML of a page that was not converted yet.
+
+    Usage:
+        page = LazyHTMLDict(html_string)
+        if page.issues:
+            print(page['html']['head']['title'][''])
+    """
+
+    def __init__(self, content):
+        """Keep _content_ for later.
+
+        Args:
+            content: String of HTML.
+        """
+        super(LazyHTMLDict, self).__init__()
+        self.content = content
+        self.htmldict = None
+        self.scanner = None
+
+    def __contains__(self, key):
+        if self.htmldict is not None:
+            return dict.__contains__(self, key)
+
+        first_tag = FIRST_TAG_RE.match(self.content)
+        if first_tag and first_tag.group(1).lower() == key:
+            return True
+
+        return key in self.scan().roots
+
+    def __repr__(self):
+        if self.htmldict is None:
+            return '<LazyHTMLDict, {0} characters>'.format(len(self.content))
+        return dict.__repr__(self)
+
+    def __reduce__(self):
+        items = None
+        if self.htmldict is not None:
+            items = iter(dict.items(self))
+        return LazyHTMLDict, (self.content, ), None, None, items
+
+    def __getitem__(self, key):
+        self.dict()
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self.dict()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self.dict()
+        dict.__delitem__(self, key)
+
+    def __iter__(self):
+        self.dict()
+        return dict.__iter__(self)
+
+    def __len__(self):
+        self.dict()
+        return dict.__len__(self)
+
+    def __eq__(self, other):
+        self.dict()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        self.dict()
+        return dict.__ne__(self, other)
+
+    def get(self, key, default=None):
+        self.dict()
+        return dict.get(self, key, default)
+
+    def keys(self):
+        self.dict()
+        return dict.keys(self)
+
+    def values(self):
+        self.dict()
+        return dict.values(self)
+
+    def items(self):
+        self.dict()
+        return dict.items(self)
+
+    def copy(self):
+        self.dict()
+        return dict.copy(self)
+
+    def pop(self, *args):
+        self.dict()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self.dict()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        self.dict()
+        return dict.setdefault(self, key, default)
+
+    def update(self, *args, **kwargs):
+        self.dict()
+        dict.update(self, *args, **kwargs)
+
+    def clear(self):
+        self.dict()
+        dict.clear(self)
+
+    # HACK: Python 2.7 has more dict methods than Python 3
+    if hasattr(dict, 'iteritems'):
+        def has_key(self, key):
+            self.dict()
+            return dict.has_key(self, key)  # pylint: disable=E1101
+
+        def iterkeys(self):
+            self.dict()
+            return dict.iterkeys(self)  # pylint: disable=E1101
+
+        def itervalues(self):
+            self.dict()
+            return dict.itervalues(self)  # pylint: disable=E1101
+
+        def iteritems(self):
+            self.dict()
+            return dict.iteritems(self)  # pylint: disable=E1101
+
+        def viewkeys(self):
+            self.dict()
+            return dict.viewkeys(self)  # pylint: disable=E1101
+
+        def viewvalues(self):
+            self.dict()
+            return dict.viewvalues(self)  # pylint: disable=E1101
+
+        def viewitems(self):
+            self.dict()
+            return dict.viewitems(self)  # pylint: disable=E1101
+
+    @property
+    def issues(self):
+        """List of text in elements with an _errors_ or _message_ class."""
+        if self.htmldict is not None:
+            return self.htmldict.issues
+
+        if not ISSUE_RE.search(self.content):
+            return []
+
+        return self.scan().issues
+
+    @property
+    def json(self):
+        """Return the JSON object."""
+        return self.dict()
+
+    @property
+    def soup(self):
+        """BeautifulSoup of the content, only parsed when requested."""
+        return self.scan().soup
+
+    def scan(self):
+        """Scan the page once without converting it.
+
+        Returns:
+            HTMLScanner, or the HTMLToDict when already converted.
+        """
+        if self.htmldict is not None:
+            return self.htmldict
+
+        if self.scanner is None:
+            self.scanner = HTMLScanner(self.content)
+        return self.scanner
+
+    def dict(self):
+        """Convert the page to dict once.
+
+        Returns:
+            Dict from :meth:`HTMLToDict.dict`.
+        """
+        if self.htmldict is None:
+            self.htmldict = HTMLToDict(self.content)
+            self.scanner = None
+            dict.update(self, self.htmldict.dict())
+        return self.htmldict.dict()
+
@@ -0,0 +1,130 @@
+"""Incremental decoding of large JSON arrays.
+
+List endpoints such as ``instance.list`` return one JSON array holding the
+whole fleet. :func:`iter_json_array` decodes such a body one element at a
+time from an iterable of byte chunks, so only the current chunk and the
+record being decoded are held in memory::
+
+    response = requests.get(url, stream=True)
+    for instance in iter_json_array(response.iter_content(65536)):
+        print(instance['instanceId'])
+"""
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = ' \t\n\r'
+
+# Characters that may continue a number, e.g. 1 -> 1.5e3
+NUMBER_PARTS = frozenset('0123456789+-.eE')
+
+DECODER = json.JSONDecoder()
+
+
+def iter_json_array(chunks, encoding='utf-8'):
+    """Yield the elements of a JSON array read from _chunks_.
+
+    A top level value that is not an array is yielded whole.
+
+    Args:
+        chunks: Iterable of bytes, e.g. Response.iter_content().
+        encoding: Character encoding of the body.
+
+    Yields:
+        Decoded elements, one at a time.
+
+    Raises:
+        ValueError: The body is not valid JSON.
+    """
+    reader = ChunkReader(chunks, encoding)
+
+    if reader.peek() != '[':
+        value = reader.decode()
+        if reader.peek() is not None:
+            raise ValueError('Extra data after JSON value.')
+        yield value
+        return
+
+    reader.position += 1
+    if reader.peek() == ']':
+        reader.position += 1
+    else:
+        while True:
+            yield reader.decode()
+
+            separator = reader.peek()
+            reader.position += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ValueError('Expecting "," or "]" in JSON array.')
+
+    if reader.peek() is not None:
+        raise ValueError('Extra data after JSON array.')
+
+
+class ChunkReader(object):
+    """Text buffer that is refilled from byte chunks on demand."""
+
+    def __init__(self, chunks, encoding):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.buffer = ''
+        self.position = 0
+        self.exhausted = False
+
+    def fill(self):
+        """Append the next chunk, dropping text already consumed.
+
+        Returns:
+            False when there was nothing left to read.
+        """
+        if self.exhausted:
+            return False
+
+        try:
+            text = self.decoder.decode(next(self.chunks))
+        except StopIteration:
+            text = self.decoder.decode(b'', True)
+            self.exhausted = True
+
+        self.buffer = self.buffer[self.position:] + text
+        self.position = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, None at the end."""
+        while True:
+            while (self.position < len(self.buffer) and
+                   self.buffer[self.position] in WHITESPACE):
+                self.position += 1
+
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+
+            if not self.fill():
+                return None
+
+    def decode(self):
+        """Decode the next complete JSON value.
+
+        A number that ends where the buffer ends, or right before more
+        number characters, may be truncated. It is only accepted once the
+        text after it arrived or the body ended.
+        """
+        if self.peek() is None:
+            raise ValueError('Unexpected end of JSON data.')
+
+        while True:
+            try:
+                value, end = DECODER.raw_decode(self.buffer, self.position)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+
+            if ((end < len(self.buffer) and
+                 self.buffer[end] not in NUMBER_PARTS) or not self.fill()):
+                self.position = end
+                return value
@@ -0,0 +1,45 @@
+"""Deferred formatting of expensive log arguments.
+
+Logging only renders ``%s`` arguments when a record is actually emitted, but
+the arguments themselves are built by the caller. Wrapping them here moves
+the work, e.g. pretty printing a multi-megabyte response, into ``__str__``::
+
+    log.debug('Response JSON:\\n%s', LazyPformat(response_json))
+"""
+import inspect
+from pprint import pformat
+
+
+def redact_auth(url_params):
+    """Pretty format request arguments without the _auth_ credentials."""
+    return pformat(dict((key, value) for key, value in url_params.items()
+                        if key != 'auth'))
+
+
+def pformat_members(obj):
+    """Pretty format all members of _obj_."""
+    return pformat(inspect.getmembers(obj))
+
+
+class LazyFormat(object):  # pylint: disable=R0903
+    """Call _func_ with _args_ only when converted to a string."""
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+    __repr__ = __str__
+
+
+class LazyPformat(LazyFormat):  # pylint: disable=R0903
+    """Pretty print _obj_ only when converted to a string."""
+
+    __slots__ = ()
+
+    def __init__(self, obj):
+        super(LazyPformat, self).__init__(pformat, obj)
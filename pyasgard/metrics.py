@@ -0,0 +1,339 @@
+"""Per endpoint timings, counters and request hooks.
+
+A :class:`Metrics` passed to the client times every call in phases and
+aggregates them per MAPPING_TABLE endpoint::
+
+    metrics = Metrics()
+    client = Asgard(url, metrics=metrics)
+    client.asg.show(asg_id='app-v000')
+
+    metrics.snapshot()['asg.show']['phases']['ttfb']
+    print(metrics.prometheus())
+
+Phases are _format_url_ and _build_body_ while preparing, _network_ for the
+whole request with _ttfb_ up to the response headers and _download_ for the
+body, _decode_json_ or _decode_html_, and _parse_errors_ of HTML pages.
+Connection setup is part of _ttfb_, requests does not report it separately.
+
+Hooks run before and after each call with the PreparedCall and its
+CallTiming::
+
+    metrics.add_hook(post=lambda call, timing: log(call.name, timing.total))
+
+Without a Metrics the client skips all of this, the phases cost one
+thread local lookup each.
+"""
+import threading
+from collections import OrderedDict
+
+from .clock import perf_counter
+
+# Upper bounds in seconds, the last bucket is +Inf
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0)
+
+LOCAL = threading.local()
+
+
+class NullPhase(object):
+    """Context manager doing nothing, used when no call is timed."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+def current():
+    """CallTiming active in this thread, None when nothing is timed."""
+    return getattr(LOCAL, 'timing', None)
+
+
+def null_phase(name):  # pylint: disable=W0613
+    """Context manager not timing phase _name_."""
+    return NULL_PHASE
+
+
+def phase(name):
+    """Time phase _name_ of the active call, a no-op without one."""
+    timing = getattr(LOCAL, 'timing', None)
+    if timing is None:
+        return NULL_PHASE
+    return timing.phase(name)
+
+
+class Phase(object):
+    """Context manager adding its duration to a CallTiming phase."""
+
+    __slots__ = ('timing', 'name', 'started')
+
+    def __init__(self, timing, name):
+        self.timing = timing
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = self.timing.clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing.add(self.name, self.timing.clock() - self.started)
+        return False
+
+
+class CallTiming(object):
+    """Timings of one call.
+
+    Attributes:
+        name: Endpoint name, e.g. _asg.show_.
+        region: EC2 region of the client.
+        phases: OrderedDict of phase name to seconds.
+        status: HTTP status of the last response, None without one.
+        bytes: Bytes of response bodies read.
+        error: Exception raised by the call, None on success.
+        total: Seconds of the whole call once finished.
+    """
+
+    __slots__ = ('name', 'region', 'phases', 'status', 'bytes', 'error',
+                 'started', 'total', 'clock')
+
+    def __init__(self, name, region=None, clock=perf_counter):
+        self.name = name
+        self.region = region
+        self.phases = OrderedDict()
+        self.status = None
+        self.bytes = 0
+        self.error = None
+        self.clock = clock
+        self.started = clock()
+        self.total = None
+
+    def __repr__(self):
+        return 'CallTiming({0}, {1})'.format(self.name, dict(self.phases))
+
+    def phase(self, name):
+        """Context manager timing phase _name_."""
+        return Phase(self, name)
+
+    def add(self, name, seconds):
+        """Add _seconds_ to phase _name_."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def response(self, response, seconds, streamed=False):
+        """Record a response that took _seconds_ to fetch.
+
+        Args:
+            response: requests.Response.
+            seconds: Duration of the request, headers and body.
+            streamed: Whether the body is still unread.
+        """
+        self.status = response.status_code
+        ttfb = min(response.elapsed.total_seconds(), seconds)
+        self.add('network', seconds)
+        self.add('ttfb', ttfb)
+        if not streamed:
+            self.add('download', seconds - ttfb)
+            self.bytes += len(response.content or b'')
+
+
+class Histogram(object):
+    """Cumulative latency histogram."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """Count one observation."""
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """List of (upper bound, count) pairs, the last bound is +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip(self.buckets + (float('inf'), ),
+                                self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+    def snapshot(self):
+        """Dict of count, sum and cumulative buckets."""
+        return {'count': self.count,
+                'sum': self.sum,
+                'buckets': self.cumulative()}
+
+
+class EndpointStats(object):
+    """Aggregates of one endpoint."""
+
+    __slots__ = ('calls', 'errors', 'bytes', 'latency', 'phases')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = None
+        self.phases = OrderedDict()
+
+
+class Metrics(object):
+    """Thread safe call timings aggregated per endpoint."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, clock=perf_counter):
+        """Start with no calls.
+
+        Args:
+            buckets: Tuple of histogram upper bounds in seconds.
+            clock: Function returning seconds, for tests.
+        """
+        self.buckets = tuple(buckets)
+        self.clock = clock
+        self.endpoints = OrderedDict()
+        self.pre_hooks = []
+        self.post_hooks = []
+        self.lock = threading.Lock()
+
+    def add_hook(self, pre=None, post=None):
+        """Register functions called with (PreparedCall, CallTiming).
+
+        Args:
+            pre: Called before the request of each call.
+            post: Called after each call, successful or not.
+        """
+        if pre is not None:
+            self.pre_hooks.append(pre)
+        if post is not None:
+            self.post_hooks.append(post)
+
+    def timing(self, name, region=None):
+        """New CallTiming for endpoint _name_."""
+        return CallTiming(name, region, self.clock)
+
+    def start(self, call):
+        """Make the CallTiming of _call_ active in this thread.
+
+        Returns:
+            The CallTiming that was active before, to pass to finish().
+        """
+        previous = current()
+        LOCAL.timing = call.timing
+        for hook in self.pre_hooks:
+            hook(call, call.timing)
+        return previous
+
+    def finish(self, call, previous, error=None):
+        """Aggregate the CallTiming of _call_ and run the post hooks.
+
+        Args:
+            call: PreparedCall.
+            previous: Return value of start().
+            error: Exception raised by the call.
+        """
+        LOCAL.timing = previous
+        timing = call.timing
+        timing.error = error
+        timing.total = self.clock() - timing.started
+
+        with self.lock:
+            stats = self.endpoints.get(timing.name)
+            if stats is None:
+                stats = self.endpoints[timing.name] = EndpointStats()
+                stats.latency = Histogram(self.buckets)
+
+            stats.calls += 1
+            stats.errors += error is not None
+            stats.bytes += timing.bytes
+            stats.latency.observe(timing.total)
+            for name, seconds in timing.phases.items():
+                histogram = stats.phases.get(name)
+                if histogram is None:
+                    histogram = stats.phases[name] = Histogram(self.buckets)
+                histogram.observe(seconds)
+
+        for hook in self.post_hooks:
+            hook(call, timing)
+
+    def snapshot(self):
+        """Dict of endpoint to its counters and histograms."""
+        with self.lock:
+            return dict(
+                (name, {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'bytes': stats.bytes,
+                    'latency': stats.latency.snapshot(),
+                    'phases': dict((phase_name, histogram.snapshot())
+                                   for phase_name, histogram in
+                                   stats.phases.items()),
+                }) for name, stats in self.endpoints.items())
+
+    def reset(self):
+        """Forget all aggregates."""
+        with self.lock:
+            self.endpoints.clear()
+
+    def prometheus(self, prefix='pyasgard'):
+        """Aggregates in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def counter(metric, help_text, key):
+            """Append a counter per endpoint."""
+            lines.append('# HELP {0}_{1} {2}'.format(prefix, metric,
+                                                     help_text))
+            lines.append('# TYPE {0}_{1} counter'.format(prefix, metric))
+            for name in sorted(snapshot):
+                lines.append('{0}_{1}{{endpoint="{2}"}} {3}'.format(
+                    prefix, metric, name, snapshot[name][key]))
+
+        def histogram(metric, labels, values):
+            """Append the series of one histogram."""
+            for bound, count in values['buckets']:
+                lines.append('{0}_{1}_bucket{{{2},le="{3}"}} {4}'.format(
+                    prefix, metric, labels,
+                    '+Inf' if bound == float('inf') else repr(bound), count))
+            lines.append('{0}_{1}_sum{{{2}}} {3!r}'.format(
+                prefix, metric, labels, values['sum']))
+            lines.append('{0}_{1}_count{{{2}}} {3}'.format(
+                prefix, metric, labels, values['count']))
+
+        counter('calls_total', 'Calls per endpoint.', 'calls')
+        counter('errors_total', 'Failed calls per endpoint.', 'errors')
+        counter('response_bytes_total', 'Response body bytes per endpoint.',
+                'bytes')
+
+        lines.append('# HELP {0}_call_duration_seconds Duration of calls.'
+                     .format(prefix))
+        lines.append('# TYPE {0}_call_duration_seconds histogram'.format(
+            prefix))
+        for name in sorted(snapshot):
+            histogram('call_duration_seconds', 'endpoint="{0}"'.format(name),
+                      snapshot[name]['latency'])
+
+        lines.append('# HELP {0}_phase_duration_seconds Duration of call '
+                     'phases.'.format(prefix))
+        lines.append('# TYPE {0}_phase_duration_seconds histogram'.format(
+            prefix))
+        for name in sorted(snapshot):
+            phases = snapshot[name]['phases']
+            for phase_name in sorted(phases):
+                histogram('phase_duration_seconds',
+                          'endpoint="{0}",phase="{1}"'.format(name,
+                                                              phase_name),
+                          phases[phase_name])
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,213 @@
+"""Run the same Asgard command against several regions at once.
+
+Every region gets its own :class:`pyasgard.Asgard` client, all sharing one
+pooled :class:`pyasgard.transport.Transport`, and calls fan out over a thread
+pool::
+
+    with MultiRegionAsgard('http://asgard.example.com') as asgard:
+        groups = asgard.asg.list()
+
+    groups['us-west-2']
+    groups.errors  # {'eu-west-1': AsgardError(...)}
+"""
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .asgardcommand import AsgardCommand
+from .endpoints import MAPPING_TABLE
+from .pyasgard import Asgard
+from .tracing import propagate
+from .transport import Transport
+
+
+class RegionResults(OrderedDict):
+    """Results keyed by region, failed regions are kept in _errors_.
+
+    Attributes:
+        errors: OrderedDict of region to the exception it raised.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(RegionResults, self).__init__(*args, **kwargs)
+        self.errors = OrderedDict()
+
+    def __repr__(self):
+        return 'RegionResults({0!r}, errors={1!r})'.format(
+            dict(self), dict(self.errors))
+
+
+class MultiRegionCommand(object):
+    """The same command resolved on every regional client."""
+
+    def __init__(self, client, commands):
+        """Keep the regional commands.
+
+        Args:
+            client: MultiRegionAsgard running the calls.
+            commands: OrderedDict of region to AsgardCommand.
+        """
+        self.client = client
+        self.commands = commands
+
+    def __getattr__(self, name):
+        """Resolve _name_ on every regional command.
+
+        Sub-commands resolve to a MultiRegionCommand, methods such as
+        _map_ to a function calling them in every region.
+
+        Raises:
+            AttributeError: _name_ is neither a command nor a method.
+        """
+        if name.startswith('__') or 'commands' not in self.__dict__:
+            raise AttributeError(name)
+
+        values = OrderedDict((region, getattr(command, name))
+                             for region, command in self.commands.items())
+
+        if all(isinstance(value, AsgardCommand) for value in values.values()):
+            return MultiRegionCommand(self.client, values)
+
+        if not all(callable(value) for value in values.values()):
+            raise AttributeError(
+                '{0} is not a command or method in every region'.format(name))
+
+        def fan_out(*args, **kwargs):
+            """Call the method in every region concurrently."""
+            return self.client.fan_out(values, kwargs, args)
+
+        fan_out.__name__ = name
+        return fan_out
+
+    def __call__(self, **kwargs):
+        """Call the command in every region concurrently.
+
+        Args:
+            **kwargs: Same keywords as :meth:`AsgardCommand.__call__`.
+
+        Returns:
+            RegionResults of each region's return value.
+        """
+        return self.client.fan_out(self.commands, kwargs)
+
+
+class MultiRegionAsgard(object):
+    """API Wrapper for Asgard across several EC2 regions."""
+
+    def __init__(self,
+                 url,
+                 regions=None,
+                 max_workers=None,
+                 transport=None,
+                 pool_maxsize=10,
+                 max_retries=0,
+                 **kwargs):
+        """Create one client per region over a shared Transport.
+
+        Args:
+            url: https://company.asgard.com (use http if not SSL enabled).
+            regions: List of region names, discovered with _regions.list_
+                when omitted.
+            max_workers: Concurrent calls, defaults to one per region.
+            transport: Shared :class:`pyasgard.transport.Transport`, a new
+                pooled Transport is created when omitted.
+            pool_maxsize: Keep-alive connections for a new Transport.
+            max_retries: Connection level retries for a new Transport.
+            **kwargs: Passed through to each :class:`pyasgard.Asgard`, e.g.
+                _username_ and _password_. _ec2_region_ selects the region
+                used for discovery.
+        """
+        self.log = logging.getLogger(__name__)
+
+        self.owns_transport = transport is None
+        self.transport = transport or Transport(pool_maxsize=pool_maxsize,
+                                                max_retries=max_retries)
+
+        discovery_region = kwargs.pop('ec2_region', 'us-east-1')
+        if regions is None:
+            regions = self.discover_regions(url, discovery_region, **kwargs)
+        self.regions = list(regions)
+
+        self.clients = OrderedDict(
+            (region, Asgard(url,
+                            ec2_region=region,
+                            transport=self.transport,
+                            **kwargs)) for region in self.regions)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.regions), 1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, api_call):
+        """Resolve _api_call_ on every regional client."""
+        if api_call.startswith('__') or 'clients' not in self.__dict__:
+            raise AttributeError(api_call)
+
+        commands = OrderedDict((region, getattr(client, api_call))
+                               for region, client in self.clients.items())
+        return MultiRegionCommand(self, commands)
+
+    def __dir__(self):
+        return sorted(set(vars(self)) | set(dir(type(self))) |
+                      set(MAPPING_TABLE))
+
+    def discover_regions(self, url, region, **kwargs):
+        """List the region codes Asgard knows about.
+
+        Args:
+            url: Asgard URL.
+            region: Region to ask.
+            **kwargs: Passed through to :class:`pyasgard.Asgard`.
+
+        Returns:
+            List of region names.
+        """
+        client = Asgard(url,
+                        ec2_region=region,
+                        transport=self.transport,
+                        **kwargs)
+        regions = [item['code'] if isinstance(item, dict) else item
+                   for item in client.regions.list()]
+        self.log.debug('Discovered regions: %s', regions)
+        return regions
+
+    def fan_out(self, commands, kwargs, args=()):
+        """Call each regional command with _kwargs_ on the thread pool.
+
+        Calls are traced as children of the span active in the caller.
+
+        Args:
+            commands: OrderedDict of region to AsgardCommand or to one of
+                its methods.
+            kwargs: Keywords for every call.
+            args: Positional arguments for every call.
+
+        Returns:
+            RegionResults, exceptions are collected per region.
+        """
+        futures = OrderedDict(
+            (region, self.executor.submit(propagate(command), *args,
+                                           **kwargs))
+            for region, command in commands.items())
+
+        results = RegionResults()
+        for region, future in futures.items():
+            try:
+                results[region] = future.result()
+            except Exception as error:  # pylint: disable=W0703
+                self.log.warning('%s failed in %s: %s',
+                                 commands[region].__name__, region, error)
+                results.errors[region] = error
+
+        return results
+
+    def close(self):
+        """Stop the thread pool and close an owned Transport."""
+        self.executor.shutdown(wait=True)
+        if self.owns_transport:
+            self.transport.close()
@@ -1,23 +1,30 @@
 """Python interface to Netflix Asgard REST API."""
 import base64
-import inspect
 import logging
 from pprint import pformat
-from string import Template
-
-import requests
 
 from .asgardcommand import AsgardCommand
+from .batch import run_batch
+from .compiled import compile_path, invalidate
+from .deadline import DEFAULT_TIMEOUT, normalize_timeout
 from .endpoints import MAPPING_TABLE
 from .exceptions import (AsgardAuthenticationError, AsgardError,
                          AsgardReturnedError)
-from .htmltodict import HTMLToDict
+from .htmltodict import LazyHTMLDict
+from .jsonstream import CHUNK_SIZE, iter_json_array
+from .lazylog import LazyFormat, LazyPformat, pformat_members, redact_auth
+from .metrics import phase
+from .transport import Transport
 from .version import __version__
+from .waiter import DEFAULT_WAIT, Waiter
+from .watch import DeploymentWatch, iter_changes
 
 
 class Asgard(object):
     """Python API Wrapper for Asgard."""
 
+    command_class = AsgardCommand
+
     def __init__(self,  # pylint: disable=R0913
                  url,
                  username=None,
@@ -25,7 +32,17 @@ class Asgard(object):
                  headers=None,
                  # client_args={},
                  api_version=1,
-                 ec2_region='us-east-1'):
+                 ec2_region='us-east-1',
+                 transport=None,
+                 pool_maxsize=10,
+                 max_retries=0,
+                 capture=None,
+                 cache=None,
+                 singleflight=None,
+                 retry=None,
+                 timeout=DEFAULT_TIMEOUT,
+                 metrics=None,
+                 tracer=None):
         """New Asgard object for interacting with the API.
 
         Instantiates an instance of Asgard. Takes optional parameters for
@@ -39,6 +56,27 @@ class Asgard(object):
             headers: Pass headers in dict form, overrides default headers.
             api_version: Version number of Asgard API to use.
             ec2_region: AWS region to use.
+            transport: Shared :class:`pyasgard.transport.Transport`, a new
+                pooled Transport is created when omitted.
+            pool_maxsize: Keep-alive connections per host for a new
+                Transport.
+            max_retries: Connection retries for a new Transport.
+            capture: :class:`pyasgard.capture.ResponseCapture` to record raw
+                responses, nothing is recorded by default. The caller
+                closes it.
+            cache: :class:`pyasgard.cache.ResponseCache` for GET results,
+                nothing is cached by default. The caller closes it.
+            singleflight: :class:`pyasgard.singleflight.SingleFlight` to
+                share one request among identical concurrent GETs.
+            retry: :class:`pyasgard.retry.RetryPolicy` for transient
+                failures of idempotent endpoints, nothing is retried by
+                default.
+            timeout: Seconds, or a (connect, read) tuple, for endpoints
+                without a _timeout_ of their own.
+            metrics: :class:`pyasgard.metrics.Metrics` timing calls per
+                endpoint, nothing is timed by default.
+            tracer: :class:`pyasgard.tracing.Tracer` recording a span per
+                call, nothing is traced by default.
 
         Not Implemented:
             use_api_token: Use api token for authentication instead of user's
@@ -49,10 +87,12 @@ class Asgard(object):
                 {"disable_ssl_certificate_validation": True}
         """
         self.log = logging.getLogger(__name__)
-        self.log.debug('init locals():\n%s', pformat(locals()))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug('init locals():\n%s', pformat(locals()))
 
         self.data = {}
         self.url = '{0}/{1}'.format(url.rstrip('/'), ec2_region)
+        self.ec2_region = ec2_region
         self.username = username
         self.password = password
 
@@ -67,6 +107,26 @@ class Asgard(object):
         self.mapping_table = MAPPING_TABLE
 
         self.htmldict = None
+        self.capture = capture
+        self.cache = cache
+        self.singleflight = singleflight
+        self.retry = retry
+        self.timeout = normalize_timeout(timeout)
+        self.metrics = metrics
+        self.tracer = tracer
+        self.waiter = Waiter(self)
+        self.commands = {}
+
+        # Only close what we opened, shared transports belong to the caller
+        self.owns_transport = transport is None
+        self.transport = transport or Transport(pool_maxsize=pool_maxsize,
+                                                max_retries=max_retries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def __dir__(self):
         self_keys = list(self.__dict__.keys())
@@ -75,7 +135,134 @@ class Asgard(object):
 
     def __getattr__(self, api_call):
         """Execute dynamic method and pass keyword args as data to API call."""
-        return AsgardCommand(self, api_call, self.mapping_table)
+        return self.get_command(api_call, self.mapping_table)
+
+    def get_command(self, api_call, menu, parent='Asgard'):
+        """Return the cached command for _api_call_ in _menu_.
+
+        Commands are built once per dotted path, e.g. _Asgard.asg.show_, so
+        repeated attribute access returns the same object.
+
+        Args:
+            api_call: Key of _menu_ to build a command for.
+            menu: Dict level of the mapping table containing _api_call_.
+            parent: Dotted name of the parent command.
+
+        Returns:
+            AsgardCommand, or _command_class_ instance, for _api_call_.
+
+        Raises:
+            AttributeError: _api_call_ is not part of the mapping table.
+        """
+        # Read __dict__ directly, __getattr__ may run before __init__ did
+        commands = self.__dict__.setdefault('commands', {})
+        name = '.'.join([parent, api_call])
+
+        try:
+            return commands[name]
+        except KeyError:
+            command = self.command_class(self, api_call, menu, parent=parent)
+            return commands.setdefault(name, command)
+
+    def reload_endpoints(self):
+        """Recompile the cached commands after editing the mapping table.
+
+        Added or removed keys are picked up on their own. A value edited
+        in place, e.g. a changed default in
+        _mapping_table['asg']['create']['default_params']_, is only seen by
+        commands after calling this.
+        """
+        invalidate()
+        for command in list(self.commands.values()):
+            command._recompile()  # pylint: disable=W0212
+
+    def resolve(self, command):
+        """Return the command for a dotted name like _asg.show_.
+
+        Args:
+            command: Dotted command name, or an AsgardCommand.
+
+        Returns:
+            AsgardCommand.
+        """
+        if not isinstance(command, str):
+            return command
+
+        resolved = self
+        for api_call in command.split('.'):
+            resolved = getattr(resolved, api_call)
+        return resolved
+
+    def batch(self, calls, max_workers=10, rate=None, deadline=None):
+        """Run many command calls with bounded parallelism.
+
+        Args:
+            calls: Iterable of (command, kwargs) pairs, _command_ being an
+                AsgardCommand or a dotted name like _asg.show_.
+            max_workers: Calls running at the same time.
+            rate: Calls started per second, or a shared
+                :class:`pyasgard.ratelimit.TokenBucket`.
+            deadline: Seconds, or a :class:`pyasgard.deadline.Deadline`,
+                for the whole batch. Calls without a _deadline_ of their own
+                share it.
+
+        Returns:
+            :class:`pyasgard.batch.BatchResults` in the order of _calls_,
+            errors are collected instead of raised.
+        """
+        calls = [(self.resolve(command), kwargs) for command, kwargs in calls]
+        if self.tracer is None:
+            return run_batch(calls, max_workers=max_workers, rate=rate,
+                             deadline=deadline)
+
+        with self.tracer.span('Asgard.batch',
+                              attributes={'asgard.calls': len(calls)}):
+            return run_batch(calls, max_workers=max_workers, rate=rate,
+                             deadline=deadline)
+
+    def wait_until(self, command, predicate, timeout=DEFAULT_WAIT, **kwargs):
+        """Poll _command_ until _predicate_ accepts its result.
+
+        See :meth:`pyasgard.waiter.Waiter.wait_until`.
+        """
+        return self.waiter.wait_until(command, predicate, timeout, **kwargs)
+
+    def wait_for_tasks(self, task_ids, timeout=DEFAULT_WAIT):
+        """Wait until every task finished, sharing _task.list_ polls.
+
+        See :meth:`pyasgard.waiter.Waiter.wait_for_tasks`.
+        """
+        return self.waiter.wait_for_tasks(task_ids, timeout)
+
+    def wait_for_task(self, task_id, timeout=DEFAULT_WAIT):
+        """Wait until a task completed, raise AsgardTaskError if it failed.
+
+        See :meth:`pyasgard.waiter.Waiter.wait_for_task`.
+        """
+        return self.waiter.wait_for_task(task_id, timeout)
+
+    def watch_deployment(self, deployment_id, deadline=None):
+        """Poll _deployment.show_ and yield the changes between polls.
+
+        Args:
+            deployment_id: ID of a running Deployment.
+            deadline: Seconds, or a :class:`pyasgard.deadline.Deadline`, to
+                watch at most, until the Deployment finished by default.
+
+        Returns:
+            Generator of :class:`pyasgard.watch.DeploymentChange`.
+
+        Raises:
+            AsgardTimeoutError: The _deadline_ passed.
+        """
+        return iter_changes(DeploymentWatch(
+            self.waiter, self.resolve('deployment.show'),
+            {'deployment_id': deployment_id}, deadline))
+
+    def close(self):
+        """Release pooled connections owned by this client."""
+        if self.owns_transport:
+            self.transport.close()
 
     def decrypt_password(self, password):
         """Decrypt the encrypted password string.
@@ -114,9 +301,7 @@ class Asgard(object):
         Returns:
             List of parameters found in endpoint path.
         """
-        keys = [param[2] for param in Template.pattern.findall(path)]
-
-        self.log.debug('Template find=%s', Template.pattern.findall(path))
+        keys = list(compile_path(path)[1])
         self.log.debug('path_keys=%s', keys)
 
         return keys
@@ -135,37 +320,36 @@ class Asgard(object):
         Returns:
             Fully constructed URL string with substitutions in place.
         """
-        self.log.debug('URL formatter locals:\n%s', pformat(locals()))
+        if self.log.isEnabledFor(logging.DEBUG):
+            self.log.debug('URL formatter locals:\n%s', pformat(locals()))
 
-        path_keys = self.find_path_keys(path)
+        template, path_keys = compile_path(path)
 
         # Substitute mustache '{}' placeholders with data from keywords
-        substitute_path = Template(path).substitute(kwargs)
+        substitute_path = template.substitute(kwargs)
         self.log.debug('substitute_path=%s', substitute_path)
 
-        self.log.debug('kwargs before pop=%s', pformat(kwargs))
+        self.log.debug('kwargs before pop=%s', LazyPformat(kwargs))
 
         # remove ${} parameter from url, so its not added to querystring
         for param in path_keys:
             self.log.debug('Removing url param: %s', param)
             kwargs.pop(param)
 
-        self.log.debug('kwargs after pop=%s', pformat(kwargs))
+        self.log.debug('kwargs after pop=%s', LazyPformat(kwargs))
 
         url = '{0}{1}'.format(self.url, substitute_path)
         self.log.log(15, 'url=%s', url)
 
         return url
 
-    def asgard_request(self, method, url_params):
+    def asgard_request(self, method, url_params, family=None):
         """Make an http request (data replacements are finalized)."""
-        self.log.log(15, 'getattr(%s, %s)(%s)\n[auth] redacted', requests,
-                     method.lower(), pformat(dict((
-                         key, value
-                     ) for key, value in url_params.items() if key != 'auth')))
-        response = getattr(requests, method.lower())(**url_params)
+        self.log.log(15, '%s.request(%s, %s)\n[auth] redacted', self.transport,
+                     method, LazyFormat(redact_auth, url_params))
+        response = self.transport.request(method, family=family, **url_params)
         self.log.debug('Request response:\n%s',
-                       pformat(inspect.getmembers(response)))
+                       LazyFormat(pformat_members, response))
 
         return response
 
@@ -196,28 +380,68 @@ class Asgard(object):
         if response is None:
             message = 'Response Not Found'
             self.log.error(message)
-
-            with open('unexpected.html', 'wt') as unexpected_html:
-                unexpected_html.write(response.text)
-
             raise AsgardError(message)
 
         if response.status_code == 401:
             raise AsgardAuthenticationError(response.reason)
 
         if response.status_code != status:
+            self.capture_response(response, 'error')
             error = AsgardError(
-                self.format_dict(response), response.status_code)
+                self.format_dict(response, capture=False),
+                response.status_code)
             self.log.fatal(error)
-
-            with open('error.html', 'wt') as error_html:
-                error_html.write(response.text)
-
             raise error
 
         return self.format_dict(response)
 
-    def format_dict(self, response):
+    def stream_handler(self, response, status):
+        """Handle a streamed response, decoding JSON arrays incrementally.
+
+        Errors are raised right away like in :meth:`response_handler`. JSON
+        bodies are not captured since they are never held in memory.
+
+        Args:
+            response: A requests.Response object requested with _stream_.
+            status: Expected status integer.
+
+        Returns:
+            Generator of the decoded array elements. Other responses are
+            read eagerly and a single element generator of the result is
+            returned.
+
+        Raises:
+            AsgardError: Response is missing or status code is not expected.
+            AsgardAuthenticationError: Asgard reported bad authentication.
+        """
+        if (response is None or response.status_code != status or
+                'json' not in response.headers.get('Content-Type', '')):
+            returned = self.response_handler(response, status)
+            return iter(returned if isinstance(returned, list) else
+                        [returned])
+
+        return self.stream_json(response)
+
+    def stream_json(self, response):
+        """Yield array elements of _response_ and release its connection."""
+        try:
+            for item in iter_json_array(response.iter_content(CHUNK_SIZE),
+                                        response.encoding or 'utf-8'):
+                yield item
+        finally:
+            response.close()
+
+    def capture_response(self, response, kind):
+        """Hand _response_ to the configured capture, if any.
+
+        Args:
+            response: requests.Response object.
+            kind: One of _json_, _html_ or _error_.
+        """
+        if self.capture is not None:
+            self.capture.capture(response, kind)
+
+    def format_dict(self, response, capture=True):
         """Format the response into a dict from HTML or JSON.
 
         Deserialize json content if content exist. In some cases Asgard returns
@@ -225,41 +449,52 @@ class Asgard(object):
 
         Args:
             response: requests.models.Response object.
+            capture: Hand the response to the configured capture.
 
         Returns:
-            Dict representation of HTML or JSON.
+            Dict representation of JSON.
+            LazyHTMLDict of an HTML page, converted to a dict on first
+            access.
             Str when Asgard returns simple text.
             Int when Asgard returns simple integer.
         """
         try:
-            response_json = response.json()
-            self.log.debug('Response JSON:\n%s', pformat(response_json))
-
-            with open('output.json', 'wt') as output_json:
-                output_json.write(response.text)
+            with phase('decode_json'):
+                response_json = response.json()
+            self.log.debug('Response JSON:\n%s', LazyPformat(response_json))
+            if capture:
+                self.capture_response(response, 'json')
 
             return response_json
         except ValueError:
             self.log.debug('Response HTML:\n%s', response.text)
+            if capture:
+                self.capture_response(response, 'html')
 
-            with open('output.html', 'wt') as output_html:
-                output_html.write(response.text)
+            # Keep a local reference, concurrent calls replace self.htmldict
+            with phase('decode_html'):
+                htmldict = self.htmldict = LazyHTMLDict(response.text)
+                is_html = 'html' in htmldict
 
-            self.htmldict = HTMLToDict(response.text)
-            if 'html' in self.htmldict.dict():
-                return self.parse_errors()
+            if is_html:
+                with phase('parse_errors'):
+                    return self.parse_errors(htmldict)
             else:
                 return response.text
 
-    def parse_errors(self):
+    def parse_errors(self, htmldict=None):
         """Parse out the Asgard errors from the htmldict output.
 
         To avoid false positives, if _error_ or _message_ HTML classes are
         found, the contents will be checked to make sure safe words are
         included indicating a true positive.
 
+        Args:
+            htmldict: LazyHTMLDict to check, defaults to the last one
+                parsed by this client.
+
         Returns:
-            Dict representation of HTML page.
+            LazyHTMLDict of the HTML page, not converted yet.
 
         Raises:
             AsgardReturnedError: Asgard returned a page with embedded errors or
@@ -267,20 +502,22 @@ class Asgard(object):
         """
         safe_words = ['added', 'created', 'deleted', 'removed', 'updated']
 
-        possible_issues = self.htmldict.soup.find_all(
-            class_=('errors', 'message'))
+        if htmldict is None:
+            htmldict = self.htmldict
+
+        possible_issues = htmldict.issues
         self.log.debug('Possible issues: %s', possible_issues)
 
         # No issues found, return safely
         if possible_issues == []:
-            return self.htmldict.dict()
+            return htmldict
 
         # Return safely if any safe word is found
         for issue in possible_issues:
             self.log.debug('Issue: %s', issue)
 
-            if any(word in issue.text.lower() for word in safe_words):
-                return self.htmldict.dict()
+            if any(word in issue.lower() for word in safe_words):
+                return htmldict
 
         self.log.fatal('Asgard returned possible issues: %s', possible_issues)
-        raise AsgardReturnedError(self.htmldict)
+        raise AsgardReturnedError(htmldict)
@@ -0,0 +1,236 @@
+"""Client side rate limiting and concurrency control.
+
+:class:`TokenBucket` allows _rate_ calls per second on average with bursts
+of up to _burst_ calls::
+
+    bucket = TokenBucket(rate=5, burst=10)
+    for name in names:
+        bucket.acquire()
+        client.asg.show(asg_id=name)
+
+:class:`RateLimiter` and :class:`AdaptiveConcurrency` plug into
+:class:`pyasgard.transport.Transport` to protect the Asgard server from every
+client sharing the Transport.
+"""
+import threading
+import time
+
+from .clock import monotonic
+
+
+class TokenBucket(object):
+    """Thread safe token bucket."""
+
+    def __init__(self, rate, burst=None, clock=monotonic):
+        """Start with a full bucket.
+
+        Args:
+            rate: Tokens added per second.
+            burst: Bucket size, defaults to _rate_ but at least 1.
+            clock: Function returning seconds, for tests.
+
+        Raises:
+            ValueError: _rate_ is not positive.
+        """
+        if not rate or rate <= 0:
+            raise ValueError(
+                'TokenBucket rate must be positive, got {0!r}'.format(rate))
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take _tokens_, going into debt when the bucket is empty.
+
+        Args:
+            tokens: Number of tokens to take.
+
+        Returns:
+            Seconds the caller has to wait before using the tokens.
+        """
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += delay
+            return delay
+
+    def refund(self, tokens=1):
+        """Give back _tokens_ reserved for a call that never started."""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + tokens)
+
+    def acquire(self, tokens=1):
+        """Take _tokens_, sleeping until they are available."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class RateLimiter(object):
+    """Token buckets per endpoint family on top of an overall budget.
+
+    A call of family _cluster_ takes a token from the _cluster_ bucket, if
+    one is configured, and from the default bucket, if one is configured::
+
+        limiter = RateLimiter(rate=20, families={'cluster': 1, 'asg': 2})
+        transport = Transport(rate_limiter=limiter)
+
+    Every request of a family is throttled, GETs such as _cluster.list_ as
+    much as POSTs such as _cluster.resize_.
+    """
+
+    def __init__(self, rate=None, burst=None, families=None,
+                 clock=monotonic):
+        """Create the buckets.
+
+        Args:
+            rate: Calls per second across all families, None for no limit.
+            burst: Bucket size of the overall budget.
+            families: Dict of family to calls per second, (rate, burst)
+                tuple or TokenBucket.
+            clock: Function returning seconds for the buckets created here,
+                for tests.
+        """
+        self.bucket = TokenBucket(rate, burst, clock) if rate else None
+        self.families = {}
+        for family, budget in (families or {}).items():
+            if isinstance(budget, TokenBucket):
+                self.families[family] = budget
+            elif isinstance(budget, tuple):
+                self.families[family] = TokenBucket(*budget, clock=clock)
+            else:
+                self.families[family] = TokenBucket(budget, clock=clock)
+
+        self.calls = {}
+        self.waited = {}
+        self.lock = threading.Lock()
+
+    @property
+    def stats(self):
+        """Dict of family to calls made and seconds spent waiting."""
+        with self.lock:
+            return {family: {'calls': calls,
+                             'waited': self.waited.get(family, 0.0)}
+                    for family, calls in self.calls.items()}
+
+    def reserve(self, family=None):
+        """Take a token for _family_.
+
+        Returns:
+            Seconds the caller has to wait.
+        """
+        delay = 0.0
+        for bucket in (self.families.get(family), self.bucket):
+            if bucket is not None:
+                delay = max(delay, bucket.reserve())
+
+        with self.lock:
+            self.calls[family] = self.calls.get(family, 0) + 1
+            self.waited[family] = self.waited.get(family, 0.0) + delay
+
+        return delay
+
+    def acquire(self, family=None):
+        """Take a token for _family_, sleeping until it is available."""
+        delay = self.reserve(family)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class AdaptiveConcurrency(object):
+    """Additive increase, multiplicative decrease limit of calls in flight.
+
+    Every call that succeeds within _target_latency_ raises the limit by
+    about one per _limit_ calls. A failed or slow call multiplies it by
+    _backoff_, at most once per _cooldown_ seconds so one burst of failures
+    counts as one signal::
+
+        transport = Transport(concurrency=AdaptiveConcurrency(maximum=20))
+    """
+
+    def __init__(self,
+                 initial=10,
+                 minimum=1,
+                 maximum=50,
+                 target_latency=2.0,
+                 backoff=0.5,
+                 cooldown=None,
+                 clock=monotonic):
+        """Configure the controller.
+
+        Args:
+            initial: Starting limit.
+            minimum: Lowest limit.
+            maximum: Highest limit.
+            target_latency: Seconds above which a call counts as slow.
+            backoff: Factor applied to the limit on a failed or slow call.
+            cooldown: Seconds between decreases, _target_latency_ when
+                omitted.
+            clock: Function returning seconds, for tests.
+        """
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.cooldown = target_latency if cooldown is None else cooldown
+        self.clock = clock
+
+        self.in_flight = 0
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+        self.last_decrease = None
+        self.condition = threading.Condition()
+
+    @property
+    def stats(self):
+        """Dict of the current limit, calls in flight and outcomes."""
+        with self.condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'successes': self.successes,
+                'failures': self.failures,
+                'decreases': self.decreases,
+            }
+
+    def acquire(self):
+        """Wait until a call fits in the limit."""
+        with self.condition:
+            while self.in_flight >= max(int(self.limit), self.minimum):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, failed=False):
+        """Record the outcome of a call and adjust the limit.
+
+        Args:
+            latency: Seconds the call took.
+            failed: Whether the call errored or Asgard was overloaded.
+        """
+        with self.condition:
+            self.in_flight -= 1
+
+            if failed or latency > self.target_latency:
+                self.failures += 1
+                now = self.clock()
+                if (self.last_decrease is None or
+                        now - self.last_decrease >= self.cooldown):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self.last_decrease = now
+                    self.decreases += 1
+            else:
+                self.successes += 1
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+            self.condition.notify_all()
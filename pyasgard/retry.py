@@ -0,0 +1,185 @@
+"""Retries with exponential backoff and jitter.
+
+A :class:`RetryPolicy` repeats requests that failed for transient reasons:
+connection errors, read timeouts and 5xx answers like 502 Bad Gateway. Only
+idempotent endpoints are retried, every GET and the endpoints declaring
+``'idempotent': True`` in MAPPING_TABLE, except for connect timeouts where
+the request never reached Asgard::
+
+    client = Asgard(url, retry=RetryPolicy(max_attempts=4))
+
+A :class:`RetryBudget` shared by all calls caps retries to a fraction of
+the calls made, so retries cannot multiply the load on Asgard during an
+outage.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+
+
+class RetryBudget(object):
+    """Allow retries up to a fraction of the calls made.
+
+    Every call deposits _ratio_ tokens, every retry withdraws one. The
+    balance starts at, and is capped by, _reserve_ so a quiet client can
+    still retry a few times.
+    """
+
+    def __init__(self, ratio=0.2, reserve=10):
+        """Configure the budget.
+
+        Args:
+            ratio: Retries allowed per call, e.g. 0.2 for 20%.
+            reserve: Maximum balance of retries.
+        """
+        self.ratio = ratio
+        self.reserve = float(reserve)
+        self.balance = float(reserve)
+        self.lock = threading.Lock()
+
+    def deposit(self):
+        """Record a call."""
+        with self.lock:
+            self.balance = min(self.reserve, self.balance + self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget.
+
+        Returns:
+            False when the budget is exhausted.
+        """
+        with self.lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+
+class RetryPolicy(object):  # pylint: disable=R0902
+    """Decide which failures to retry and how long to wait in between."""
+
+    def __init__(self,
+                 max_attempts=3,
+                 backoff=0.1,
+                 max_backoff=5.0,
+                 retry_connect=True,
+                 retry_timeout=True,
+                 statuses=(500, 502, 503, 504),
+                 budget=None,
+                 sleep=time.sleep):
+        """Configure the policy.
+
+        Args:
+            max_attempts: Attempts per call, including the first one.
+            backoff: Seconds of the first backoff, doubled per attempt.
+            max_backoff: Cap of a single backoff.
+            retry_connect: Retry connection errors.
+            retry_timeout: Retry read timeouts.
+            statuses: HTTP status codes to retry.
+            budget: Shared RetryBudget, a new one when omitted. Pass False
+                for unlimited retries.
+            sleep: Function sleeping for seconds, for tests.
+        """
+        self.log = logging.getLogger(__name__)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_connect = retry_connect
+        self.retry_timeout = retry_timeout
+        self.statuses = frozenset(statuses)
+        self.budget = RetryBudget() if budget is None else budget
+        self.sleep = sleep
+
+        self.retries = 0
+        self.gave_up = 0
+        self.lock = threading.Lock()
+
+    @property
+    def stats(self):
+        """Dict of retries made and failures returned without retrying."""
+        return {'retries': self.retries, 'gave_up': self.gave_up}
+
+    def delay(self, attempt):
+        """Full jitter backoff before retry number _attempt_, from 0."""
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2**attempt))
+
+    def retryable(self, failure, idempotent):
+        """Whether _failure_ may be retried at all.
+
+        Args:
+            failure: Exception raised by the request, or the Response.
+            idempotent: Whether the endpoint is idempotent.
+        """
+        if isinstance(failure, requests.ConnectTimeout):
+            # The request never reached Asgard
+            return self.retry_connect
+        if not idempotent:
+            return False
+        if isinstance(failure, requests.Timeout):
+            return self.retry_timeout
+        if isinstance(failure, requests.ConnectionError):
+            return self.retry_connect
+        return getattr(failure, 'status_code', None) in self.statuses
+
+    def call(self, send, idempotent=False, deadline=None):
+        """Call _send_ until it succeeds or retrying is not allowed.
+
+        Args:
+            send: Callable without arguments returning a requests.Response.
+            idempotent: Whether the endpoint is idempotent.
+            deadline: :class:`pyasgard.deadline.Deadline`, no retry starts
+                after it passed or backs off past it.
+
+        Returns:
+            requests.Response, possibly with a retryable status when the
+            attempts, the budget or the time ran out.
+
+        Raises:
+            requests.RequestException: The last connection error or timeout.
+        """
+        if self.budget:
+            self.budget.deposit()
+
+        attempt = 0
+        while True:
+            try:
+                failure = response = send()
+            except (requests.ConnectionError, requests.Timeout) as error:
+                failure, response = error, None
+
+            if (response is not None and
+                    response.status_code not in self.statuses):
+                return response
+
+            delay = self.delay(attempt)
+            if not self.should_retry(failure, attempt, idempotent,
+                                     deadline is None or
+                                     deadline.remaining() > delay):
+                if response is None:
+                    raise failure
+                return response
+
+            if response is not None:
+                response.close()
+
+            self.log.info('Retrying in %.2fs after: %s', delay,
+                          getattr(response, 'status_code', failure))
+            self.sleep(delay)
+            attempt += 1
+
+    def should_retry(self, failure, attempt, idempotent, in_time=True):
+        """Check attempts, the failure type, the time and the budget."""
+        allowed = (attempt + 1 < self.max_attempts and
+                   self.retryable(failure, idempotent) and in_time and
+                   (not self.budget or self.budget.withdraw()))
+
+        with self.lock:
+            if allowed:
+                self.retries += 1
+            else:
+                self.gave_up += 1
+        return allowed
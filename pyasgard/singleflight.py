@@ -0,0 +1,97 @@
+"""Coalesce identical concurrent requests into one.
+
+When several threads ask for the same GET at the same moment, the first one
+makes the request and the others wait for its result::
+
+    client = Asgard(url, singleflight=SingleFlight())
+
+Coalesced callers receive the very same result object, so treat results as
+read only or copy them before modifying. Errors are raised in every caller.
+A caller with a deadline stops waiting for another caller's request when its
+own deadline passes.
+A SingleFlight can be shared between clients, requests are keyed by their
+full URL including the region and by the credentials and headers they are
+sent with, so clients of different users never share a result.
+"""
+import logging
+import threading
+
+
+class Flight(object):  # pylint: disable=R0903
+    """One request in progress."""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Share the result of a call among concurrent callers with its key."""
+
+    def __init__(self):
+        self.log = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def stats(self):
+        """Dict of calls made and calls served by another caller's call."""
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+    def join(self):
+        """Count a caller that waits for a call already in flight."""
+        with self.lock:
+            self.coalesced += 1
+
+    def do(self, key, func, deadline=None):
+        """Call _func_ unless a call with _key_ is already in flight.
+
+        Args:
+            key: Hashable identity of the call.
+            func: Callable without arguments.
+            deadline: :class:`pyasgard.deadline.Deadline` of this caller,
+                bounds the wait for a call in flight.
+
+        Returns:
+            Result of _func_, possibly from another thread's call.
+
+        Raises:
+            AsgardTimeoutError: _deadline_ passed while waiting.
+            Exception: Whatever _func_ raised.
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            self.log.debug('Joining request in flight: %s', key)
+            if deadline is None:
+                flight.event.wait()
+            else:
+                while not flight.event.wait(max(deadline.remaining(), 0)):
+                    deadline.check()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = func()
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.event.set()
+
+        return flight.result
@@ -0,0 +1,171 @@
+"""Turn successive list snapshots into added, removed and changed events.
+
+:class:`InventorySync` polls a list endpoint such as ``instance.list`` and
+compares each snapshot with the previous one by record ID, so consumers only
+process the deltas::
+
+    inventory = InventorySync(client, 'instance.list')
+    for event in inventory.poll():
+        if event.kind == 'removed':
+            forget(event.key)
+
+    for event in inventory.events(interval=30):
+        handle(event)
+
+Records are compared by a SHA-256 digest of their canonical JSON, the
+previous snapshot's digests are all that is needed to tell which records
+changed. Records without an ID are skipped and counted in _stats_.
+Snapshots answered with 304 Not Modified are not compared at all.
+"""
+import hashlib
+import json
+import logging
+import time
+from collections import namedtuple
+
+from .fleet import pick
+from .waiter import conditional_fetch
+
+# List command -> path of the record ID
+DEFAULT_KEYS = {
+    'ami.list': 'imageId',
+    'asg.list': 'autoScalingGroupName',
+    'cluster.list': 'cluster',
+    'instance.list': 'instanceId',
+    'launchconfig.list': 'launchConfigurationName',
+}
+
+
+class SyncEvent(
+        namedtuple('SyncEvent', ['kind', 'key', 'old', 'new'])):
+    """Difference of one record between two snapshots.
+
+    Attributes:
+        kind: _added_, _removed_ or _changed_.
+        key: Record ID.
+        old: Previous record, None when added.
+        new: Current record, None when removed.
+    """
+
+    __slots__ = ()
+
+
+def record_hash(record):
+    """Digest of _record_, equal for equal JSON documents in any process."""
+    canonical = json.dumps(record, sort_keys=True, separators=(',', ':'),
+                           default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).digest()
+
+
+class InventorySync(object):
+    """Previous snapshot of a list endpoint, diffed against new ones."""
+
+    def __init__(self, client, command='instance.list', key=None,
+                 keep_records=True, **kwargs):
+        """Start with an empty snapshot, the first poll adds everything.
+
+        Args:
+            client: :class:`pyasgard.Asgard` to poll.
+            command: List command, AsgardCommand or dotted name.
+            key: Dotted path of the record ID, or a function of the record.
+                Looked up in _DEFAULT_KEYS_ when omitted.
+            keep_records: Keep records to fill _old_ of changed and removed
+                events, otherwise only hashes are kept and _old_ is None.
+            **kwargs: Keyword arguments of _command_.
+        """
+        self.log = logging.getLogger(__name__)
+        self.client = client
+        self.command = client.resolve(command)
+        self.kwargs = kwargs
+        self.keep_records = keep_records
+
+        name = self.command.__name__.partition('.')[2]
+        key = key or DEFAULT_KEYS.get(name)
+        if key is None:
+            raise TypeError('No record key known for {0}, pass key.'.format(
+                name))
+        self.key = key if callable(key) else (
+            lambda record: pick(record, key))
+
+        self.hashes = {}
+        self.records = {}
+        self.validators = {}
+        self.stats = {'polls': 0, 'not_modified': 0, 'added': 0,
+                      'removed': 0, 'changed': 0, 'skipped': 0}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def poll(self):
+        """Fetch a snapshot and diff it.
+
+        Returns:
+            List of SyncEvent, empty when nothing changed.
+        """
+        self.stats['polls'] += 1
+        snapshot = conditional_fetch(self.command, self.kwargs,
+                                     self.validators)
+        if snapshot is None:
+            self.stats['not_modified'] += 1
+            return []
+        return self.update(snapshot)
+
+    def update(self, snapshot):
+        """Diff _snapshot_ against the previous one and keep it.
+
+        Args:
+            snapshot: Iterable of record dicts.
+
+        Returns:
+            List of SyncEvent, removals last. Records without an ID are
+            left out.
+        """
+        events = []
+        hashes = {}
+        records = {} if self.keep_records else None
+
+        for record in snapshot:
+            key = self.key(record)
+            if key is None:
+                self.log.debug('Skipping record without ID: %s', record)
+                self.stats['skipped'] += 1
+                continue
+
+            digest = record_hash(record)
+            hashes[key] = digest
+            if records is not None:
+                records[key] = record
+
+            previous = self.hashes.get(key)
+            if previous is None:
+                events.append(SyncEvent('added', key, None, record))
+            elif previous != digest:
+                events.append(SyncEvent('changed', key,
+                                        self.records.get(key), record))
+
+        for key in self.hashes:
+            if key not in hashes:
+                events.append(SyncEvent('removed', key,
+                                        self.records.get(key), None))
+
+        for event in events:
+            self.stats[event.kind] += 1
+
+        self.hashes = hashes
+        self.records = records or {}
+        return events
+
+    def events(self, interval=30.0, sleep=time.sleep):
+        """Poll forever, yielding the events of every snapshot.
+
+        Args:
+            interval: Seconds between polls.
+            sleep: Function sleeping for seconds, for tests.
+
+        Yields:
+            SyncEvent.
+        """
+        while True:
+            for event in self.poll():
+                yield event
+            sleep(interval)
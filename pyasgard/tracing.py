@@ -0,0 +1,206 @@
+"""Tracing spans of command calls, modelled after OpenTelemetry.
+
+A :class:`Tracer` passed to the client records one span per command call,
+named by the dotted command, with child spans for the HTTP request and for
+parsing the response::
+
+    exporter = InMemoryExporter()
+    client = Asgard(url, tracer=Tracer(exporter))
+    client.cluster.resize(name='app', minAndMaxSize=4)
+
+    [span.name for span in exporter.spans]
+    # ['HTTP POST', 'parse', 'Asgard.cluster.resize'], children end first
+
+Spans started while another span is active become its children. Batches,
+multi region fan-outs and AsyncAsgard tasks carry the active span over to
+their worker threads and tasks, so a deploy shows up as one tree. Without
+a Tracer the client makes no spans at all.
+"""
+import random
+import threading
+import time
+
+# HACK: Python 2.7 and 3.6 are missing contextvars
+try:
+    import contextvars
+except ImportError:
+    contextvars = None  # pylint: disable=C0103
+
+if contextvars is not None:
+    CURRENT = contextvars.ContextVar('pyasgard_span', default=None)
+else:
+    LOCAL = threading.local()
+
+
+def current_span():
+    """Span active in this context, None outside of spans."""
+    if contextvars is not None:
+        return CURRENT.get()
+    return getattr(LOCAL, 'span', None)
+
+
+def activate(span):
+    """Make _span_ the active one.
+
+    Returns:
+        Token for :func:`deactivate`.
+    """
+    if contextvars is not None:
+        return CURRENT.set(span)
+    previous = getattr(LOCAL, 'span', None)
+    LOCAL.span = span
+    return previous
+
+
+def deactivate(token):
+    """Restore the span active before :func:`activate` returned _token_."""
+    if contextvars is not None:
+        CURRENT.reset(token)
+    else:
+        LOCAL.span = token
+
+
+def propagate(func):
+    """Wrap _func_ to run under the span active now, e.g. in a thread pool.
+
+    Returns:
+        _func_ itself when no span is active.
+    """
+    span = current_span()
+    if span is None:
+        return func
+
+    def run(*args, **kwargs):
+        """Call _func_ with the captured span active."""
+        token = activate(span)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            deactivate(token)
+
+    return run
+
+
+class Span(object):
+    """Timed operation with attributes, part of a trace.
+
+    Attributes:
+        name: Operation name, e.g. _Asgard.cluster.resize_.
+        trace_id: 32 hex digits shared by the whole trace.
+        span_id: 16 hex digits.
+        parent_id: _span_id_ of the parent, None for a root span.
+        attributes: Dict of attribute name to value.
+        start: Start time in seconds.
+        end: End time in seconds, None while running.
+        error: Exception that ended the span, None on success.
+    """
+
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id',
+                 'attributes', 'start', 'end', 'error', 'token')
+
+    def __init__(self, tracer, name, parent=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = (parent.trace_id if parent is not None else
+                         '{0:032x}'.format(random.getrandbits(128)))
+        self.span_id = '{0:016x}'.format(random.getrandbits(64))
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start = tracer.clock()
+        self.end = None
+        self.error = None
+        self.token = None
+
+    def __repr__(self):
+        return 'Span({0}, {1})'.format(self.name, self.attributes)
+
+    def __enter__(self):
+        self.token = activate(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        deactivate(self.token)
+        if exc_value is not None:
+            self.record_exception(exc_value)
+        self.finish()
+        return False
+
+    @property
+    def duration(self):
+        """Seconds from start to end, None while running."""
+        return None if self.end is None else self.end - self.start
+
+    def set_attribute(self, key, value):
+        """Set attribute _key_ to _value_."""
+        self.attributes[key] = value
+
+    def record_exception(self, error):
+        """Mark the span as failed by _error_."""
+        self.error = error
+        self.attributes['error.type'] = type(error).__name__
+
+    def finish(self):
+        """End the span and hand it to the exporter, once."""
+        if self.end is None:
+            self.end = self.tracer.clock()
+            self.tracer.export(self)
+
+
+class InMemoryExporter(object):
+    """Keep finished spans in a list, for tests.
+
+    Attributes:
+        spans: Finished spans in the order they ended.
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def export(self, span):
+        """Keep _span_."""
+        with self.lock:
+            self.spans.append(span)
+
+    def clear(self):
+        """Forget all spans."""
+        with self.lock:
+            del self.spans[:]
+
+    def children(self, span):
+        """List of the spans whose parent is _span_."""
+        return [child for child in self.spans
+                if child.parent_id == span.span_id]
+
+
+class Tracer(object):
+    """Create spans and send finished ones to an exporter."""
+
+    def __init__(self, exporter=None, clock=time.time):
+        """Configure the tracer.
+
+        Args:
+            exporter: Object with an _export(span)_ method, finished spans
+                are dropped when omitted.
+            clock: Function returning seconds, for tests.
+        """
+        self.exporter = exporter
+        self.clock = clock
+
+    def span(self, name, parent=None, attributes=None):
+        """Start a span, use it as a context manager to make it active.
+
+        Args:
+            name: Operation name.
+            parent: Parent Span, the active span when omitted.
+            attributes: Dict of initial attributes.
+
+        Returns:
+            Span.
+        """
+        return Span(self, name, parent or current_span(), attributes)
+
+    def export(self, span):
+        """Hand finished _span_ to the exporter."""
+        if self.exporter is not None:
+            self.exporter.export(span)
@@ -0,0 +1,115 @@
+"""Pooled HTTP transport for pyasgard."""
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .clock import monotonic
+
+
+class Transport(object):
+    """Keep-alive HTTP transport backed by a :class:`requests.Session`.
+
+    Every request made through the same Transport reuses the connection pool
+    of the mounted :class:`requests.adapters.HTTPAdapter`, so sequential calls
+    to one Asgard host skip the TCP and TLS handshakes after the first one.
+
+    A Transport can be shared between several Asgard clients, e.g. one per
+    region, to share sockets as well. The optional
+    :class:`pyasgard.ratelimit.RateLimiter` and
+    :class:`pyasgard.ratelimit.AdaptiveConcurrency` then apply to all of them.
+
+    Usage::
+
+        with Transport(pool_maxsize=20) as transport:
+            client = Asgard('http://asgard.example.com', transport=transport)
+            client.asg.show(asg_id='app-v000')
+    """
+
+    def __init__(self,
+                 pool_connections=10,
+                 pool_maxsize=10,
+                 max_retries=0,
+                 pool_block=False,
+                 session=None,
+                 rate_limiter=None,
+                 concurrency=None):
+        """Mount a pooled adapter on a new or provided session.
+
+        Args:
+            pool_connections: Number of per-host connection pools to cache.
+            pool_maxsize: Maximum number of connections kept alive per host.
+            max_retries: Int or :class:`urllib3.util.retry.Retry` used by the
+                adapter for connection level retries.
+            pool_block: Block when the pool is exhausted instead of opening a
+                throw away connection.
+            session: Existing :class:`requests.Session` to mount onto.
+            rate_limiter: :class:`pyasgard.ratelimit.RateLimiter` with
+                budgets per endpoint family.
+            concurrency: :class:`pyasgard.ratelimit.AdaptiveConcurrency`
+                bounding requests in flight.
+        """
+        self.log = logging.getLogger(__name__)
+
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+
+        self.session = session or requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections,
+                                   pool_maxsize=pool_maxsize,
+                                   max_retries=max_retries,
+                                   pool_block=pool_block)
+
+        for prefix in ('http://', 'https://'):
+            self.session.mount(prefix, self.adapter)
+
+        self.log.debug('Transport pool: connections=%s, maxsize=%s',
+                       pool_connections, pool_maxsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def stats(self):
+        """Dict of rate limiter and concurrency stats, when configured."""
+        stats = {}
+        if self.rate_limiter is not None:
+            stats['rate_limiter'] = self.rate_limiter.stats
+        if self.concurrency is not None:
+            stats['concurrency'] = self.concurrency.stats
+        return stats
+
+    def request(self, method, family=None, **kwargs):
+        """Send a request over the pooled session.
+
+        Args:
+            method: HTTP method string, e.g. GET.
+            family: Endpoint family for the rate limiter, e.g. _asg_.
+            **kwargs: Passed through to :meth:`requests.Session.request`.
+
+        Returns:
+            requests.Response object.
+        """
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(family)
+
+        if self.concurrency is None:
+            return self.session.request(method, **kwargs)
+
+        self.concurrency.acquire()
+        start = monotonic()
+        failed = True
+        try:
+            response = self.session.request(method, **kwargs)
+            failed = response.status_code >= 500 or response.status_code == 429
+            return response
+        finally:
+            self.concurrency.release(monotonic() - start, failed)
+
+    def close(self):
+        """Close all pooled connections."""
+        self.log.debug('Closing transport.')
+        self.session.close()
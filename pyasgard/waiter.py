@@ -0,0 +1,339 @@
+"""Wait for Asgard tasks and resources to reach a state.
+
+Mutations like ``cluster.resize`` start long running Asgard tasks. A
+:class:`Waiter` polls until they finish::
+
+    task = client.wait_for_task(task_id, timeout=900)
+    tasks = client.wait_for_tasks(task_ids)
+    group = client.wait_until('asg.show', lambda asg: asg['group'],
+                              asg_id='app-v001')
+
+Polls back off while nothing changes and snap back to the initial interval
+when the result changed. Every poll is a conditional GET, unchanged results
+come back as 304 Not Modified when Asgard sends validators. Many pending
+tasks share one ``task.list`` poll instead of one ``task.show`` each.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .deadline import Deadline
+from .exceptions import AsgardTaskError
+
+DEFAULT_WAIT = 600
+
+TASK_DONE = frozenset(['completed', 'failed'])
+
+
+def iter_tasks(listing):
+    """Yield the tasks of a _task.list_ result.
+
+    Args:
+        listing: List of tasks, or a dict of lists such as
+            _runningTaskList_ and _completedTaskList_.
+    """
+    if isinstance(listing, dict):
+        for value in listing.values():
+            if isinstance(value, list):
+                for task in value:
+                    yield task
+    else:
+        for task in listing or ():
+            yield task
+
+
+def conditional_fetch(command, kwargs, validators, deadline=None):
+    """Make a GET of _command_ that Asgard may answer with 304.
+
+    The poll is traced and timed like any other call of _command_, but
+    never answered from the client's cache.
+
+    Args:
+        command: AsgardCommand.
+        kwargs: Dict of keyword arguments.
+        validators: Dict of conditional headers, updated from the response.
+        deadline: Deadline of the request.
+
+    Returns:
+        Result of the command, None when it was not modified.
+    """
+    # pylint: disable=W0212
+    call = command._prepare(dict(kwargs, deadline=deadline))
+    return command._execute(call._replace(validators=validators))
+
+
+def task_done(task):
+    """Whether _task_ completed or failed."""
+    return str(task.get('status', '')).lower() in TASK_DONE
+
+
+class Wait(object):
+    """State of one wait, driven by :meth:`Waiter.run` or an event loop.
+
+    A driver calls :meth:`poll`, which blocks on requests, then
+    :meth:`finished` and otherwise sleeps for :meth:`next_delay` seconds.
+    """
+
+    def __init__(self, waiter, timeout):
+        self.waiter = waiter
+        self.deadline = Deadline.coerce(timeout)
+        self.interval = waiter.interval
+        self.previous = None
+        self.result = None
+
+    def poll(self):
+        """Request the current state."""
+        raise NotImplementedError
+
+    def finished(self, state):
+        """Check _state_ from :meth:`poll`, keeping the outcome in _result_."""
+        raise NotImplementedError
+
+    def changed(self, state):
+        """Whether _state_ differs from the previous poll."""
+        changed = state != self.previous
+        self.previous = state
+        return changed
+
+    def next_delay(self, state):
+        """Seconds to sleep before the next poll.
+
+        Raises:
+            AsgardTimeoutError: The deadline passed.
+        """
+        if self.changed(state):
+            self.interval = self.waiter.interval
+        else:
+            self.interval = min(self.waiter.max_interval,
+                                self.interval * self.waiter.factor)
+
+        if self.deadline is None:
+            return self.interval
+
+        self.deadline.check()
+        return min(self.interval, self.deadline.remaining())
+
+
+class UntilWait(Wait):
+    """Poll a command until a predicate accepts its result."""
+
+    def __init__(self, waiter, command, predicate, kwargs, timeout):
+        super(UntilWait, self).__init__(waiter, timeout)
+        self.command = command
+        self.predicate = predicate
+        self.kwargs = kwargs
+
+    def poll(self):
+        return self.waiter.fetch(self.command, self.kwargs, self.deadline)
+
+    def finished(self, state):
+        self.result = state
+        return bool(self.predicate(state))
+
+
+class TaskWait(Wait):
+    """Poll tasks until all of them completed or failed.
+
+    One pending task is polled with _task.show_. Several pending tasks
+    share one _task.list_, tasks missing from it fall back to _task.show_.
+    """
+
+    def __init__(self, waiter, task_ids, timeout):
+        super(TaskWait, self).__init__(waiter, timeout)
+        self.tasks = OrderedDict((str(task_id), None) for task_id in task_ids)
+        self.result = self.tasks
+
+    @property
+    def pending(self):
+        """List of IDs of tasks that did not finish yet."""
+        return [task_id for task_id, task in self.tasks.items()
+                if task is None or not task_done(task)]
+
+    def poll(self):
+        pending = self.pending
+        state = {}
+
+        if len(pending) > 1:
+            wanted = set(pending)
+            for task in iter_tasks(self.waiter.fetch('task.list', {},
+                                                     self.deadline)):
+                task_id = str(task.get('id'))
+                if task_id in wanted:
+                    state[task_id] = task
+
+        for task_id in pending:
+            if task_id not in state:
+                state[task_id] = self.waiter.fetch(
+                    'task.show', {'id': task_id}, self.deadline)
+
+        return state
+
+    def finished(self, state):
+        self.tasks.update(state)
+        return not self.pending
+
+
+class Waiter(object):
+    """Poll Asgard with adaptive backoff and conditional GETs."""
+
+    def __init__(self,
+                 client,
+                 interval=1.0,
+                 max_interval=15.0,
+                 factor=1.5,
+                 sleep=time.sleep,
+                 max_entries=256):
+        """Configure polling.
+
+        Args:
+            client: :class:`pyasgard.Asgard` to poll.
+            interval: Seconds between polls after a change.
+            max_interval: Longest pause between polls.
+            factor: Growth of the pause per unchanged poll.
+            sleep: Function sleeping for seconds, for tests.
+            max_entries: Number of polled URLs whose validators and last
+                result are kept.
+        """
+        self.log = logging.getLogger(__name__)
+        self.client = client
+        self.interval = interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.sleep = sleep
+
+        self.max_entries = max_entries
+
+        # Call key to (validators, result) of the last full answer
+        self.polled = OrderedDict()
+        self.lock = threading.Lock()
+        self.polls = 0
+        self.not_modified = 0
+
+    @property
+    def stats(self):
+        """Dict of polls answered in full or as not modified."""
+        return {'polls': self.polls, 'not_modified': self.not_modified}
+
+    def fetch(self, command, kwargs, deadline=None):
+        """Make one conditional GET of _command_.
+
+        Args:
+            command: AsgardCommand or dotted name like _task.show_.
+            kwargs: Dict of keyword arguments.
+            deadline: Deadline of the wait.
+
+        Returns:
+            Result of the command, the very same object as the last time
+            when Asgard answered 304 Not Modified.
+        """
+        command = self.client.resolve(command)
+        # pylint: disable=W0212
+        call = command._prepare(dict(kwargs, deadline=deadline))
+        key = call.key
+        with self.lock:
+            validators, previous = self.polled.get(key, (None, None))
+
+        validators = dict(validators or {})
+        result = command._execute(call._replace(validators=validators))
+
+        with self.lock:
+            self.polled.pop(key, None)
+            if result is None and previous is not None:
+                self.not_modified += 1
+                result = previous
+            else:
+                self.polls += 1
+
+            if validators:
+                self.polled[key] = (validators, result)
+                while len(self.polled) > self.max_entries:
+                    self.polled.popitem(last=False)
+
+        return result
+
+    def until(self, command, predicate, timeout=DEFAULT_WAIT, **kwargs):
+        """Return an UntilWait, see :meth:`wait_until`."""
+        return UntilWait(self, command, predicate, kwargs, timeout)
+
+    def tasks(self, task_ids, timeout=DEFAULT_WAIT):
+        """Return a TaskWait, see :meth:`wait_for_tasks`."""
+        return TaskWait(self, task_ids, timeout)
+
+    def run(self, wait):
+        """Poll and sleep until _wait_ finished.
+
+        Returns:
+            _result_ of _wait_.
+
+        Raises:
+            AsgardTimeoutError: The timeout of _wait_ passed.
+        """
+        while True:
+            state = wait.poll()
+            if wait.finished(state):
+                return wait.result
+
+            delay = wait.next_delay(state)
+            self.log.debug('Polling again in %.1fs', delay)
+            self.sleep(delay)
+
+    def wait_until(self, command, predicate, timeout=DEFAULT_WAIT,
+                   **kwargs):
+        """Poll _command_ until _predicate_ returns True for its result.
+
+        Args:
+            command: AsgardCommand or dotted name like _asg.show_.
+            predicate: Function taking the result.
+            timeout: Seconds, or a Deadline, to wait at most, None to wait
+                forever.
+            **kwargs: Keyword arguments of _command_.
+
+        Returns:
+            The accepted result.
+
+        Raises:
+            AsgardTimeoutError: _timeout_ passed.
+        """
+        return self.run(self.until(command, predicate, timeout, **kwargs))
+
+    def wait_for_tasks(self, task_ids, timeout=DEFAULT_WAIT):
+        """Wait until every task completed or failed.
+
+        Args:
+            task_ids: Iterable of task IDs.
+            timeout: Seconds, or a Deadline, to wait at most, None to wait
+                forever.
+
+        Returns:
+            OrderedDict of task ID string to task, failed tasks included.
+
+        Raises:
+            AsgardTimeoutError: _timeout_ passed.
+        """
+        return self.run(self.tasks(task_ids, timeout))
+
+    def wait_for_task(self, task_id, timeout=DEFAULT_WAIT):
+        """Wait until a task completed.
+
+        Args:
+            task_id: Task ID.
+            timeout: Seconds, or a Deadline, to wait at most, None to wait
+                forever.
+
+        Returns:
+            Dict of the completed task.
+
+        Raises:
+            AsgardTaskError: The task failed.
+            AsgardTimeoutError: _timeout_ passed.
+        """
+        return check_task(self.wait_for_tasks([task_id], timeout))
+
+
+def check_task(tasks):
+    """Return the only task of _tasks_, raise AsgardTaskError if it failed."""
+    task = next(iter(tasks.values()))
+    if str(task.get('status', '')).lower() == 'failed':
+        raise AsgardTaskError(task)
+    return task
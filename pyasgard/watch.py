@@ -0,0 +1,154 @@
+"""Stream the progress of a deployment as changes.
+
+``watch_deployment`` polls ``deployment.show`` and yields what changed
+between two polls instead of whole documents::
+
+    for change in client.watch_deployment('1234', deadline=3600):
+        if change.kind == 'log':
+            print(change.new)
+
+    async for change in async_client.watch_deployment('1234'):
+        ...
+
+Unchanged deployments are answered with 304 Not Modified when Asgard sends
+validators and are not diffed at all. New log lines are found from the end
+of the previous log, so each line is looked at once.
+"""
+from collections import namedtuple
+
+from .waiter import Wait, conditional_fetch
+
+DEPLOYMENT_DONE = frozenset(
+    ['completed', 'failed', 'canceled', 'terminated', 'timedout'])
+
+
+class DeploymentChange(
+        namedtuple('DeploymentChange', ['kind', 'key', 'old', 'new'])):
+    """One difference between two polls of a deployment.
+
+    Attributes:
+        kind: _status_, _step_, _log_ or _field_.
+        key: Field name, index of the step or of the log line.
+        old: Previous value, None when new.
+        new: Current value, None when removed.
+    """
+
+    __slots__ = ()
+
+
+def unwrap(document):
+    """Return the deployment of a _deployment.show_ result."""
+    if isinstance(document, dict) and isinstance(
+            document.get('deployment'), dict):
+        return document['deployment']
+    return document or {}
+
+
+def new_lines(old, new):
+    """Index of the first line of _new_ that is not in the log _old_."""
+    if not old:
+        return 0
+    if len(new) >= len(old) and new[len(old) - 1] == old[-1]:
+        return len(old)
+
+    # Rewritten log, compare line by line
+    for index, (previous, current) in enumerate(zip(old, new)):
+        if previous != current:
+            return index
+    return min(len(old), len(new))
+
+
+def diff_deployment(old, new):
+    """List the DeploymentChange from deployment _old_ to _new_.
+
+    Args:
+        old: Deployment dict of the previous poll, None on the first one.
+        new: Deployment dict of this poll.
+
+    Returns:
+        List of DeploymentChange, status first and log lines last.
+    """
+    old = old or {}
+    changes = []
+
+    if old.get('status') != new.get('status'):
+        changes.append(DeploymentChange('status', 'status', old.get('status'),
+                                        new.get('status')))
+
+    for key in sorted(set(old) | set(new)):
+        if key in ('status', 'steps', 'log'):
+            continue
+        if old.get(key) != new.get(key):
+            changes.append(DeploymentChange('field', key, old.get(key),
+                                            new.get(key)))
+
+    old_steps = old.get('steps') or []
+    new_steps = new.get('steps') or []
+    for index in range(max(len(old_steps), len(new_steps))):
+        before = old_steps[index] if index < len(old_steps) else None
+        after = new_steps[index] if index < len(new_steps) else None
+        if before != after:
+            changes.append(DeploymentChange('step', index, before, after))
+
+    old_log = old.get('log') or []
+    new_log = new.get('log') or []
+    for index in range(new_lines(old_log, new_log), len(new_log)):
+        changes.append(DeploymentChange('log', index, None, new_log[index]))
+
+    return changes
+
+
+class DeploymentWatch(Wait):
+    """Poll a deployment, the state of a poll is its list of changes."""
+
+    def __init__(self, waiter, command, kwargs, deadline=None):
+        """Prepare the watch.
+
+        Args:
+            waiter: :class:`pyasgard.waiter.Waiter` providing the backoff.
+            command: AsgardCommand of _deployment.show_.
+            kwargs: Dict of keyword arguments, e.g. _deployment_id_.
+            deadline: Seconds, or a Deadline, None to watch until the
+                deployment finished.
+        """
+        super(DeploymentWatch, self).__init__(waiter, deadline)
+        self.command = command
+        self.kwargs = kwargs
+        self.deployment = None
+        self.validators = {}
+
+    def poll(self):
+        """Request the deployment and diff it against the last one."""
+        document = conditional_fetch(self.command, self.kwargs,
+                                     self.validators, self.deadline)
+        if document is None:
+            return []
+
+        deployment = unwrap(document)
+        changes = diff_deployment(self.deployment, deployment)
+        self.deployment = deployment
+        return changes
+
+    def changed(self, state):
+        return bool(state)
+
+    def finished(self, state):
+        self.result = self.deployment
+        status = str(self.deployment.get('status', '')).lower()
+        return status in DEPLOYMENT_DONE
+
+
+def iter_changes(watch):
+    """Yield the changes of _watch_ until the deployment finished.
+
+    Raises:
+        AsgardTimeoutError: The timeout of _watch_ passed.
+    """
+    while True:
+        changes = watch.poll()
+        for change in changes:
+            yield change
+
+        if watch.finished(changes):
+            return
+        watch.waiter.sleep(watch.next_delay(changes))
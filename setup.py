@@ -12,7 +12,9 @@ setup(name='pyasgard',
       author_email='saviles@gogoair.com',
       packages=find_packages(),
       install_requires=['beautifulsoup4',
+                        'futures; python_version < "3.2"',
                         'requests', ],
+      extras_require={'numpy': ['numpy']},
       keywords="asgard api python netflixoss",
       url='https://github.com/gogoair/pyasgard',
       download_url='https://github.com/gogoair/pyasgard',
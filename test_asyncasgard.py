@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""Unit testing for pyasgard.asyncasgard.
+
+Kept apart from test_pyasgard.py since async/await and asyncio.run need
+Python 3.7, conftest.py skips this module on older versions.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from pyasgard.asyncasgard import AsyncAsgard
+from pyasgard.deadline import Deadline
+from pyasgard.exceptions import (AsgardError, AsgardTaskError,
+                                 AsgardTimeoutError)
+from pyasgard.ratelimit import TokenBucket
+from pyasgard.singleflight import SingleFlight
+from pyasgard.tracing import InMemoryExporter, Tracer
+from test_pyasgard import (  # pylint: disable=W0611,W0621
+    deployment_route, json_route, slow_json_route, stub)
+
+
+def test_async_gather(stub):
+    """Gathered commands overlap, bounded by max_concurrency."""
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_route(handler):
+        """Hold the request long enough to overlap with others."""
+        with lock:
+            active.append(handler)
+            peak.append(len(active))
+        time.sleep(0.2)
+        with lock:
+            active.remove(handler)
+        asg_id = handler.path.split('/')[-1].split('.')[0]
+        return json_route({'name': asg_id})
+
+    for index in range(8):
+        path = '/us-east-1/autoScaling/show/asg{0}.json'.format(index)
+        stub.routes[path] = slow_route
+
+    async def show_all():
+        """Run every show concurrently."""
+        async with AsyncAsgard(stub.url, max_concurrency=4) as client:
+            return await asyncio.gather(*[
+                client.asg.show(asg_id='asg{0}'.format(index))
+                for index in range(8)])
+
+    start = time.time()
+    results = asyncio.run(show_all())
+    elapsed = time.time() - start
+
+    assert [result['name'] for result in results] == [
+        'asg{0}'.format(index) for index in range(8)]
+    assert max(peak) == 4
+    assert elapsed < 1.2
+
+
+def test_async_errors(stub):
+    """Errors from the executor surface when awaiting the command."""
+    stub.routes['/us-east-1/autoScaling/show/gone.json'] = json_route(
+        {'error': 'gone'}, status=404)
+
+    async def show():
+        """Await a failing command."""
+        async with AsyncAsgard(stub.url) as client:
+            return await client.asg.show(asg_id='gone')
+
+    with pytest.raises(AsgardError):
+        asyncio.run(show())
+
+
+def test_async_singleflight(stub):
+    """Identical awaited GETs share one executor slot and request."""
+    stub.routes['/us-east-1/cluster/show/app-main.json'] = slow_json_route(
+        {'cluster': 'app-main'})
+    stub.routes['/us-east-1/cluster/show/gone.json'] = slow_json_route(
+        {}, status=404)
+
+    async def show_all():
+        """Await the same show many times."""
+        async with AsyncAsgard(stub.url, max_concurrency=2,
+                               singleflight=SingleFlight()) as client:
+            results = await asyncio.gather(*[
+                client.cluster.show(cluster_id=cluster_id)
+                for cluster_id in ['app-main'] * 6 + ['gone'] * 2
+            ], return_exceptions=True)
+            return results, client.singleflight.stats
+
+    start = time.time()
+    results, stats = asyncio.run(show_all())
+    assert time.time() - start < 0.4
+
+    assert results[:6] == [{'cluster': 'app-main'}] * 6
+    assert all(isinstance(error, AsgardError) for error in results[6:])
+    assert len(stub.requests) == 2
+    assert stats == {'calls': 2, 'coalesced': 6}
+
+    async def impatient():
+        """Give up on a request in flight when the deadline passes."""
+        async with AsyncAsgard(stub.url,
+                               singleflight=SingleFlight()) as client:
+            leader = asyncio.ensure_future(
+                client.cluster.show(cluster_id='app-main'))
+            await asyncio.sleep(0.05)
+            with pytest.raises(AsgardTimeoutError):
+                await client.cluster.show(cluster_id='app-main',
+                                          deadline=0.05)
+            return await leader
+
+    assert asyncio.run(impatient()) == {'cluster': 'app-main'}
+
+
+def test_async_singleflight_cancel(stub):
+    """Cancelling the caller that started a request spares the others."""
+    stub.routes['/us-east-1/cluster/show/app-main.json'] = slow_json_route(
+        {'cluster': 'app-main'})
+
+    async def show_twice():
+        """Cancel the first of two identical shows."""
+        async with AsyncAsgard(stub.url,
+                               singleflight=SingleFlight()) as client:
+            leader = asyncio.ensure_future(
+                client.cluster.show(cluster_id='app-main'))
+            await asyncio.sleep(0.05)
+            follower = asyncio.ensure_future(
+                client.cluster.show(cluster_id='app-main'))
+            await asyncio.sleep(0.05)
+            leader.cancel()
+            return await asyncio.gather(leader, follower,
+                                        return_exceptions=True)
+
+    leader, follower = asyncio.run(show_twice())
+    assert isinstance(leader, asyncio.CancelledError)
+    assert follower == {'cluster': 'app-main'}
+    assert len(stub.requests) == 1
+
+
+def test_async_batch(stub):
+    """AsyncAsgard batches await calls with their own concurrency limit."""
+    for index in range(4):
+        stub.routes['/us-east-1/autoScaling/show/asg{0}.json'.format(
+            index)] = slow_json_route({'name': index}, delay=0.1)
+
+    async def show_all():
+        """Map show over every group."""
+        async with AsyncAsgard(stub.url) as client:
+            return await client.asg.show.map(
+                [{'asg_id': 'asg{0}'.format(index)} for index in range(5)],
+                max_concurrency=2)
+
+    results = asyncio.run(show_all())
+    assert results.results == [{'name': index} for index in range(4)
+                               ] + [None]
+    assert results.errors[0].error.error_code == 404
+
+    bucket = TokenBucket(rate=1, burst=2)
+
+    async def too_late():
+        """Start calls with no time left."""
+        async with AsyncAsgard(stub.url) as client:
+            return await client.batch([('asg.show', {'asg_id': 'asg0'})] * 2,
+                                      rate=bucket, deadline=Deadline(0))
+
+    results = asyncio.run(too_late())
+    assert all(isinstance(item.error, AsgardTimeoutError)
+               for item in results)
+    assert bucket.tokens == 2
+
+
+def test_async_wait_for_task(stub):
+    """Failed tasks raise AsgardTaskError when awaited."""
+    stub.routes['/us-east-1/task/show/1.json'] = json_route(
+        {'id': 1, 'status': 'failed'})
+
+    with pytest.raises(AsgardTaskError) as error:
+        asyncio.run(AsyncAsgard(stub.url).wait_for_task(1))
+    assert error.value.task['id'] == 1
+
+
+def test_async_deployment_watch(stub):
+    """Watch endpoints are async iterators of changes."""
+    running = {'id': 'd1', 'status': 'running', 'steps': ['wait'],
+               'log': ['Started']}
+    done = dict(running, status='completed', steps=['done'],
+                log=['Started', 'Finished'])
+    stub.routes['/us-east-1/deployment/show/d1.json'] = deployment_route(
+        [running, done])
+
+    async def watch():
+        """Collect the changes on the event loop."""
+        async with AsyncAsgard(stub.url) as client:
+            client.waiter.interval = 0.01
+            return [change.kind async for change in
+                    client.watch_deployment('d1')]
+
+    assert asyncio.run(watch()) == ['status', 'field', 'step', 'log',
+                                    'status', 'step', 'log']
+
+
+def test_async_tracing(stub):
+    """Batched calls on the event loop are children of the batch span."""
+    stub.routes['/us-east-1/autoScaling/show/app-v000.json'] = json_route(
+        {'name': 'app-v000'})
+    exporter = InMemoryExporter()
+
+    async def show_all():
+        """Batch on the event loop."""
+        async with AsyncAsgard(stub.url,
+                               tracer=Tracer(exporter)) as client:
+            return await client.batch(
+                [('asg.show', {'asg_id': 'app-v000'})] * 2)
+
+    assert not asyncio.run(show_all()).errors
+    batch = exporter.spans[-1]
+    shows = exporter.children(batch)
+    assert batch.name == 'Asgard.batch'
+    assert [span.name for span in shows] == ['Asgard.asg.show'] * 2
+    assert all(exporter.children(span) for span in shows)
@@ -7,15 +7,58 @@
     URL = 'http://asgard.demo.com'
     USERNAME = 'happydog'
 """
+import copy
+import hashlib
+import inspect
+import json
 import logging
+import os
+import pickle
 import re
+import subprocess
+import sys
+import threading
+import time
 from pprint import pformat
 
 import pytest
+import requests
+from bs4 import BeautifulSoup
+import pyasgard.asgardcommand
+import pyasgard.htmltodict
+import pyasgard.lazylog
+import pyasgard.pyasgard
+from pyasgard.asgardcommand import AsgardCommand
+from pyasgard.cache import MemoryBackend, ResponseCache, SQLiteBackend
+from pyasgard.capture import DirectoryCapture, MemoryCapture
+from pyasgard.columns import DictionaryColumn, to_columns
+from pyasgard.compiled import compile_endpoint, invalidate
+from pyasgard.deadline import Deadline
 from pyasgard.endpoints import MAPPING_TABLE
 from pyasgard.exceptions import (AsgardAuthenticationError, AsgardError,
-                                 AsgardReturnedError)
+                                 AsgardReturnedError, AsgardTimeoutError)
+from pyasgard.fleet import FleetIndex
+from pyasgard.htmltodict import HTMLToDict, LazyHTMLDict
+from pyasgard.jsonstream import iter_json_array
+from pyasgard.metrics import Metrics
+from pyasgard.multiregion import MultiRegionAsgard
 from pyasgard.pyasgard import Asgard
+from pyasgard.ratelimit import (AdaptiveConcurrency, RateLimiter,
+                                TokenBucket)
+from pyasgard.retry import RetryBudget, RetryPolicy
+from pyasgard.singleflight import SingleFlight
+from pyasgard.sync import InventorySync, record_hash
+from pyasgard.tracing import InMemoryExporter, Tracer
+from pyasgard.transport import Transport
+
+try:
+    from html.parser import HTMLParser
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from HTMLParser import HTMLParser
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
 
 try:
     from config import URL, ENC_PASSWD, USERNAME  # pylint: disable=C0411
@@ -27,6 +70,88 @@ except ImportError:
 ASGARD = Asgard(URL, username=USERNAME, password=ENC_PASSWD)
 
 
+class StubHandler(BaseHTTPRequestHandler):
+    """Answer requests from the routes of a local StubServer."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # pylint: disable=C0103
+        """Respond to GET."""
+        self.respond()
+
+    def do_POST(self):  # pylint: disable=C0103
+        """Respond to POST."""
+        self.respond()
+
+    def respond(self):
+        """Look up the route for the request path and write it back."""
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        path = self.path.split('?')[0]
+        self.server.requests.append(
+            (self.command, self.path,
+             # HACK: Python 2.7 lowercases the header names
+             requests.structures.CaseInsensitiveDict(self.headers.items()),
+             body))
+
+        route = self.server.routes.get(path, (404, {}, 'Not Found'))
+        if callable(route):
+            route = route(self)
+        status, headers, payload = route
+
+        if not isinstance(payload, bytes):
+            payload = payload.encode('utf-8')
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):  # pylint: disable=W0221
+        """Keep test output quiet."""
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """Local stand-in for an Asgard server."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.routes = {}
+        self.requests = []
+        self.connections = 0
+        self.url = 'http://127.0.0.1:{0}'.format(self.server_address[1])
+
+    def get_request(self):
+        self.connections += 1
+        return HTTPServer.get_request(self)
+
+
+def json_route(payload, status=200, headers=None):
+    """Build a JSON route for StubServer."""
+    all_headers = {'Content-Type': 'application/json'}
+    all_headers.update(headers or {})
+    return (status, all_headers, json.dumps(payload))
+
+
+@pytest.fixture
+def stub():
+    """Run a StubServer for the duration of a test."""
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
 def test_dir():
     """Test Asgard.__dir__ contains all attributes and dynamic endpoints."""
     asgard = Asgard('sdkfj')
@@ -213,6 +338,1166 @@ def test_server():
     assert match.group()
 
 
+def test_transport_reuses_connections(stub):
+    """Sequential calls should share one keep-alive connection."""
+    stub.routes['/us-east-1/region/list.json'] = json_route(
+        [{'code': 'us-east-1'}])
+
+    with Asgard(stub.url) as asgard:
+        for _ in range(5):
+            assert asgard.regions.list() == [{'code': 'us-east-1'}]
+
+    assert len(stub.requests) == 5
+    assert stub.connections == 1
+
+
+def test_shared_transport(stub):
+    """Clients only close a Transport they created themselves."""
+    stub.routes['/us-west-2/region/list.json'] = json_route([])
+
+    with Transport(pool_maxsize=2) as transport:
+        with Asgard(stub.url, ec2_region='us-west-2',
+                    transport=transport) as asgard:
+            assert not asgard.owns_transport
+            assert asgard.regions.list() == []
+
+        # Pool survives the client closing, so the socket is reused
+        other = Asgard(stub.url, ec2_region='us-west-2', transport=transport)
+        assert other.regions.list() == []
+
+    assert stub.connections == 1
+
+
+
+
+def test_no_capture_by_default(stub, tmpdir):
+    """Responses are not written to the working directory."""
+    stub.routes['/us-east-1/region/list.json'] = json_route([])
+
+    with tmpdir.as_cwd():
+        Asgard(stub.url).regions.list()
+        assert tmpdir.listdir() == []
+
+
+def test_memory_capture(stub):
+    """MemoryCapture keeps only the most recent responses."""
+    for index in range(3):
+        path = '/us-east-1/autoScaling/show/asg{0}.json'.format(index)
+        stub.routes[path] = json_route({'name': index})
+
+    capture = MemoryCapture(maxlen=2)
+    asgard = Asgard(stub.url, capture=capture)
+    for index in range(3):
+        asgard.asg.show(asg_id='asg{0}'.format(index))
+
+    assert [json.loads(item.text)['name'] for item in capture.responses
+            ] == [1, 2]
+    assert capture.responses[-1].kind == 'json'
+    assert capture.responses[-1].method == 'GET'
+
+
+def test_directory_capture(stub, tmpdir):
+    """DirectoryCapture writes unique files and always keeps errors."""
+    stub.routes['/us-east-1/region/list.json'] = json_route([])
+    stub.routes['/us-east-1/autoScaling/show/gone.json'] = json_route(
+        {'error': 'gone'}, status=404)
+    stub.routes['/us-east-1/cluster/show/app.json'] = (
+        200, {'Content-Type': 'text/html; charset=utf-8'},
+        u'<p>caf\xe9</p>')
+
+    capture = DirectoryCapture(str(tmpdir), sample_rate=0.0, max_bytes=5,
+                               max_total_bytes=9)
+    asgard = Asgard(stub.url, capture=capture)
+    asgard.regions.list()
+    for _ in range(2):
+        with pytest.raises(AsgardError):
+            asgard.asg.show(asg_id='gone')
+    capture.close()
+
+    files = os.listdir(str(tmpdir))
+    assert len(files) == 1
+    assert files[0].endswith('-error.json')
+    assert tmpdir.join(files[0]).read() == '{"err'
+    assert (capture.total_bytes, capture.dropped) == (5, 1)
+
+    capture = MemoryCapture(max_bytes=7)
+    Asgard(stub.url, capture=capture).cluster.show(cluster_id='app')
+    assert capture.responses[0].text == '<p>caf'
+
+
+def test_lazy_logging(stub, monkeypatch, caplog):
+    """Pretty printing only happens when DEBUG records are emitted."""
+    calls = []
+
+    def counting_pformat(obj):
+        """Record every pretty print."""
+        calls.append(obj)
+        return repr(obj)
+
+    monkeypatch.setattr(pyasgard.lazylog, 'pformat', counting_pformat)
+    monkeypatch.setattr(pyasgard.pyasgard, 'pformat', counting_pformat)
+    monkeypatch.setattr(pyasgard.asgardcommand, 'pformat', counting_pformat)
+    stub.routes['/us-east-1/region/list.json'] = json_route([])
+
+    caplog.set_level(logging.WARNING)
+    Asgard(stub.url).regions.list()
+    assert calls == []
+
+    caplog.set_level(logging.DEBUG)
+    Asgard(stub.url).regions.list()
+    assert calls
+
+
+def test_compiled_endpoint():
+    """Endpoints compile once and recompile when invalidated."""
+    api_map = {
+        'path': '/autoScaling/save',
+        'method': 'POST',
+        'status': 200,
+        'valid_params': 'vpc_id',
+        'default_params': {'name': ''},
+    }
+
+    endpoint = compile_endpoint(api_map)
+    assert compile_endpoint(api_map) is endpoint
+    assert endpoint.accepted_params == frozenset(['vpc_id', 'name'])
+    # HACK: Python 2.7 has no inspect.signature to build one with
+    if hasattr(inspect, 'signature'):
+        assert str(endpoint.signature) == "(*, name='', vpc_id='')"
+
+    with pytest.raises(AttributeError):
+        endpoint.method = 'GET'
+
+    with pytest.raises(TypeError):
+        endpoint.validate('bad', 'save')
+
+    # Dynamic defaults, as documented for asg.create
+    api_map['default_params']['selectedLoadBalancersForVpcIdvpc-1'] = ['lb']
+    changed = compile_endpoint(api_map)
+
+    assert changed is not endpoint
+    assert compile_endpoint(api_map) is changed
+    assert changed.default_body['selectedLoadBalancersForVpcIdvpc-1'] == [
+        'lb']
+    assert changed.signature is None
+    changed.validate('selectedLoadBalancersForVpcIdvpc-1', 'save')
+
+    api_map['default_params']['name'] = 'app'
+    assert compile_endpoint(api_map) is changed
+    invalidate(api_map)
+    assert compile_endpoint(api_map).default_body['name'] == 'app'
+
+    asgard = Asgard('http://test.com')
+    asgard.mapping_table = copy.deepcopy(MAPPING_TABLE)
+    create = asgard.asg.create
+    assert create.endpoint is create.endpoint
+    asgard.mapping_table['asg']['create']['default_params']['extra'] = 1
+    assert create.endpoint.default_body['extra'] == 1
+    assert 'extra=1' in create.__doc__
+    asgard.mapping_table['asg']['create']['default_params']['extra'] = 2
+    asgard.reload_endpoints()
+    assert create.endpoint.default_body['extra'] == 2
+
+    lb_param = 'selectedLoadBalancersForVpcIdvpc-1'
+    defaults = MAPPING_TABLE['asg']['create']['default_params']
+    Asgard('http://test.com').asg.create.endpoint  # pylint: disable=W0104
+    defaults[lb_param] = ['lb']
+    try:
+        create = Asgard('http://test.com').asg.create
+        assert create.endpoint.default_body[lb_param] == ['lb']
+        create.endpoint.validate(lb_param, 'create')
+    finally:
+        del defaults[lb_param]
+    assert lb_param not in create.endpoint.accepted_params
+
+
+def endpoint_keys(api_map):
+    """Yield the keys of every branch and endpoint of _api_map_."""
+    for key, value in api_map.items():
+        if isinstance(value, dict) and key != 'default_params':
+            yield key
+            for nested in endpoint_keys(value):
+                yield nested
+
+
+def test_endpoints_not_shadowed():
+    """No endpoint is hidden by an attribute of the client or a command."""
+    asgard = Asgard('http://test.com')
+    attributes = (set(dir(Asgard)) | set(vars(asgard)) |
+                  set(dir(AsgardCommand)) | set(vars(asgard.deployment)))
+
+    assert not attributes & set(endpoint_keys(MAPPING_TABLE))
+    assert asgard.deployment.prepare.endpoint.path == (
+        '/deployment/prepare/${cluster_id}.json')
+
+
+def test_command_cache():
+    """Commands are cached per client without touching the shared class."""
+    asgard = Asgard('http://test.com')
+
+    assert asgard.asg.show is asgard.asg.show
+    assert asgard.application.list.instances is (
+        asgard.application.list.instances)
+    assert type(asgard.application.list.instances) is AsgardCommand
+    assert Asgard('http://test.com').asg.show is not asgard.asg.show
+
+    # HACK: Python 2.7 has no inspect.signature
+    if hasattr(inspect, 'signature'):
+        assert str(inspect.signature(asgard.asg.show)) == "(*, asg_id='')"
+        assert str(inspect.signature(asgard.cluster.show)) == (
+            "(*, cluster_id='')")
+    assert 'asg_id' in asgard.asg.show.__doc__
+    assert '__signature__' not in vars(AsgardCommand.__call__)
+
+    with pytest.raises(AttributeError):
+        asgard.not_a_command  # pylint: disable=W0104
+    assert 'Asgard.not_a_command' not in asgard.commands
+
+
+ASGARD_ERROR_PAGE = u"""<!DOCTYPE html>
+<html><head>
+<meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1">
+<title>Create Application</title></head>
+<body class="application">
+<div class="message">Could not create &quot;app&quot;</div>
+<div class=" errors  warning"><ul>
+  <li>Email is required &amp; must be valid&#46;</li>
+  <li>Name is taken&nbsp;<br>try again<!-- hint --></li>
+</ul></div>
+<form action="save"><input type="text" name="name" value="a&lt;b">
+<textarea name="description">  keep
+  spacing </textarea><pre> x <b>y</b></pre></form>
+<script>if (a < b) { c(); }</script>
+</body></html>"""
+
+HTML_SAMPLES = [
+    ASGARD_ERROR_PAGE,
+    '<p b="1" a>x<!--c-->y <b>z</b> w<br>q</p>t',
+    '<div><p>one<p>two</div></span>three<br></br><hr/><img src=a>',
+    '<table><tr><td headers=" a  b ">1<td>2</tr></table>',
+    '<ul><li>a</li><li>b</li></ul><ul><li>&#128;&bogus;&#x41;</li></ul>',
+    '<a rel=" no  follow" class="">l</a>&lt;t&gt; <![CDATA[ c ]]> <?pi?>',
+    '<pre>\n<br>x<!DOCTYPE y><pre>y</pre>z</pre> after <meta charset=x>',
+]
+
+
+class PrettifiedHTMLToDict(HTMLParser):
+    """Reference: feed BeautifulSoup.prettify() output to HTMLParser."""
+
+    def __init__(self, content):
+        HTMLParser.__init__(self)
+        builder = HTMLToDict('')
+        self.handle_starttag = builder.open_element
+        self.handle_endtag = builder.close_element
+        self.handle_data = builder.append_data
+        # HACK: Python 2.7 HTMLParser does not convert character references
+        self.handle_entityref = lambda name: builder.append_data(
+            self.unescape('&{0};'.format(name)))
+        self.handle_charref = lambda name: builder.append_data(
+            self.unescape('&#{0};'.format(name)))
+
+        self.feed(BeautifulSoup(content, 'html.parser').prettify())
+        self.close()
+        self.doc = builder.dict()
+
+
+def test_htmltodict_single_pass():
+    """Single pass output matches the BeautifulSoup prettify double parse."""
+    for html in HTML_SAMPLES:
+        expected = json.dumps(PrettifiedHTMLToDict(html).doc, sort_keys=True)
+        assert json.dumps(HTMLToDict(html).dict(), sort_keys=True) == expected
+
+        soup = BeautifulSoup(html, 'html.parser')
+        assert HTMLToDict(html).issues == [
+            issue.text for issue in soup.find_all(class_=('errors', 'message'))
+        ]
+
+    htmldict = HTMLToDict(ASGARD_ERROR_PAGE)
+    assert htmldict.dict()['html']['body']['form']['input']['#value'] == 'a<b'
+    assert htmldict.issues[0] == 'Could not create "app"'
+    assert 'Email is required & must be valid.' in htmldict.issues[1]
+    assert htmldict.soup.title.text == 'Create Application'
+
+
+def test_html_errors(stub):
+    """Embedded errors raise, messages with safe words return the page."""
+    html_route = (200, {'Content-Type': 'text/html'}, ASGARD_ERROR_PAGE)
+    stub.routes['/us-east-1/autoScaling/show/bad.json'] = html_route
+    stub.routes['/us-east-1/autoScaling/show/good.json'] = (
+        200, {'Content-Type': 'text/html'},
+        '<html><div class="message">Group app-v001 created</div></html>')
+
+    asgard = Asgard(stub.url)
+    with pytest.raises(AsgardReturnedError) as error:
+        asgard.asg.show(asg_id='bad')
+    assert error.value.issues == HTMLToDict(ASGARD_ERROR_PAGE).issues
+
+    returned = asgard.asg.show(asg_id='good')
+    assert isinstance(returned, dict)
+    assert returned.htmldict is None
+    assert json.loads(json.dumps(returned.dict())) == {'html': {'div': {
+        '': 'Group app-v001 created', '#class': 'message'}}}
+
+
+def test_html_cache_hit(stub):
+    """Cached HTML pages survive pickling, converted or not."""
+    stub.routes['/us-east-1/autoScaling/show/app-v001.json'] = (
+        200, {'Content-Type': 'text/html'},
+        '<html><div class="info">Group app-v001</div></html>')
+    expected = {'html': {'div': {'': 'Group app-v001', '#class': 'info'}}}
+
+    asgard = Asgard(stub.url, cache=ResponseCache(ttl=60))
+    assert asgard.asg.show(asg_id='app-v001') == expected
+    cached = asgard.asg.show(asg_id='app-v001')
+    assert isinstance(cached, LazyHTMLDict)
+    assert cached == expected
+    assert asgard.cache.stats['hits'] == 1
+
+    page = LazyHTMLDict(ASGARD_ERROR_PAGE)
+    assert len(pickle.dumps(page)) < len(ASGARD_ERROR_PAGE) + 200
+    assert pickle.loads(pickle.dumps(page)).htmldict is None
+    page['changed'] = True
+    restored = pickle.loads(pickle.dumps(page, pickle.HIGHEST_PROTOCOL))
+    assert restored == page
+    assert restored['changed'] is True
+    assert restored.issues == page.issues
+
+
+def test_lazy_htmldict(monkeypatch):
+    """Pages are only converted when the dict is read."""
+    page = LazyHTMLDict('<!DOCTYPE html><html><p class="info">ok</p></html>')
+    monkeypatch.setattr(pyasgard.htmltodict, 'HTMLScanner', None)
+    monkeypatch.setattr(pyasgard.htmltodict, 'HTMLToDict', None)
+    assert 'html' in page
+    assert page.issues == []
+    assert page.htmldict is None
+    monkeypatch.undo()
+
+    assert page['html']['p'][''] == 'ok'
+    assert dict(page) == page.dict() == {'html': {'p': {
+        '': 'ok', '#class': 'info'}}}
+    assert json.loads(json.dumps(page)) == page
+    assert repr(page) == repr(page.dict())
+
+    for html in HTML_SAMPLES + ['<p>x</p><html>', '<b class=message>m</b>']:
+        page, expected = LazyHTMLDict(html), HTMLToDict(html)
+        assert page.issues == expected.issues
+        assert ('html' in page) == ('html' in expected.dict())
+        assert page.htmldict is None
+        assert page == expected.dict()
+
+
+def test_iter_json_array():
+    """Arrays are decoded element by element across any chunk boundary."""
+    for value in [[], [1, 22, 333], [{'a': [1, {'b': None}]}, u'\u00e9\u4e2d',
+                                     True, -1.5e3, '],"'], {'one': 1}, 42]:
+        body = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        for size in (1, 2, 3, len(body) + 1):
+            chunks = (body[index:index + size]
+                      for index in range(0, len(body), size))
+            decoded = list(iter_json_array(chunks))
+            assert decoded == (value if isinstance(value, list) else [value])
+
+    for body in [b'', b'[1 2]', b'[1,', b'[1] 2', b'{"a": 1']:
+        with pytest.raises(ValueError):
+            list(iter_json_array([body]))
+
+
+def test_stream(stub):
+    """stream=True yields records without changing the eager default."""
+    records = [{'instanceId': 'i-{0:08x}'.format(index)}
+               for index in range(2000)]
+    stub.routes['/us-east-1/instance/list.json'] = json_route(records)
+    stub.routes['/us-east-1/autoScaling/list.json'] = json_route(
+        {'error': 'nope'}, status=500)
+
+    asgard = Asgard(stub.url, capture=MemoryCapture())
+    assert asgard.instance.list() == records
+
+    streamed = asgard.instance.list(stream=True)
+    assert not isinstance(streamed, list)
+    assert next(streamed) == records[0]
+    assert list(streamed) == records[1:]
+    assert [item.kind for item in asgard.capture.responses] == ['json']
+
+    with pytest.raises(AsgardError):
+        asgard.asg.list(stream=True)
+
+
+def test_multi_region(stub):
+    """Commands fan out to every region, failures are kept per region."""
+    stub.routes['/us-east-1/region/list.json'] = json_route([
+        {'code': 'us-east-1', 'description': 'Virginia'},
+        {'code': 'us-west-2', 'description': 'Oregon'},
+        {'code': 'eu-west-1', 'description': 'Ireland'},
+    ])
+    for region in ('us-east-1', 'us-west-2'):
+        stub.routes['/{0}/autoScaling/show/app-v000.json'.format(
+            region)] = json_route({'region': region})
+
+    with MultiRegionAsgard(stub.url) as asgard:
+        assert asgard.regions == ['us-east-1', 'us-west-2', 'eu-west-1']
+        assert 'asg' in dir(asgard)
+
+        results = asgard.asg.show(asg_id='app-v000')
+        assert list(results) == ['us-east-1', 'us-west-2']
+        assert results['us-west-2'] == {'region': 'us-west-2'}
+        assert list(results.errors) == ['eu-west-1']
+        assert results.errors['eu-west-1'].error_code == 404
+
+        mapped = asgard.asg.show.map([{'asg_id': 'app-v000'}])
+        assert list(mapped) == ['us-east-1', 'us-west-2', 'eu-west-1']
+        assert mapped['us-west-2'].results == [{'region': 'us-west-2'}]
+        assert mapped['eu-west-1'].errors[0].error.error_code == 404
+
+        with pytest.raises(AttributeError):
+            asgard.not_a_command  # pylint: disable=W0104
+        with pytest.raises(AttributeError):
+            asgard.asg.show.api_call  # pylint: disable=W0104
+
+    assert stub.connections <= 3
+
+    with MultiRegionAsgard(stub.url, regions=['us-west-2']) as asgard:
+        assert asgard.asg.show(asg_id='app-v000') == {
+            'us-west-2': {'region': 'us-west-2'}}
+
+
+def test_response_cache(stub):
+    """GET results are cached per URL until a POST of the family."""
+    stub.routes['/us-east-1/image/list.json'] = json_route([{'id': 'ami-1'}])
+    stub.routes['/us-east-1/autoScaling/show/app-v000.json'] = json_route(
+        {'group': 'app-v000'})
+    stub.routes['/us-east-1/cluster/list.json'] = json_route([])
+    stub.routes['/us-east-1/task/list.json'] = json_route([])
+    stub.routes['/us-east-1/autoScaling/save'] = (302, {}, '')
+
+    asgard = Asgard(stub.url, cache=ResponseCache(ttls={'ami.list': 300}))
+    images = asgard.ami.list()
+    images.append('mutated')
+    assert asgard.ami.list() == [{'id': 'ami-1'}]
+    asgard.asg.show(asg_id='app-v000')
+    asgard.asg.show(asg_id='app-v000')
+    asgard.cluster.list()
+    asgard.task.list()
+    asgard.task.list()
+    assert len(stub.requests) == 5
+    assert asgard.cache.stats['hits'] == 2
+
+    with pytest.raises(AsgardError):
+        asgard.asg.delete(name='app-v000')
+    assert asgard.cache.stats['invalidations'] == 2
+    asgard.asg.show(asg_id='app-v000')
+    asgard.ami.list()
+    assert len(stub.requests) == 7
+    assert asgard.cache.stats['misses'] == 6
+
+    backend = MemoryBackend(max_entries=2)
+    asgard = Asgard(stub.url, cache=ResponseCache(backend=backend))
+    for _ in range(2):
+        asgard.ami.list()
+        asgard.asg.show(asg_id='app-v000')
+        asgard.cluster.list()
+    assert asgard.cache.stats['evictions'] == 4
+    assert len(backend) == 2
+
+    shared = ResponseCache()
+    for username in ('alice', 'bob', 'bob'):
+        Asgard(stub.url, username=username, password=ENC_PASSWD,
+               cache=shared).ami.list()
+    assert shared.stats['misses'] == 2
+    assert shared.stats['hits'] == 1
+    assert 'secret' not in ResponseCache.key(
+        'http://test.com', None, ResponseCache.identity(('bob', 'secret'),
+                                                        None))
+
+
+def conditional_route(payload, etag=None, last_modified=None):
+    """Build a route answering 304 when the validators still match."""
+    headers = {'Content-Type': 'application/json'}
+    if etag:
+        headers['ETag'] = etag
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+
+    def route(handler):
+        """Compare the conditional request headers."""
+        if etag and handler.headers.get('If-None-Match') == etag:
+            return (304, headers, '')
+        if last_modified and handler.headers.get(
+                'If-Modified-Since') == last_modified:
+            return (304, headers, '')
+        return (200, headers, json.dumps(payload))
+
+    return route
+
+
+def test_cache_revalidation(stub):
+    """Expired entries with validators are renewed by 304 answers."""
+    stub.routes['/us-east-1/image/list.json'] = conditional_route(
+        [{'id': 'ami-1'}], etag='"v1"')
+    stub.routes['/us-east-1/subnet/list.json'] = conditional_route(
+        [{'id': 'subnet-1'}], last_modified='Sat, 17 Oct 2026 10:00:00 GMT')
+    stub.routes['/us-east-1/security/list.json'] = json_route([])
+
+    asgard = Asgard(stub.url, cache=ResponseCache(ttl=0))
+    for _ in range(3):
+        assert asgard.ami.list() == [{'id': 'ami-1'}]
+        assert asgard.subnets.list() == [{'id': 'subnet-1'}]
+        assert asgard.security.list() == []
+
+    assert [request[2].get('If-None-Match') for request in stub.requests
+            if request[1].endswith('image/list.json')] == [None, '"v1"',
+                                                           '"v1"']
+    assert [request[2].get('If-Modified-Since') for request in stub.requests
+            if request[1].endswith('subnet/list.json')][-1] == (
+                'Sat, 17 Oct 2026 10:00:00 GMT')
+    assert all('If-None-Match' not in request[2]
+               for request in stub.requests
+               if request[1].endswith('security/list.json'))
+    assert asgard.cache.stats['revalidations'] == 4
+    assert asgard.cache.stats['misses'] == 5
+    assert 'If-None-Match' not in asgard.headers
+
+    stub.routes['/us-east-1/image/list.json'] = conditional_route(
+        [{'id': 'ami-2'}], etag='"v2"')
+    assert asgard.ami.list() == [{'id': 'ami-2'}]
+
+
+def test_sqlite_cache(stub, tmpdir):
+    """A new process starts warm from the SQLite backend."""
+    stub.routes['/us-east-1/instance/list.json'] = json_route(
+        [{'instanceId': 'i-1'}])
+    stub.routes['/us-east-1/image/list.json'] = json_route([])
+    stub.routes['/us-east-1/cluster/list.json'] = json_route([])
+    stub.routes['/us-east-1/autoScaling/save'] = (302, {}, '')
+
+    script = ('from pyasgard import Asgard\n'
+              'from pyasgard.cache import ResponseCache, SQLiteBackend\n'
+              'cache = ResponseCache(backend=SQLiteBackend({0!r}))\n'
+              'Asgard({1!r}, cache=cache).instance.list()\n').format(
+                  str(tmpdir), stub.url)
+    subprocess.check_call([sys.executable, '-c', script],
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert len(stub.requests) == 1
+
+    backend = SQLiteBackend(str(tmpdir))
+    asgard = Asgard(stub.url, cache=ResponseCache(backend=backend))
+    assert asgard.instance.list() == [{'instanceId': 'i-1'}]
+    assert len(stub.requests) == 1
+    assert asgard.cache.stats['hits'] == 1
+
+    with pytest.raises(AsgardError):
+        asgard.asg.delete(name='app-v000')
+    assert len(backend) == 0
+
+    small = SQLiteBackend(str(tmpdir), filename='small.sqlite3',
+                          max_entries=2)
+    asgard = Asgard(stub.url, cache=ResponseCache(backend=small))
+    asgard.instance.list()
+    asgard.ami.list()
+    writes = small.connection.total_changes
+    asgard.instance.list()
+    assert small.connection.total_changes == writes
+    asgard.cluster.list()
+    assert len(small) == 2
+    assert small.evictions == 1
+    assert asgard.instance.list() == [{'instanceId': 'i-1'}]
+    assert asgard.cache.stats['hits'] == 2
+    small.close()
+    backend.close()
+
+
+def slow_json_route(payload, delay=0.2, status=200):
+    """Build a JSON route that holds each request for _delay_ seconds."""
+    def route(handler):  # pylint: disable=W0613
+        """Sleep, then answer."""
+        time.sleep(delay)
+        return json_route(payload, status=status)
+
+    return route
+
+
+def test_singleflight(stub):
+    """Identical concurrent GETs share one request, errors included."""
+    stub.routes['/us-east-1/cluster/show/app-main.json'] = slow_json_route(
+        {'cluster': 'app-main'})
+    stub.routes['/us-east-1/cluster/show/app-other.json'] = slow_json_route(
+        {'cluster': 'app-other'})
+    stub.routes['/us-east-1/cluster/show/gone.json'] = slow_json_route(
+        {}, status=404)
+
+    asgard = Asgard(stub.url, singleflight=SingleFlight(), pool_maxsize=20)
+    results = []
+    errors = []
+
+    def show(cluster_id):
+        """Record the result or error of one call."""
+        try:
+            results.append(asgard.cluster.show(cluster_id=cluster_id))
+        except AsgardError as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=show, args=(cluster_id, ))
+               for cluster_id in ['app-main'] * 8 + ['app-other', 'gone'] * 2]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(stub.requests) == 3
+    assert results.count({'cluster': 'app-main'}) == 8
+    assert results.count({'cluster': 'app-other'}) == 2
+    assert [error.error_code for error in errors] == [404, 404]
+    assert asgard.singleflight.stats == {'calls': 3, 'coalesced': 9}
+
+    asgard.cluster.show(cluster_id='app-main')
+    assert len(stub.requests) == 4
+
+    leader = threading.Thread(target=show, args=('app-main', ))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(AsgardTimeoutError):
+        asgard.cluster.show(cluster_id='app-main', deadline=0.05)
+    leader.join()
+    assert asgard.singleflight.stats == {'calls': 5, 'coalesced': 10}
+
+    shared = SingleFlight()
+    threads = [
+        threading.Thread(
+            target=Asgard(stub.url, username=username, password=ENC_PASSWD,
+                          singleflight=shared).cluster.show,
+            kwargs={'cluster_id': 'app-main'})
+        for username in ('alice', 'bob')
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert shared.stats == {'calls': 2, 'coalesced': 0}
+
+
+def test_token_bucket():
+    """Bursts pass, then callers are spaced by the rate."""
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=3, clock=lambda: now[0])
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve() == 0.5
+    assert bucket.reserve() == 1.0
+    bucket.refund()
+    assert bucket.reserve() == 1.0
+    now[0] = 10.0
+    assert bucket.reserve() == 0.0
+
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_batch(stub):
+    """Batches keep call order and collect errors per call."""
+    for index in range(6):
+        stub.routes['/us-east-1/autoScaling/show/asg{0}.json'.format(
+            index)] = slow_json_route({'name': index}, delay=0.1)
+    stub.routes['/us-east-1/cluster/show/app.json'] = json_route(
+        {'cluster': 'app'})
+
+    asgard = Asgard(stub.url)
+    start = time.time()
+    results = asgard.asg.show.map(
+        [{'asg_id': 'asg{0}'.format(index)} for index in range(7)],
+        max_workers=7)
+    assert time.time() - start < 0.5
+
+    assert results.results == [{'name': index} for index in range(6)
+                               ] + [None]
+    assert [item.ok for item in results] == [True] * 6 + [False]
+    assert results.errors[0].kwargs == {'asg_id': 'asg6'}
+    assert results.errors[0].error.error_code == 404
+
+    results = asgard.batch([('cluster.show', {'cluster_id': 'app'}),
+                            (asgard.asg.show, {'asg_id': 'asg1'}),
+                            ('asg.show', {'asg_id': 'a', 'bad': 'b'})])
+    assert [item.command for item in results] == ['cluster.show',
+                                                  'asg.show', 'asg.show']
+    assert results.results[:2] == [{'cluster': 'app'}, {'name': 1}]
+    assert isinstance(results.errors[0].error, TypeError)
+
+    start = time.time()
+    asgard.batch([('cluster.show', {'cluster_id': 'app'})] * 5,
+                 rate=TokenBucket(rate=10, burst=1))
+    assert time.time() - start >= 0.35
+
+    bucket = TokenBucket(rate=1, burst=2)
+    results = asgard.batch([('cluster.show', {'cluster_id': 'app'})] * 2,
+                           rate=bucket, deadline=Deadline(0))
+    assert all(isinstance(item.error, AsgardTimeoutError)
+               for item in results)
+    assert bucket.tokens == 2
+
+
+def test_rate_limiter():
+    """Families have their own budget on top of the overall one."""
+    now = [0.0]
+    limiter = RateLimiter(rate=4, burst=2, families={'cluster': (1, 1)},
+                          clock=lambda: now[0])
+
+    assert limiter.reserve('cluster') == 0.0
+    assert limiter.reserve('cluster') == 1.0
+    assert limiter.reserve('asg') == 0.25
+    assert limiter.stats == {'cluster': {'calls': 2, 'waited': 1.0},
+                             'asg': {'calls': 1, 'waited': 0.25}}
+
+
+def test_adaptive_concurrency(stub):
+    """Failures halve the limit once per cooldown, successes grow it."""
+    now = [0.0]
+    controller = AdaptiveConcurrency(initial=8, maximum=10,
+                                     target_latency=1.0,
+                                     clock=lambda: now[0])
+    for _ in range(3):
+        controller.acquire()
+        controller.release(0.1, failed=True)
+    assert controller.stats['limit'] == 4
+    now[0] = 2.0
+    controller.acquire()
+    controller.release(5.0)
+    assert controller.stats['limit'] == 2
+    for _ in range(20):
+        controller.acquire()
+        controller.release(0.1)
+    assert controller.stats == {'limit': 6, 'in_flight': 0, 'successes': 20,
+                                'failures': 4, 'decreases': 2}
+
+    stub.routes['/us-east-1/cluster/list.json'] = json_route({}, status=503)
+    transport = Transport(concurrency=AdaptiveConcurrency(initial=4),
+                          rate_limiter=RateLimiter(families={'cluster': 100}))
+    with pytest.raises(AsgardError):
+        Asgard(stub.url, transport=transport).cluster.list()
+    assert transport.stats['concurrency']['limit'] == 2
+    assert transport.stats['rate_limiter']['cluster']['calls'] == 1
+
+
+def flaky_route(payload, failures=1, status=503):
+    """Build a JSON route that fails _failures_ times before answering."""
+    remaining = [failures]
+
+    def route(handler):  # pylint: disable=W0613
+        """Fail while failures remain, then answer."""
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            return json_route({'error': 'unavailable'}, status=status)
+        return json_route(payload)
+
+    return route
+
+
+def test_retry(stub):
+    """Idempotent calls are retried, other POSTs fail on the first error."""
+    delays = []
+    policy = RetryPolicy(max_attempts=3, budget=False, sleep=delays.append)
+    client = Asgard(stub.url, retry=policy)
+
+    stub.routes['/us-east-1/cluster/list.json'] = flaky_route(['a'], 2)
+    assert client.cluster.list() == ['a']
+    assert len(delays) == 2
+    assert all(0 <= delay <= 0.2 for delay in delays)
+
+    stub.routes['/us-east-1/cluster/resize'] = flaky_route({}, 1, 502)
+    client.cluster.resize()
+    assert policy.stats == {'retries': 3, 'gave_up': 0}
+
+    stub.routes['/us-east-1/push/startRolling'] = flaky_route({}, 1, 503)
+    with pytest.raises(AsgardError):
+        client.ami.push()
+    assert policy.stats == {'retries': 3, 'gave_up': 1}
+
+    stub.routes['/us-east-1/cluster/list.json'] = flaky_route(['b'], 5)
+    with pytest.raises(AsgardError):
+        client.cluster.list()
+    assert policy.stats == {'retries': 5, 'gave_up': 2}
+
+
+def test_retry_budget():
+    """Retries stop when the budget runs out and refill with calls."""
+    budget = RetryBudget(ratio=0.5, reserve=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+    attempts = []
+
+    def send():
+        """Fail to connect every time."""
+        attempts.append(1)
+        raise requests.ConnectTimeout('down')
+
+    policy = RetryPolicy(max_attempts=5, budget=RetryBudget(0.1, 2),
+                         sleep=lambda delay: None)
+    with pytest.raises(requests.ConnectTimeout):
+        policy.call(send)
+    assert len(attempts) == 3
+
+
+def test_timeouts(stub):
+    """Call timeouts beat endpoint timeouts, which beat the client's."""
+    # pylint: disable=W0212
+    client = Asgard(stub.url, timeout=5)
+    assert client.cluster.list._prepare({}).url_params['timeout'] == (5, 5)
+    assert client.server.uptime._prepare({}).url_params['timeout'] == (2, 2)
+    call = client.server.uptime._prepare({'request_timeout': (1, 3)})
+    assert call.url_params['timeout'] == (1, 3)
+
+    stub.routes['/us-east-1/cluster/list.json'] = slow_json_route([], 0.5)
+    with pytest.raises(requests.ReadTimeout):
+        client.cluster.list(request_timeout=0.1)
+
+
+def test_deadline(stub):
+    """Deadlines cover retries and backoff, and are shared by a batch."""
+    now = [0.0]
+    deadline = Deadline(2, clock=lambda: now[0])
+    assert deadline.clamp((1, 15)) == (1, 2)
+    now[0] = 2.0
+    with pytest.raises(AsgardTimeoutError):
+        deadline.clamp(None)
+
+    stub.routes['/us-east-1/cluster/list.json'] = slow_json_route(
+        {}, 0.1, status=503)
+    client = Asgard(stub.url, retry=RetryPolicy(max_attempts=10,
+                                                backoff=0.2,
+                                                budget=False))
+    start = time.time()
+    with pytest.raises(AsgardError):
+        client.cluster.list(deadline=0.5)
+    assert time.time() - start < 0.6
+
+    stub.routes['/us-east-1/cluster/show/app.json'] = slow_json_route(
+        {'name': 'app'}, 0.3)
+    results = client.cluster.show.map([{'cluster_id': 'app'}] * 3,
+                                      max_workers=1, deadline=0.5)
+    assert results[0].ok and results[0].kwargs == {'cluster_id': 'app'}
+    assert all(isinstance(item.error, AsgardTimeoutError)
+               for item in results[1:])
+
+
+def test_wait_for_task(stub):
+    """Waiters back off on 304s and return once the task finished."""
+    show = '/us-east-1/task/show/7.json'
+    stub.routes[show] = conditional_route({'id': 7, 'status': 'running'},
+                                          etag='"running"')
+    delays = []
+
+    def sleep(delay):
+        """Finish the task on the third pause."""
+        delays.append(delay)
+        if len(delays) == 3:
+            stub.routes[show] = conditional_route(
+                {'id': 7, 'status': 'completed'}, etag='"completed"')
+
+    exporter = InMemoryExporter()
+    client = Asgard(stub.url, tracer=Tracer(exporter),
+                    cache=ResponseCache(ttl=60))
+    client.waiter.sleep = sleep
+    assert client.wait_for_task(7)['status'] == 'completed'
+    assert delays == [1.0, 1.5, 2.25]
+    assert client.waiter.stats == {'polls': 2, 'not_modified': 2}
+
+    polls = [span for span in exporter.spans
+             if span.name == 'Asgard.task.show']
+    assert len(polls) == 4
+    assert [span.parent_id for span in exporter.spans
+            if span.name == 'HTTP GET'] == [span.span_id for span in polls]
+
+    stub.routes['/us-east-1/autoScaling/show/app.json'] = json_route({})
+    client.waiter.sleep = time.sleep
+    with pytest.raises(AsgardTimeoutError):
+        client.wait_until('asg.show', lambda group: group, timeout=0.05,
+                          asg_id='app')
+
+
+def test_wait_for_tasks(stub):
+    """Pending tasks share one task.list poll."""
+    listing = '/us-east-1/task/list.json'
+    stub.routes[listing] = json_route({
+        'runningTaskList': [{'id': 1, 'status': 'running'},
+                            {'id': 2, 'status': 'running'}],
+        'completedTaskList': [{'id': 3, 'status': 'completed'}]})
+
+    def sleep(delay):  # pylint: disable=W0613
+        """Finish both tasks."""
+        stub.routes[listing] = json_route({
+            'runningTaskList': [],
+            'completedTaskList': [{'id': 1, 'status': 'failed'},
+                                  {'id': 2, 'status': 'completed'}]})
+
+    client = Asgard(stub.url)
+    client.waiter.sleep = sleep
+    tasks = client.wait_for_tasks([1, 2, 3])
+    assert [task['status'] for task in tasks.values()] == [
+        'failed', 'completed', 'completed']
+    assert [request[1] for request in stub.requests] == [listing, listing]
+
+
+def deployment_route(states):
+    """Build a route moving through _states_, one per poll, with ETags."""
+    polls = []
+
+    def route(handler):
+        """Answer the next state, 304 when it is unchanged."""
+        index = min(len(polls), len(states) - 1)
+        polls.append(index)
+        etag = '"{0}"'.format(id(states[index]))
+        headers = {'Content-Type': 'application/json', 'ETag': etag}
+        if handler.headers.get('If-None-Match') == etag:
+            return (304, headers, '')
+        return (200, headers, json.dumps({'deployment': states[index]}))
+
+    return route
+
+
+def test_deployment_watch(stub):
+    """Watching yields only the changes between polls."""
+    running = {'id': 'd1', 'status': 'running', 'steps': ['wait'],
+               'log': ['Started']}
+    growing = dict(running, log=['Started', 'Created app-v001'])
+    done = dict(growing, status='completed', steps=['done'],
+                log=growing['log'] + ['Finished'])
+    stub.routes['/us-east-1/deployment/show/d1.json'] = deployment_route(
+        [running, running, growing, growing, done])
+
+    client = Asgard(stub.url)
+    delays = []
+    client.waiter.sleep = delays.append
+    changes = list(client.watch_deployment('d1'))
+
+    assert [(change.kind, change.key) for change in changes] == [
+        ('status', 'status'), ('field', 'id'), ('step', 0), ('log', 0),
+        ('log', 1), ('status', 'status'), ('step', 0), ('log', 2)]
+    assert changes[-3].new == 'completed' and changes[-1].new == 'Finished'
+    assert delays == [1.0, 1.5, 1.0, 1.5]
+    assert [request[0] for request in stub.requests] == ['GET'] * 5
+
+    with pytest.raises(AsgardTimeoutError):
+        list(client.watch_deployment('d1', deadline=0))
+
+
+def test_fleet_index(stub):
+    """Lookups come from the indexes, refreshes re-index changes only."""
+    instances = [
+        {'instanceId': 'i-1', 'appName': 'hello', 'amiId': 'ami-1',
+         'autoScalingGroupName': 'hello-v001',
+         'ec2Instance': {'subnetId': 'subnet-a', 'state': {'name': 'running'},
+                         'securityGroups': [{'groupId': 'sg-web'}]}},
+        {'instanceId': 'i-2', 'appName': 'hello', 'amiId': 'ami-1',
+         'autoScalingGroupName': 'hello-v001',
+         'ec2Instance': {'subnetId': 'subnet-b', 'state': {'name': 'running'},
+                         'securityGroups': [{'groupId': 'sg-web'}]}},
+        {'instanceId': 'i-3', 'appName': 'other', 'amiId': 'ami-2',
+         'ec2Instance': {'subnetId': 'subnet-a',
+                         'state': {'name': 'stopped'}}},
+    ]
+    stub.routes['/us-east-1/instance/list.json'] = json_route(instances)
+    stub.routes['/us-east-1/autoScaling/list.json'] = json_route([
+        {'autoScalingGroupName': 'hello-v001',
+         'launchConfigurationName': 'hello-v001-1',
+         'VPCZoneIdentifier': 'subnet-a,subnet-b',
+         'instances': [{'instanceId': 'i-1'}, {'instanceId': 'i-2'}]}])
+    stub.routes['/us-east-1/launchConfiguration/list.json'] = json_route([
+        {'launchConfigurationName': 'hello-v001-1', 'imageId': 'ami-1',
+         'securityGroups': ['sg-web', 'sg-ssh']}])
+    stub.routes['/us-east-1/image/list.json'] = json_route([
+        {'imageId': 'ami-1', 'name': 'hello-1.0', 'state': 'available'}])
+
+    fleet = FleetIndex(Asgard(stub.url))
+    assert [group.name for group in fleet.groups.find(ami='ami-1')] == [
+        'hello-v001']
+    assert [instance.instance_id for instance in fleet.instances.find(
+        app='hello', subnet='subnet-a')] == ['i-1']
+    assert fleet.launch_configs.find(security_group='sg-ssh')[0].ami == 'ami-1'
+    assert fleet.groups.get('hello-v001').security_groups == ('sg-ssh',
+                                                              'sg-web')
+    assert len(fleet.instances.find(state='running')) == 2
+    assert fleet.images.get('ami-1').name == 'hello-1.0'
+    with pytest.raises(TypeError):
+        fleet.instances.find(color='blue')
+
+    instances[2]['ec2Instance']['state']['name'] = 'running'
+    stub.routes['/us-east-1/instance/list.json'] = json_route(instances[1:])
+    assert fleet.refresh('instance') == {
+        'instance': {'added_or_changed': 1, 'removed': 1}}
+    assert sorted(record.instance_id for record in fleet.instances.find(
+        state='running')) == ['i-2', 'i-3']
+    assert fleet.instances.find(app='hello', subnet='subnet-a') == []
+    assert 'stopped' not in fleet.instances.indexes['state']
+
+    requests_made = len(stub.requests)
+    with pytest.raises(ValueError):
+        fleet.refresh('instance', 'instances')
+    assert len(stub.requests) == requests_made
+
+    with pytest.raises(TypeError):
+        FleetIndex().refresh()
+
+
+def test_inventory_sync(stub):
+    """Snapshots turn into added, changed and removed events."""
+    route = '/us-east-1/instance/list.json'
+    stub.routes[route] = conditional_route(
+        [{'instanceId': 'i-1', 'state': 'pending'}, {'instanceId': 'i-2'}],
+        etag='"1"')
+
+    inventory = InventorySync(Asgard(stub.url), 'instance.list')
+    assert [(event.kind, event.key) for event in inventory.poll()] == [
+        ('added', 'i-1'), ('added', 'i-2')]
+    assert inventory.poll() == []
+
+    stub.routes[route] = conditional_route(
+        [{'instanceId': 'i-3'}, {'state': 'running', 'instanceId': 'i-1'},
+         {'state': 'pending'}],
+        etag='"2"')
+    events = inventory.poll()
+    assert [(event.kind, event.key) for event in events] == [
+        ('added', 'i-3'), ('changed', 'i-1'), ('removed', 'i-2')]
+    assert events[1].old['state'] == 'pending'
+    assert inventory.stats == {'polls': 3, 'not_modified': 1, 'added': 3,
+                               'removed': 1, 'changed': 1, 'skipped': 1}
+    assert record_hash({'a': 1, 'b': [2]}) == record_hash({'b': [2], 'a': 1})
+    assert record_hash({'a': 1}) == hashlib.sha256(b'{"a":1}').digest()
+    assert record_hash({'a': 1}) != record_hash({'a': '1'})
+    assert stub.requests[1][2]['If-None-Match'] == '"1"'
+
+    with pytest.raises(TypeError):
+        InventorySync(Asgard(stub.url), 'regions.list')
+
+
+def test_columns(stub):
+    """List results convert to typed, dictionary encoded columns."""
+    instances = [
+        {'instanceId': 'i-1', 'instanceType': 'm3.large', 'cpus': 2,
+         'ec2Instance': {'subnetId': 'subnet-a'}},
+        {'instanceId': 'i-2', 'instanceType': 't2.micro', 'cpus': 1,
+         'spot': True},
+        {'instanceId': 'i-3', 'instanceType': 'm3.large', 'cpus': 2.5},
+    ]
+    stub.routes['/us-east-1/instance/list.json'] = json_route(instances)
+    client = Asgard(stub.url)
+
+    columns = client.instance.list(as_columns=True)
+    assert columns.length == 3
+    assert list(columns) == ['instanceId', 'instanceType', 'cpus', 'spot']
+    assert isinstance(columns['instanceType'], DictionaryColumn)
+    assert columns['instanceType'].counts() == {'m3.large': 2,
+                                                't2.micro': 1}
+    assert list(columns['instanceType'].codes) == [0, 1, 0]
+    assert list(columns['cpus']) == [2.0, 1.0, 2.5]
+    assert columns['spot'][0] != columns['spot'][0]
+
+    columns = client.instance.list(as_columns=['ec2Instance.subnetId'],
+                                   stream=True)
+    assert columns['ec2Instance.subnetId'].decode() == ['subnet-a', None,
+                                                        None]
+
+    columns = to_columns([{'size': 1}, {'size': 3}, {'size': None}])
+    assert sum(columns['size'][:2]) == 4
+
+    stub.routes['/us-east-1/instance/show/i-1.json'] = json_route(
+        instances[0])
+    with pytest.raises(TypeError):
+        client.instance.show(instance_id='i-1', as_columns=True)
+
+
+def test_metrics(stub):
+    """Calls are timed in phases and aggregated per endpoint."""
+    stub.routes['/us-east-1/cluster/list.json'] = json_route(['app'])
+    stub.routes['/us-east-1/cluster/show/app.json'] = (
+        200, {'Content-Type': 'text/html'},
+        '<html><div class="errors">Cluster not found</div></html>')
+
+    metrics = Metrics()
+    seen = []
+    metrics.add_hook(pre=lambda call, timing: seen.append(('pre', call.name)),
+                     post=lambda call, timing: seen.append(
+                         ('post', timing.status, timing.error is None)))
+    client = Asgard(stub.url, metrics=metrics)
+    client.cluster.list()
+    client.cluster.list()
+    with pytest.raises(AsgardReturnedError):
+        client.cluster.show(cluster_id='app')
+
+    assert seen == [('pre', 'cluster.list'), ('post', 200, True),
+                    ('pre', 'cluster.list'), ('post', 200, True),
+                    ('pre', 'cluster.show'), ('post', 200, False)]
+
+    snapshot = metrics.snapshot()
+    assert snapshot['cluster.list']['calls'] == 2
+    assert snapshot['cluster.list']['bytes'] == 2 * len(b'["app"]')
+    assert sorted(snapshot['cluster.list']['phases']) == [
+        'build_body', 'decode_json', 'download', 'format_url', 'network',
+        'ttfb']
+    assert snapshot['cluster.show']['errors'] == 1
+    assert 'parse_errors' in snapshot['cluster.show']['phases']
+    assert snapshot['cluster.list']['latency']['buckets'][-1] == (
+        float('inf'), 2)
+
+    text = metrics.prometheus()
+    assert 'pyasgard_calls_total{endpoint="cluster.list"} 2\n' in text
+    assert ('pyasgard_phase_duration_seconds_count{endpoint="cluster.show",'
+            'phase="parse_errors"} 1\n') in text
+    assert '# TYPE pyasgard_call_duration_seconds histogram\n' in text
+
+
+def test_tracing(stub):
+    """Calls are traced as span trees, also through batches and fan-outs."""
+    stub.routes['/us-east-1/cluster/list.json'] = json_route(['app'])
+    for region in ('us-east-1', 'us-west-2'):
+        stub.routes['/{0}/autoScaling/show/app-v000.json'.format(
+            region)] = json_route({'region': region})
+
+    exporter = InMemoryExporter()
+    tracer = Tracer(exporter)
+    client = Asgard(stub.url, tracer=tracer)
+    client.cluster.list()
+
+    http, parse, command = exporter.spans
+    assert [span.name for span in exporter.spans] == [
+        'HTTP GET', 'parse', 'Asgard.cluster.list']
+    assert command.parent_id is None
+    assert exporter.children(command) == [http, parse]
+    assert command.attributes['asgard.region'] == 'us-east-1'
+    assert http.attributes['http.status_code'] == 200
+    assert http.attributes['http.response_content_length'] == len(
+        b'["app"]')
+    assert len(set(span.trace_id for span in exporter.spans)) == 1
+
+    exporter.clear()
+    with pytest.raises(AsgardError):
+        client.asg.show(asg_id='missing')
+    assert exporter.spans[-1].attributes['error.type'] == 'AsgardError'
+
+    exporter.clear()
+    client.batch([('asg.show', {'asg_id': 'app-v000'})] * 3, max_workers=3)
+    batch = exporter.spans[-1]
+    assert batch.name == 'Asgard.batch'
+    assert [span.name for span in exporter.children(batch)] == [
+        'Asgard.asg.show'] * 3
+
+    exporter.clear()
+    with MultiRegionAsgard(stub.url, regions=['us-east-1', 'us-west-2'],
+                           tracer=tracer) as asgard:
+        with tracer.span('deploy') as deploy:
+            asgard.asg.show(asg_id='app-v000')
+    commands = exporter.children(deploy)
+    assert sorted(span.attributes['asgard.region'] for span in commands) == [
+        'us-east-1', 'us-west-2']
+
+    untraced = Asgard(stub.url)
+    untraced.cluster.list()
+    assert untraced.tracer is None
+
+
 if __name__ == '__main__':
     """This is not the best way to run.
 